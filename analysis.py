@@ -0,0 +1,424 @@
+"""
+Pipeline de análisis de archivos del broker (posiciones cerradas y finanzas)
+
+Este módulo no depende de Flask: lo usan tanto la aplicación web (app.py)
+como el procesamiento por lotes (batch_analysis.py).
+"""
+import io
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from distributions import compute_distributions, generate_distribution_charts
+from rolling_analytics import compute_rolling_series, generate_rolling_charts
+from storage import open_data_file
+
+# Columnas obligatorias según el tipo de archivo
+FINANCE_REQUIRED_COLUMNS = ['Tipo', 'Tiempo', 'Monto', 'Estatus', 'Pasarela de pago', 'Detalles']
+TRADING_REQUIRED_COLUMNS = ['ID', 'Instrumentos', 'Horario de apertura', 'Precio de apertura',
+                            'Precio de cierre', 'Utilidad', 'Razón']
+
+# Columnas de fecha según el tipo de archivo
+DATE_COLUMNS = {'trading': ['Horario de apertura', 'Hora de cierre'], 'finance': ['Tiempo']}
+
+# Puntos a partir de los cuales las series de evolución se dibujan con WebGL (scattergl):
+# las trazas SVG bloquean el navegador con ~100k puntos
+SCATTERGL_THRESHOLD = int(os.environ.get('SCATTERGL_THRESHOLD', 20000))
+
+def line_trace_type(points):
+    """Tipo de traza de Plotly para una serie de líneas según su número de puntos"""
+    return 'scattergl' if points > SCATTERGL_THRESHOLD else 'scatter'
+
+def results_variant():
+    """Ajustes que cambian el JSON del análisis; forman parte de la clave de los resultados guardados"""
+    return f'gl{SCATTERGL_THRESHOLD}'
+
+def _csv_input(source):
+    """Ruta (str) o contenido en memoria (bytes) como entrada de pd.read_csv"""
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+def read_csv_file(filepath):
+    """Lee un CSV del broker tolerando filas con comas sin escapar
+
+    `filepath` puede ser una ruta (comprimida o no) o el contenido en bytes.
+    """
+    # Primero intentar leer con pandas normal
+    try:
+        df = pd.read_csv(_csv_input(filepath))
+        # Si la primera fila trae columnas de más, pandas la usa como índice en vez de fallar
+        if not isinstance(df.index, pd.RangeIndex):
+            raise pd.errors.ParserError('Extra fields in the first data row')
+    except pd.errors.ParserError as e:
+        # Si hay error de parsing, usar método manual
+        df = read_csv_manual(filepath, pad_short_rows=True)
+    
+    # Verificar si es un archivo de finanzas y si tiene problemas de parsing
+    if 'Monto' in df.columns:
+        # Para archivos de finanzas, verificar si el parsing fue correcto
+        # Si la columna "Pasarela de pago" no contiene "Manual", hay un problema de parsing
+        if not (df['Pasarela de pago'] == 'Manual').any():
+            # Releer el archivo manualmente para corregir el parsing
+            df = read_csv_manual(filepath)
+    
+    return df
+
+def read_csv_manual(filepath, pad_short_rows=False):
+    """Parser de respaldo que combina las columnas sobrantes en la última (Detalles)"""
+    import csv
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    source = io.StringIO(filepath.decode('utf-8')) if isinstance(filepath, (bytes, bytearray)) \
+        else open_data_file(filepath, 'rt')
+    with source as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+        writer.writerow(headers)
+        for row in reader:
+            # Si la fila tiene más columnas que headers, combinar las últimas
+            if len(row) > len(headers):
+                # Combinar las últimas columnas en el campo Detalles
+                row = row[:len(headers)-1] + [', '.join(row[len(headers)-1:])]
+            elif pad_short_rows and len(row) < len(headers):
+                # Rellenar con valores vacíos si faltan columnas
+                row.extend([''] * (len(headers) - len(row)))
+            writer.writerow(row)
+    
+    # Volver a pasar las filas normalizadas por pandas para conservar la inferencia de tipos
+    buffer.seek(0)
+    return pd.read_csv(buffer)
+
+def parse_file_dates(df):
+    """Convierte las columnas de fecha que correspondan al tipo de archivo"""
+    return parse_dates(df, [c for c in DATE_COLUMNS[detect_file_type(df)] if c in df.columns])
+
+def read_typed_file(filepath):
+    """Lee un CSV del broker con las columnas de fecha ya convertidas (lo que guarda la caché)"""
+    return parse_file_dates(read_csv_file(filepath))
+
+def detect_file_type(df):
+    """Detecta el tipo de archivo según la presencia de la columna Monto"""
+    return 'finance' if 'Monto' in df.columns else 'trading'
+
+def validate_columns(df):
+    """Devuelve el tipo de archivo y la lista de columnas obligatorias que faltan"""
+    file_type = detect_file_type(df)
+    required_columns = FINANCE_REQUIRED_COLUMNS if file_type == 'finance' else TRADING_REQUIRED_COLUMNS
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    return file_type, missing_columns
+
+def analyze_dataframe(df, progress=None):
+    """Valida y procesa un DataFrame ya leído según su tipo"""
+    file_type, missing_columns = validate_columns(df)
+    if missing_columns:
+        raise ValueError(f'Missing required columns for {file_type} file: {missing_columns}')
+    
+    if file_type == 'finance':
+        return process_finance_data(df, progress=progress)
+    return process_trading_data(df, progress=progress)
+
+def analyze_file(filepath):
+    """Lee y analiza un CSV del broker (trading o finanzas)"""
+    return analyze_dataframe(read_csv_file(filepath))
+
+def json_default(value):
+    """Serializa los tipos de pandas/numpy que json no soporta"""
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def parse_dates(df, columns):
+    """Convierte las columnas de fecha indicadas, dejando NaT en los valores inválidos"""
+    for column in columns:
+        df[column] = pd.to_datetime(df[column], errors='coerce', format='mixed')
+    return df
+
+def process_trading_data(df, progress=None):
+    """Procesa los datos de trading y genera análisis
+
+    `progress`, si se indica, se llama como progress(etapa, **datos) al terminar
+    cada etapa ('dates', 'aggregations', 'charts').
+    """
+    
+    # Convertir fechas con manejo de errores
+    parse_dates(df, DATE_COLUMNS['trading'])
+    
+    # Filtrar solo filas con fechas válidas
+    df_valid = df.dropna(subset=['Horario de apertura', 'Hora de cierre'])
+    if progress:
+        progress('dates', rows=len(df_valid), invalid=len(df) - len(df_valid))
+    
+    
+    # Extraer mes y año
+    df_valid['Mes'] = df_valid['Horario de apertura'].dt.to_period('M')
+    df_valid['Año'] = df_valid['Horario de apertura'].dt.year
+    
+    # Calcular métricas por mes
+    monthly_stats = df_valid.groupby('Mes').agg({
+        'Utilidad': ['sum', 'count', 'mean'],
+        'ID': 'count'
+    }).round(2)
+    
+    monthly_stats.columns = ['Ganancia/Pérdida Total', 'Número Operaciones', 'Ganancia/Pérdida Promedio', 'Total Operaciones']
+    monthly_stats = monthly_stats.reset_index()
+    monthly_stats['Mes'] = monthly_stats['Mes'].astype(str)
+    
+    # Calcular métricas por instrumento
+    instrument_stats = df_valid.groupby('Instrumentos').agg({
+        'Utilidad': ['sum', 'count', 'mean']
+    }).round(2)
+    
+    instrument_stats.columns = ['Ganancia/Pérdida Total', 'Número Operaciones', 'Ganancia/Pérdida Promedio']
+    instrument_stats = instrument_stats.reset_index()
+    
+    # Calcular totales para la fila de sumatorio
+    instrument_totals = {
+        'Instrumentos': 'TOTAL',
+        'Ganancia/Pérdida Total': instrument_stats['Ganancia/Pérdida Total'].sum(),
+        'Número Operaciones': instrument_stats['Número Operaciones'].sum(),
+        'Ganancia/Pérdida Promedio': instrument_stats['Ganancia/Pérdida Total'].sum() / instrument_stats['Número Operaciones'].sum() if instrument_stats['Número Operaciones'].sum() > 0 else 0
+    }
+    
+    # Agregar la fila de totales al final
+    instrument_stats = pd.concat([instrument_stats, pd.DataFrame([instrument_totals])], ignore_index=True)
+    
+    
+    # Calcular métricas por razón de cierre
+    reason_stats = df_valid.groupby('Razón').agg({
+        'Utilidad': ['sum', 'count', 'mean']
+    }).round(2)
+    
+    reason_stats.columns = ['Ganancia/Pérdida Total', 'Número Operaciones', 'Ganancia/Pérdida Promedio']
+    reason_stats = reason_stats.reset_index()
+    
+    # Métricas generales
+    total_operations = len(df_valid)
+    total_profit = df_valid['Utilidad'].sum()
+    winning_trades = len(df_valid[df_valid['Utilidad'] > 0])
+    losing_trades = len(df_valid[df_valid['Utilidad'] < 0])
+    win_rate = (winning_trades / total_operations) * 100 if total_operations > 0 else 0
+    
+    # Calcular costos adicionales
+    total_swap = df_valid['Swap'].sum()
+    if progress:
+        progress('aggregations')
+    
+    # Generar gráficos
+    charts = generate_charts(df_valid, monthly_stats, instrument_stats, reason_stats)
+    
+    # Series móviles (P&L, % de éxito y operaciones) sobre la hora de cierre
+    rolling = compute_rolling_series(df_valid['Hora de cierre'], df_valid['Utilidad'])
+    charts.update(generate_rolling_charts(rolling))
+    
+    # Histogramas de P&L, tiempo de permanencia y P&L por hora × día (tamaño fijo)
+    distributions = compute_distributions(df_valid)
+    charts.update(generate_distribution_charts(distributions))
+    if progress:
+        progress('charts', charts=len(charts))
+    
+    return {
+        'summary': {
+            'total_operations': total_operations,
+            'total_profit': round(total_profit, 2),
+            'winning_trades': winning_trades,
+            'losing_trades': losing_trades,
+            'win_rate': round(win_rate, 2),
+            'total_swap': round(total_swap, 2)
+        },
+        'monthly_stats': monthly_stats.to_dict('records'),
+        'instrument_stats': instrument_stats.to_dict('records'),
+        'reason_stats': reason_stats.to_dict('records'),
+        'rolling': rolling,
+        'distributions': distributions,
+        'charts': charts
+    }
+
+def generate_charts(df, monthly_stats, instrument_stats, reason_stats):
+    """Genera los gráficos de análisis"""
+    
+    # 1. Gráfico de ganancia/pérdida por instrumento
+    # Ordenar por ganancia/pérdida total descendente y excluir la fila TOTAL
+    instrument_stats_for_chart = instrument_stats[instrument_stats['Instrumentos'] != 'TOTAL'].copy()
+    instrument_stats_sorted = instrument_stats_for_chart.sort_values('Ganancia/Pérdida Total', ascending=False)
+    
+    # 2. Gráfico de evolución temporal
+    df_sorted = df.sort_values('Horario de apertura').copy()
+    df_sorted['Ganancia/Pérdida Acumulada'] = df_sorted['Utilidad'].cumsum()
+    
+    # Convertir gráficos a JSON con datos explícitos
+    charts = {
+        'instrument': {
+            'data': [{
+                'x': instrument_stats_sorted.head(15)['Instrumentos'].tolist(),
+                'y': instrument_stats_sorted.head(15)['Ganancia/Pérdida Total'].tolist(),
+                'type': 'bar',
+                'marker': {
+                    'color': instrument_stats_sorted.head(15)['Ganancia/Pérdida Total'].tolist(),
+                    'colorscale': 'RdYlGn'
+                }
+            }],
+            'layout': {
+                'title': 'Ganancia/Pérdida Total por Instrumento (Top 15)',
+                'xaxis': {'title': 'Instrumento', 'tickangle': 45},
+                'yaxis': {'title': 'Ganancia/Pérdida Total ($)'},
+                'height': 500
+            }
+        },
+        'evolution': {
+            'data': [{
+                'x': df_sorted['Horario de apertura'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+                'y': df_sorted['Ganancia/Pérdida Acumulada'].tolist(),
+                'type': line_trace_type(len(df_sorted)),
+                'mode': 'lines',
+                'name': 'Ganancia/Pérdida Acumulada'
+            }],
+            'layout': {
+                'title': 'Evolución de Ganancia/Pérdida Acumulada en el Tiempo',
+                'xaxis': {'title': 'Fecha'},
+                'yaxis': {'title': 'Ganancia/Pérdida Acumulada ($)'},
+                'height': 500,
+                'shapes': [{
+                    'type': 'line',
+                    'x0': df_sorted['Horario de apertura'].min(),
+                    'x1': df_sorted['Horario de apertura'].max(),
+                    'y0': 0,
+                    'y1': 0,
+                    'line': {'color': 'red', 'dash': 'dash'}
+                }]
+            }
+        }
+    }
+    
+    return charts
+
+def process_finance_data(df, progress=None):
+    """Procesa los datos de finanzas y genera análisis (ver process_trading_data para `progress`)"""
+    
+    # Convertir fechas con manejo de errores
+    parse_dates(df, DATE_COLUMNS['finance'])
+    
+    # Filtrar solo filas con fechas válidas
+    df_valid = df.dropna(subset=['Tiempo'])
+    if progress:
+        progress('dates', rows=len(df_valid), invalid=len(df) - len(df_valid))
+    
+    # Filtrar solo transacciones de tipo "Depósito" y "Manual" en la columna "Pasarela de pago"
+    df_manual = df_valid[(df_valid['Tipo'] == 'Depósito') & (df_valid['Pasarela de pago'] == 'Manual')].copy()
+    
+    # Convertir Monto a numérico
+    df_manual['Monto'] = pd.to_numeric(df_manual['Monto'], errors='coerce')
+    
+    # Extraer mes y año
+    df_manual['Mes'] = df_manual['Tiempo'].dt.to_period('M')
+    df_manual['Año'] = df_manual['Tiempo'].dt.year
+    
+    # Calcular agregado por mes
+    monthly_finance = df_manual.groupby('Mes').agg({
+        'Monto': ['sum', 'count', 'mean']
+    }).round(2)
+    
+    monthly_finance.columns = ['Monto Total', 'Número Transacciones', 'Monto Promedio']
+    monthly_finance = monthly_finance.reset_index()
+    monthly_finance['Mes'] = monthly_finance['Mes'].astype(str)
+    
+    # Calcular métricas por tipo de transacción
+    type_stats = df_manual.groupby('Tipo').agg({
+        'Monto': ['sum', 'count', 'mean']
+    }).round(2)
+    
+    type_stats.columns = ['Monto Total', 'Número Transacciones', 'Monto Promedio']
+    type_stats = type_stats.reset_index()
+    
+    # Calcular totales para la fila de sumatorio
+    type_totals = {
+        'Tipo': 'TOTAL',
+        'Monto Total': type_stats['Monto Total'].sum(),
+        'Número Transacciones': type_stats['Número Transacciones'].sum(),
+        'Monto Promedio': type_stats['Monto Total'].sum() / type_stats['Número Transacciones'].sum() if type_stats['Número Transacciones'].sum() > 0 else 0
+    }
+    
+    # Agregar la fila de totales al final
+    type_stats = pd.concat([type_stats, pd.DataFrame([type_totals])], ignore_index=True)
+    
+    # Métricas generales
+    total_transactions = len(df_manual)
+    total_amount = df_manual['Monto'].sum()
+    deposit_transactions = len(df_manual[df_manual['Tipo'] == 'Depósito'])
+    avg_transaction = df_manual['Monto'].mean()
+    if progress:
+        progress('aggregations')
+    
+    # Generar gráficos
+    charts = generate_finance_charts(df_manual, monthly_finance, type_stats)
+    if progress:
+        progress('charts', charts=len(charts))
+    
+    return {
+        'file_type': 'finance',
+        'summary': {
+            'deposit_transactions': deposit_transactions,
+            'total_amount': round(total_amount, 2),
+            'avg_transaction': round(avg_transaction, 2)
+        },
+        'monthly_stats': monthly_finance.to_dict('records'),
+        'charts': charts
+    }
+
+def generate_finance_charts(df, monthly_finance, type_stats):
+    """Genera los gráficos de análisis financiero"""
+    
+    # Evolución temporal del monto acumulado
+    df_sorted = df.sort_values('Tiempo').copy()
+    df_sorted['Monto Acumulado'] = df_sorted['Monto'].cumsum()
+    
+    # Distribución por tipo de transacción (sin la fila TOTAL)
+    type_stats_for_chart = type_stats[type_stats['Tipo'] != 'TOTAL']
+    
+    # Gráficos en JSON con datos explícitos
+    charts = {
+        'monthly': {
+            'data': [{
+                'x': monthly_finance['Mes'].tolist(),
+                'y': monthly_finance['Monto Total'].tolist(),
+                'type': 'bar',
+                'marker': {'color': monthly_finance['Monto Total'].tolist(), 'colorscale': 'Blues'}
+            }],
+            'layout': {
+                'title': 'Monto Total por Mes (Transacciones Manuales)',
+                'xaxis': {'title': 'Mes', 'tickangle': 45},
+                'yaxis': {'title': 'Monto Total ($)'},
+                'height': 500
+            }
+        },
+        'evolution': {
+            'data': [{
+                'x': df_sorted['Tiempo'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+                'y': df_sorted['Monto Acumulado'].tolist(),
+                'type': line_trace_type(len(df_sorted)),
+                'mode': 'lines',
+                'name': 'Monto Acumulado'
+            }],
+            'layout': {
+                'title': 'Evolución del Monto Acumulado',
+                'xaxis': {'title': 'Fecha'},
+                'yaxis': {'title': 'Monto Acumulado ($)'},
+                'height': 500
+            }
+        },
+        'type_distribution': {
+            'data': [{
+                'labels': type_stats_for_chart['Tipo'].tolist(),
+                'values': type_stats_for_chart['Monto Total'].tolist(),
+                'type': 'pie'
+            }],
+            'layout': {
+                'title': 'Distribución por Tipo de Transacción',
+                'height': 500
+            }
+        }
+    }
+    
+    return charts
@@ -1,21 +1,30 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-import json
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context, url_for
 import os
 from datetime import datetime
-import io
-import base64
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-import plotly.io as pio
 import tempfile
+import json
+import re
+import threading
+
+# Re-exportados para mantener compatibles los imports existentes (from app import ...)
+from analysis import (
+    read_csv_file, read_csv_manual, parse_dates, validate_columns,
+    process_trading_data, generate_charts, process_finance_data, generate_finance_charts,
+    read_typed_file, parse_file_dates, results_variant,
+)
+from pdf_report import create_analysis_pdf, create_chart_image
+from equity import build_equity_timeline, generate_equity_charts
+from portfolio import build_correlation, generate_correlation_chart
+from storage import UploadStore, TEMP_PREFIX
+from sweeper import load_stats, prometheus_metrics
+from progress import ProgressReporter, stream_events, valid_job_id, PROGRESS_MAX_STREAMS, PROGRESS_BUSY_RETRY_MS
+from chunked_upload import ChunkedUploads, ChunkedUploadError
+from concurrency import AdmissionGate
+from dataset_cache import DatasetCache
+from export import EXPORT_FORMATS, MIMETYPES, analysis_tables, export_files, stream_zip
+from trades import SORT_COLUMNS, TRADES_PAGE_SIZE, TRADES_MAX_PAGE_SIZE, trades_page
+from plotly_bundle import load_bundle, ASSET_MAX_AGE
+from profiling import ProfileStore, RequestProfiler, current_profile, valid_token, with_profile, PROFILE_HEADER
 
 def create_app():
     app = Flask(__name__)
@@ -59,431 +68,421 @@ UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Archivos guardados una sola vez por contenido y comprimidos (ver storage.py)
+upload_store = UploadStore(UPLOAD_FOLDER)
+
+# Subidas por bloques reanudables (ver chunked_upload.py)
+chunked_uploads = ChunkedUploads(UPLOAD_FOLDER)
+
+# Datasets leídos y tipados, compartidos entre workers por mmap (ver dataset_cache.py)
+dataset_cache = DatasetCache()
+
+# Perfiles de peticiones lentas, opcionales (ver profiling.py)
+profile_store = ProfileStore(os.environ.get('PROFILE_DIR', os.path.join(UPLOAD_FOLDER, '.profiles')))
+request_profiler = RequestProfiler(profile_store)
+
+# Cola acotada para las rutas caras (ver concurrency.py): si está llena, 429 con Retry-After
+admission_gate = AdmissionGate()
+
+# Streams de progreso abiertos a la vez en este worker (aparte de la cola de admisión)
+progress_slots = threading.BoundedSemaphore(PROGRESS_MAX_STREAMS)
+
+# Plotly.js fijado y precomprimido, servido sin CDN; se genera al construir la imagen
+# (python plotly_bundle.py) y sin él la aplicación no arranca
+plotly_bundle = load_bundle()
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', plotly_src=url_for('plotly_asset', name=plotly_bundle['file']))
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-    
-    file = request.files['file']
+@app.route('/assets/<name>')
+def plotly_asset(name):
+    """Bundle de Plotly.js: inmutable (el nombre lleva el hash) y en gzip si el navegador lo acepta"""
+    if name != plotly_bundle['file']:
+        return jsonify({'error': 'Asset not found'}), 404
+    
+    compressed = request.accept_encodings['gzip'] > 0
+    path = os.path.join(plotly_bundle['directory'], name + ('.gz' if compressed else ''))
+    etag = plotly_bundle['sha256'][:16] + ('-gzip' if compressed else '')
+    response = send_file(path, mimetype='text/javascript', etag=etag, max_age=ASSET_MAX_AGE, conditional=True)
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+def valid_analysis_id(analysis_id):
+    return isinstance(analysis_id, str) and re.fullmatch(r'[0-9a-f]{64}', analysis_id) is not None
+
+def check_upload(file):
+    """Valida un archivo subido; devuelve el mensaje de error o None"""
     if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+        return 'No file selected'
     
     if not file.filename.endswith('.csv'):
-        return jsonify({'error': 'Only CSV files are allowed'}), 400
+        return 'Only CSV files are allowed'
     
     # Validación adicional de seguridad
     if not file.filename or '..' in file.filename or '/' in file.filename:
-        return jsonify({'error': 'Invalid filename'}), 400
+        return 'Invalid filename'
+    
+    return None
+
+def save_upload(file):
+    """Guarda el archivo subido con un nombre único y devuelve su registro"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{timestamp}_{file.filename}"
+    return upload_store.put(file.stream, filename)
+
+def load_upload(record):
+    """DataFrame tipado de un archivo guardado; si otro worker ya lo leyó, sin volver a leerlo"""
+    if not record.get('sha256'):
+        # Archivos antiguos guardados sin hash de contenido
+        return read_typed_file(upload_store.path(record['filename']))
+    path = upload_store.find_blob(record['sha256'])
+    return dataset_cache.load(record['sha256'], lambda: read_typed_file(path))
+
+def analyze_upload(record, progress, df=None):
+    """Valida y procesa un CSV guardado; devuelve (respuesta, código)
+
+    El análisis se guarda por contenido: volver a subir o analizar el mismo archivo
+    (o uno ya precalculado por watcher.py) lo devuelve sin recalcular.
+    """
+    analysis_id = record.get('sha256')
+    cached = analysis_id and upload_store.read_result(analysis_id, 'analysis', results_variant())
+    if cached:
+        progress('cached')
+        progress('done')
+        return Response(cached, mimetype='application/json'), 200
+    
+    if df is None:
+        df = load_upload(record)
+    
+    # Detectar tipo de archivo basado en la presencia de la columna "Monto"
+    file_type, missing_columns = validate_columns(df)
+    progress('parsed', rows=len(df), columns=len(df.columns), file_type=file_type)
+    
+    if missing_columns:
+        error = f'Missing required columns for {file_type} file: {missing_columns}'
+        progress('error', message=error)
+        return jsonify({'error': error}), 400
+    
+    if file_type == 'finance':
+        # Procesar los datos de finanzas
+        analysis_data = process_finance_data(df, progress=progress)
+    else:
+        # Procesar los datos de trading (posiciones cerradas)
+        analysis_data = process_trading_data(df, progress=progress)
+    
+    # Identificador estable del análisis: el hash del contenido analizado
+    analysis_data['analysis_id'] = analysis_id
+    response = jsonify(analysis_data)
+    if analysis_id:
+        upload_store.write_result(analysis_id, 'analysis', response.get_data(), results_variant())
+    progress('done')
+    return response, 200
+
+def build_pdf(data, analysis_id=None):
+    """Ruta del PDF de un análisis: el precalculado si existe; si no, se genera (y se guarda si es conocido)"""
+    cached = None
+    if analysis_id:
+        pdf_path = upload_store.result_path(analysis_id, 'pdf')
+        if os.path.exists(pdf_path):
+            return pdf_path
+        # Generar el PDF desde el análisis guardado, no desde los datos que envía el cliente
+        cached = upload_store.read_result(analysis_id, 'analysis', results_variant())
+        if cached:
+            data = json.loads(cached)
+    
+    # Crear archivo PDF temporal
+    with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix='.pdf') as tmp_file:
+        pdf_path = tmp_file.name
+    create_analysis_pdf(data, pdf_path)
+    
+    if cached:
+        with open(pdf_path, 'rb') as f:
+            upload_store.write_result(analysis_id, 'pdf', f.read())
+        os.remove(pdf_path)
+        return upload_store.result_path(analysis_id, 'pdf')
+    return pdf_path
+
+def ingest_file(path):
+    """Guarda un CSV y deja precalculados su análisis y su PDF (lo usa watcher.py)
+
+    Devuelve (registro, código HTTP que tendría /upload).
+    """
+    name = os.path.basename(path)
+    if not name.endswith('.csv') or '..' in name:
+        raise ValueError(f'Invalid filename: {name}')
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    with open(path, 'rb') as f:
+        record = upload_store.put(f, f"{timestamp}_{name}")
+    
+    with app.app_context():
+        response, code = analyze_upload(record, ProgressReporter(None))
+        if code == 200:
+            build_pdf(None, record['sha256'])
+    return record, code
+
+@app.route('/upload', methods=['POST'])
+@admission_gate
+@request_profiler
+def upload_file():
+    # Progreso opcional: el cliente elige un job_id y escucha /progress/<job_id>
+    progress = with_profile(ProgressReporter(request.form.get('job_id')))
+    
+    if 'file' not in request.files:
+        progress('error', message='No file uploaded')
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    file = request.files['file']
+    error = check_upload(file)
+    if error:
+        progress('error', message=error)
+        return jsonify({'error': error}), 400
     
     try:
-        # Generar nombre único para el archivo
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{timestamp}_{file.filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        
-        # Guardar el archivo físicamente
-        file.save(filepath)
+        progress('received', bytes=request.content_length)
         
-        # Leer el archivo CSV desde el archivo guardado
-        # Primero intentar leer con pandas normal
-        try:
-            df = pd.read_csv(filepath)
-        except pd.errors.ParserError as e:
-            # Si hay error de parsing, usar método manual
-            import csv
-            rows = []
-            with open(filepath, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                headers = next(reader)
-                for row in reader:
-                    # Si la fila tiene más columnas que headers, combinar las últimas
-                    if len(row) > len(headers):
-                        # Combinar las últimas columnas en el campo Detalles
-                        row = row[:len(headers)-1] + [', '.join(row[len(headers)-1:])]
-                    elif len(row) < len(headers):
-                        # Rellenar con valores vacíos si faltan columnas
-                        row.extend([''] * (len(headers) - len(row)))
-                    rows.append(row)
-            df = pd.DataFrame(rows, columns=headers)
+        # Guardar el archivo (deduplicado y comprimido) con un nombre único
+        record = save_upload(file)
         
-        # Verificar si es un archivo de finanzas y si tiene problemas de parsing
-        if 'Monto' in df.columns:
-            # Para archivos de finanzas, verificar si el parsing fue correcto
-            # Si la columna "Pasarela de pago" no contiene "Manual", hay un problema de parsing
-            if not (df['Pasarela de pago'] == 'Manual').any():
-                # Releer el archivo manualmente para corregir el parsing
-                import csv
-                rows = []
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    headers = next(reader)
-                    for row in reader:
-                        # Si la fila tiene más columnas que headers, combinar las últimas
-                        if len(row) > len(headers):
-                            # Combinar las últimas columnas en el campo Detalles
-                            row = row[:len(headers)-1] + [', '.join(row[len(headers)-1:])]
-                        rows.append(row)
-                df = pd.DataFrame(rows, columns=headers)
-        
-        
-        # Detectar tipo de archivo basado en la presencia de la columna "Monto"
-        if 'Monto' in df.columns:
-            # Es un archivo de finanzas
-            required_columns = ['Tipo', 'Tiempo', 'Monto', 'Estatus', 'Pasarela de pago', 'Detalles']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return jsonify({'error': f'Missing required columns for finance file: {missing_columns}'}), 400
-            
-            # Procesar los datos de finanzas
-            analysis_data = process_finance_data(df)
-        else:
-            # Es un archivo de posiciones cerradas (formato original)
-            required_columns = ['ID', 'Instrumentos', 'Horario de apertura', 'Precio de apertura', 
-                               'Precio de cierre', 'Utilidad', 'Razón']
-            
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return jsonify({'error': f'Missing required columns for trading file: {missing_columns}'}), 400
-            
-            # Procesar los datos de trading
-            analysis_data = process_trading_data(df)
-        
-        return jsonify(analysis_data)
+        # Analizar el archivo guardado (o devolver el análisis ya calculado de ese contenido)
+        return analyze_upload(record, progress)
         
     except Exception as e:
+        progress('error', message=str(e))
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
-def process_trading_data(df):
-    """Procesa los datos de trading y genera análisis"""
-    
-    # Convertir fechas con manejo de errores
-    df['Horario de apertura'] = pd.to_datetime(df['Horario de apertura'], errors='coerce', format='mixed')
-    df['Hora de cierre'] = pd.to_datetime(df['Hora de cierre'], errors='coerce', format='mixed')
-    
-    # Filtrar solo filas con fechas válidas
-    df_valid = df.dropna(subset=['Horario de apertura', 'Hora de cierre'])
-    
-    
-    # Extraer mes y año
-    df_valid['Mes'] = df_valid['Horario de apertura'].dt.to_period('M')
-    df_valid['Año'] = df_valid['Horario de apertura'].dt.year
-    
-    # Calcular métricas por mes
-    monthly_stats = df_valid.groupby('Mes').agg({
-        'Utilidad': ['sum', 'count', 'mean'],
-        'ID': 'count'
-    }).round(2)
-    
-    monthly_stats.columns = ['Ganancia/Pérdida Total', 'Número Operaciones', 'Ganancia/Pérdida Promedio', 'Total Operaciones']
-    monthly_stats = monthly_stats.reset_index()
-    monthly_stats['Mes'] = monthly_stats['Mes'].astype(str)
-    
-    # Calcular métricas por instrumento
-    instrument_stats = df_valid.groupby('Instrumentos').agg({
-        'Utilidad': ['sum', 'count', 'mean']
-    }).round(2)
-    
-    instrument_stats.columns = ['Ganancia/Pérdida Total', 'Número Operaciones', 'Ganancia/Pérdida Promedio']
-    instrument_stats = instrument_stats.reset_index()
-    
-    # Calcular totales para la fila de sumatorio
-    instrument_totals = {
-        'Instrumentos': 'TOTAL',
-        'Ganancia/Pérdida Total': instrument_stats['Ganancia/Pérdida Total'].sum(),
-        'Número Operaciones': instrument_stats['Número Operaciones'].sum(),
-        'Ganancia/Pérdida Promedio': instrument_stats['Ganancia/Pérdida Total'].sum() / instrument_stats['Número Operaciones'].sum() if instrument_stats['Número Operaciones'].sum() > 0 else 0
-    }
-    
-    # Agregar la fila de totales al final
-    instrument_stats = pd.concat([instrument_stats, pd.DataFrame([instrument_totals])], ignore_index=True)
-    
-    
-    # Calcular métricas por razón de cierre
-    reason_stats = df_valid.groupby('Razón').agg({
-        'Utilidad': ['sum', 'count', 'mean']
-    }).round(2)
-    
-    reason_stats.columns = ['Ganancia/Pérdida Total', 'Número Operaciones', 'Ganancia/Pérdida Promedio']
-    reason_stats = reason_stats.reset_index()
-    
-    # Métricas generales
-    total_operations = len(df_valid)
-    total_profit = df_valid['Utilidad'].sum()
-    winning_trades = len(df_valid[df_valid['Utilidad'] > 0])
-    losing_trades = len(df_valid[df_valid['Utilidad'] < 0])
-    win_rate = (winning_trades / total_operations) * 100 if total_operations > 0 else 0
-    
-    # Calcular costos adicionales
-    total_swap = df_valid['Swap'].sum()
-    
-    # Generar gráficos
-    charts = generate_charts(df_valid, monthly_stats, instrument_stats, reason_stats)
-    
-    return {
-        'summary': {
-            'total_operations': total_operations,
-            'total_profit': round(total_profit, 2),
-            'winning_trades': winning_trades,
-            'losing_trades': losing_trades,
-            'win_rate': round(win_rate, 2),
-            'total_swap': round(total_swap, 2)
-        },
-        'monthly_stats': monthly_stats.to_dict('records'),
-        'instrument_stats': instrument_stats.to_dict('records'),
-        'reason_stats': reason_stats.to_dict('records'),
-        'charts': charts
-    }
-
-def generate_charts(df, monthly_stats, instrument_stats, reason_stats):
-    """Genera los gráficos de análisis"""
-    
-    # 1. Gráfico de ganancia/pérdida por instrumento
-    # Ordenar por ganancia/pérdida total descendente y excluir la fila TOTAL
-    instrument_stats_for_chart = instrument_stats[instrument_stats['Instrumentos'] != 'TOTAL'].copy()
-    instrument_stats_sorted = instrument_stats_for_chart.sort_values('Ganancia/Pérdida Total', ascending=False)
-    
-    fig_instrument = px.bar(
-        instrument_stats_sorted.head(15),  # Top 15 instrumentos
-        x='Instrumentos',
-        y='Ganancia/Pérdida Total',
-        title='Ganancia/Pérdida Total por Instrumento (Top 15)',
-        color='Ganancia/Pérdida Total',
-        color_continuous_scale='RdYlGn',
-        height=500
-    )
-    
-    fig_instrument.update_layout(
-        xaxis_title='Instrumento',
-        yaxis_title='Ganancia/Pérdida Total ($)',
-        showlegend=False,
-        xaxis={'tickangle': 45}
-    )
-    
-    # 2. Gráfico de evolución temporal
-    df_sorted = df.sort_values('Horario de apertura').copy()
-    df_sorted['Ganancia/Pérdida Acumulada'] = df_sorted['Utilidad'].cumsum()
-    
-    fig_evolution = px.line(
-        df_sorted,
-        x='Horario de apertura',
-        y='Ganancia/Pérdida Acumulada',
-        title='Evolución de Ganancia/Pérdida Acumulada en el Tiempo',
-        height=500
-    )
-    
-    fig_evolution.update_layout(
-        xaxis_title='Fecha',
-        yaxis_title='Ganancia/Pérdida Acumulada ($)',
-        showlegend=False,
-        hovermode='x unified'
-    )
+def chunked_error(e):
+    """Respuesta JSON de un error del protocolo de subida por bloques"""
+    body = {'error': str(e)}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return jsonify(body), e.status
+
+@app.route('/uploads', methods=['POST'])
+def chunked_upload_init():
+    """Inicia una subida por bloques reanudable"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    if not filename.endswith('.csv') or '..' in filename or '/' in filename:
+        return jsonify({'error': 'Invalid filename'}), 400
     
-    # Agregar línea horizontal en y=0 para referencia
-    fig_evolution.add_hline(y=0, line_dash="dash", line_color="red", opacity=0.5)
-    
-    # Convertir gráficos a JSON con datos explícitos
-    charts = {
-        'instrument': {
-            'data': [{
-                'x': instrument_stats_sorted.head(15)['Instrumentos'].tolist(),
-                'y': instrument_stats_sorted.head(15)['Ganancia/Pérdida Total'].tolist(),
-                'type': 'bar',
-                'marker': {
-                    'color': instrument_stats_sorted.head(15)['Ganancia/Pérdida Total'].tolist(),
-                    'colorscale': 'RdYlGn'
-                }
-            }],
-            'layout': {
-                'title': 'Ganancia/Pérdida Total por Instrumento (Top 15)',
-                'xaxis': {'title': 'Instrumento', 'tickangle': 45},
-                'yaxis': {'title': 'Ganancia/Pérdida Total ($)'},
-                'height': 500
-            }
-        },
-        'evolution': {
-            'data': [{
-                'x': df_sorted['Horario de apertura'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
-                'y': df_sorted['Ganancia/Pérdida Acumulada'].tolist(),
-                'type': 'scatter',
-                'mode': 'lines',
-                'name': 'Ganancia/Pérdida Acumulada'
-            }],
-            'layout': {
-                'title': 'Evolución de Ganancia/Pérdida Acumulada en el Tiempo',
-                'xaxis': {'title': 'Fecha'},
-                'yaxis': {'title': 'Ganancia/Pérdida Acumulada ($)'},
-                'height': 500,
-                'shapes': [{
-                    'type': 'line',
-                    'x0': df_sorted['Horario de apertura'].min(),
-                    'x1': df_sorted['Horario de apertura'].max(),
-                    'y0': 0,
-                    'y1': 0,
-                    'line': {'color': 'red', 'dash': 'dash'}
-                }]
-            }
-        }
-    }
-    
-    return charts
-
-def process_finance_data(df):
-    """Procesa los datos de finanzas y genera análisis"""
-    
-    # Convertir fechas con manejo de errores
-    df['Tiempo'] = pd.to_datetime(df['Tiempo'], errors='coerce', format='mixed')
-    
-    # Filtrar solo filas con fechas válidas
-    df_valid = df.dropna(subset=['Tiempo'])
-    
-    # Filtrar solo transacciones de tipo "Depósito" y "Manual" en la columna "Pasarela de pago"
-    df_manual = df_valid[(df_valid['Tipo'] == 'Depósito') & (df_valid['Pasarela de pago'] == 'Manual')].copy()
-    
-    # Convertir Monto a numérico
-    df_manual['Monto'] = pd.to_numeric(df_manual['Monto'], errors='coerce')
-    
-    # Extraer mes y año
-    df_manual['Mes'] = df_manual['Tiempo'].dt.to_period('M')
-    df_manual['Año'] = df_manual['Tiempo'].dt.year
-    
-    # Calcular agregado por mes
-    monthly_finance = df_manual.groupby('Mes').agg({
-        'Monto': ['sum', 'count', 'mean']
-    }).round(2)
-    
-    monthly_finance.columns = ['Monto Total', 'Número Transacciones', 'Monto Promedio']
-    monthly_finance = monthly_finance.reset_index()
-    monthly_finance['Mes'] = monthly_finance['Mes'].astype(str)
-    
-    # Calcular métricas por tipo de transacción
-    type_stats = df_manual.groupby('Tipo').agg({
-        'Monto': ['sum', 'count', 'mean']
-    }).round(2)
-    
-    type_stats.columns = ['Monto Total', 'Número Transacciones', 'Monto Promedio']
-    type_stats = type_stats.reset_index()
-    
-    # Calcular totales para la fila de sumatorio
-    type_totals = {
-        'Tipo': 'TOTAL',
-        'Monto Total': type_stats['Monto Total'].sum(),
-        'Número Transacciones': type_stats['Número Transacciones'].sum(),
-        'Monto Promedio': type_stats['Monto Total'].sum() / type_stats['Número Transacciones'].sum() if type_stats['Número Transacciones'].sum() > 0 else 0
-    }
-    
-    # Agregar la fila de totales al final
-    type_stats = pd.concat([type_stats, pd.DataFrame([type_totals])], ignore_index=True)
-    
-    # Métricas generales
-    total_transactions = len(df_manual)
-    total_amount = df_manual['Monto'].sum()
-    deposit_transactions = len(df_manual[df_manual['Tipo'] == 'Depósito'])
-    avg_transaction = df_manual['Monto'].mean()
-    
-    # Generar gráficos
-    charts = generate_finance_charts(df_manual, monthly_finance, type_stats)
-    
-    return {
-        'file_type': 'finance',
-        'summary': {
-            'deposit_transactions': deposit_transactions,
-            'total_amount': round(total_amount, 2),
-            'avg_transaction': round(avg_transaction, 2)
-        },
-        'monthly_stats': monthly_finance.to_dict('records'),
-        'charts': charts
-    }
-
-def generate_finance_charts(df, monthly_finance, type_stats):
-    """Genera los gráficos de análisis financiero"""
-    
-    # 1. Gráfico de monto por mes
-    fig_monthly = px.bar(
-        monthly_finance,
-        x='Mes',
-        y='Monto Total',
-        title='Monto Total por Mes (Transacciones Manuales)',
-        color='Monto Total',
-        color_continuous_scale='Blues',
-        height=500
-    )
+    size = data.get('size')
+    if size is not None and not isinstance(size, int):
+        return jsonify({'error': 'Invalid size'}), 400
     
-    fig_monthly.update_layout(
-        xaxis_title='Mes',
-        yaxis_title='Monto Total ($)',
-        showlegend=False,
-        xaxis={'tickangle': 45}
-    )
+    try:
+        return jsonify(chunked_uploads.create(filename, size=size, job_id=data.get('job_id'))), 201
+    except ChunkedUploadError as e:
+        return chunked_error(e)
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Offset confirmado de una subida, para reanudarla"""
+    try:
+        return jsonify(chunked_uploads.status(upload_id))
+    except ChunkedUploadError as e:
+        return chunked_error(e)
+
+@app.route('/uploads/<upload_id>', methods=['PATCH'])
+def chunked_upload_append(upload_id):
+    """Añade un bloque verificado en el offset indicado"""
+    offset = request.headers.get('Upload-Offset', '')
+    if not offset.isdigit():
+        return jsonify({'error': 'Missing or invalid Upload-Offset header'}), 400
     
-    # 2. Gráfico de evolución temporal
-    df_sorted = df.sort_values('Tiempo').copy()
-    df_sorted['Monto Acumulado'] = df_sorted['Monto'].cumsum()
+    try:
+        new_offset = chunked_uploads.append(upload_id, int(offset), request.get_data(),
+                                            request.headers.get('Upload-Checksum'))
+        status = chunked_uploads.status(upload_id)
+    except ChunkedUploadError as e:
+        return chunked_error(e)
+    
+    ProgressReporter(status['job_id'])('received', bytes=new_offset, total=status['size'])
+    response = jsonify({'offset': new_offset})
+    # Leer las líneas nuevas después de enviar la respuesta: el cliente ya manda el siguiente bloque
+    response.call_on_close(lambda: parse_chunks(upload_id))
+    return response
+
+def parse_chunks(upload_id):
+    """Lectura incremental tras un bloque; los errores se repiten y se informan al completar"""
+    try:
+        chunked_uploads.parse_pending(upload_id)
+    except Exception as e:
+        print(f"⚠️  Error leyendo la subida {upload_id}: {str(e)}")
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+@admission_gate
+@request_profiler
+def chunked_upload_complete(upload_id):
+    """Termina la subida, la guarda en el almacén y devuelve el análisis"""
+    data = request.get_json(silent=True) or {}
+    try:
+        progress = with_profile(ProgressReporter(chunked_uploads.status(upload_id)['job_id']))
+    except ChunkedUploadError as e:
+        return chunked_error(e)
     
-    fig_evolution = px.line(
-        df_sorted,
-        x='Tiempo',
-        y='Monto Acumulado',
-        title='Evolución del Monto Acumulado en el Tiempo',
-        height=500
-    )
+    try:
+        data_path, meta, df = chunked_uploads.complete(upload_id)
+        
+        # Guardar (deduplicado y comprimido) con el mismo esquema de nombres que /upload
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        with open(data_path, 'rb') as f:
+            record = upload_store.put(f, f"{timestamp}_{meta['filename']}")
+        if data.get('sha256') and data['sha256'] != record['sha256']:
+            upload_store.delete(record['filename'])
+            chunked_uploads.discard(upload_id)
+            progress('error', message='File checksum mismatch')
+            # 400 y no 460: el archivo completo está dañado, reenviar un bloque no lo arregla
+            return jsonify({'error': 'File checksum mismatch'}), 400
+        chunked_uploads.discard(upload_id)
+        
+        df = dataset_cache.put(record['sha256'], parse_file_dates(df))
+        return analyze_upload(record, progress, df=df)
+        
+    except ChunkedUploadError as e:
+        return chunked_error(e)
+    except Exception as e:
+        progress('error', message=str(e))
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+
+@app.route('/progress/<job_id>')
+def progress_stream(job_id):
+    """Etapas de un análisis en curso como Server-Sent Events"""
+    if not valid_job_id(job_id):
+        return jsonify({'error': 'Invalid job id'}), 400
+    
+    # Sin caché ni buffering en nginx para que cada evento llegue en cuanto se produce
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if not progress_slots.acquire(blocking=False):
+        # Sin hueco: cerrar enseguida y que el navegador reconecte más tarde
+        return Response(f'retry: {PROGRESS_BUSY_RETRY_MS}\n\n', mimetype='text/event-stream', headers=headers)
     
-    fig_evolution.update_layout(
-        xaxis_title='Fecha',
-        yaxis_title='Monto Acumulado ($)',
-        showlegend=False,
-        hovermode='x unified'
-    )
+    try:
+        last_event_id = request.headers.get('Last-Event-ID', '0')
+        response = Response(
+            stream_with_context(stream_events(job_id, int(last_event_id) if last_event_id.isdigit() else 0)),
+            mimetype='text/event-stream',
+            headers=headers
+        )
+    except BaseException:
+        progress_slots.release()
+        raise
+    # El hueco se libera cuando el servidor cierra el stream, no al volver de la vista
+    response.call_on_close(progress_slots.release)
+    return response
+
+@app.route('/analyze/equity', methods=['POST'])
+@admission_gate
+def analyze_equity():
+    """Capital y ROI en el tiempo a partir de las exportaciones de trading y finanzas de una cuenta"""
+    if 'trading_file' not in request.files or 'finance_file' not in request.files:
+        return jsonify({'error': 'Both trading_file and finance_file are required'}), 400
+    
+    files = {'trading': request.files['trading_file'], 'finance': request.files['finance_file']}
+    for file in files.values():
+        error = check_upload(file)
+        if error:
+            return jsonify({'error': error}), 400
     
-    # 3. Gráfico de tipo de transacción
-    type_stats_for_chart = type_stats[type_stats['Tipo'] != 'TOTAL'].copy()
+    try:
+        frames = {}
+        for expected_type, file in files.items():
+            df = load_upload(save_upload(file))
+            file_type, missing_columns = validate_columns(df)
+            if file_type != expected_type:
+                return jsonify({'error': f'{file.filename} is not a {expected_type} file'}), 400
+            if missing_columns:
+                return jsonify({'error': f'Missing required columns for {file_type} file: {missing_columns}'}), 400
+            frames[file_type] = df
+        
+        timeline = build_equity_timeline(frames['trading'], frames['finance'])
+        timeline['charts'] = generate_equity_charts(timeline)
+        return jsonify(timeline)
+        
+    except Exception as e:
+        return jsonify({'error': f'Error processing files: {str(e)}'}), 500
+
+@app.route('/portfolio/correlation', methods=['POST'])
+@admission_gate
+@request_profiler
+def portfolio_correlation():
+    """Correlación y covarianza del P&L diario entre cuentas guardadas
+
+    Cuerpo opcional {"analysis_ids": [...]}; sin él, todas las cuentas de trading guardadas.
+    """
+    data = request.get_json(silent=True) or {}
+    analysis_ids = data.get('analysis_ids')
+    if analysis_ids is not None and (not isinstance(analysis_ids, list)
+                                     or not all(valid_analysis_id(item) for item in analysis_ids)):
+        return jsonify({'error': 'analysis_ids must be a list of analysis ids'}), 400
     
-    fig_type = px.pie(
-        type_stats_for_chart,
-        values='Monto Total',
-        names='Tipo',
-        title='Distribución por Tipo de Transacción',
-        height=500
-    )
+    try:
+        # Nombre de cada cuenta: el archivo más reciente con ese contenido
+        names = {}
+        for record in sorted(upload_store.list(), key=lambda item: item['uploaded']):
+            if record.get('sha256'):
+                names[record['sha256']] = os.path.splitext(record['filename'])[0]
+        
+        accounts, frames = [], []
+        for analysis_id in dict.fromkeys(analysis_ids) if analysis_ids is not None else names:
+            if upload_store.find_blob(analysis_id) is None:
+                return jsonify({'error': f'Analysis not found: {analysis_id}'}), 404
+            df = load_upload({'sha256': analysis_id})
+            file_type, missing_columns = validate_columns(df)
+            if file_type != 'trading' or missing_columns:
+                if analysis_ids is None:
+                    # Todas las cuentas: las exportaciones de finanzas no tienen operaciones
+                    continue
+                return jsonify({'error': f'{names.get(analysis_id, analysis_id)} is not a valid trading file'}), 400
+            accounts.append(names.get(analysis_id, analysis_id[:12]))
+            frames.append(df)
+        
+        profile = current_profile()
+        if profile:
+            profile('loaded', accounts=len(frames), rows=sum(len(df) for df in frames))
+        
+        if len(frames) < 2:
+            return jsonify({'error': 'At least two trading accounts are required'}), 400
+        
+        result = build_correlation(accounts, frames)
+        result['charts'] = generate_correlation_chart(result)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': f'Error computing correlation: {str(e)}'}), 500
+
+@app.route('/analyze/<filename>')
+@admission_gate
+@request_profiler
+def reanalyze_file(filename):
+    """Vuelve a analizar un archivo ya subido"""
+    if not filename.endswith('.csv') or '..' in filename or '/' in filename:
+        return jsonify({'error': 'Invalid file type'}), 400
+    
+    record = upload_store.get(filename) or ({'filename': filename} if upload_store.path(filename) else None)
+    if record is None:
+        return jsonify({'error': 'File not found'}), 404
     
-    # Convertir gráficos a JSON con datos explícitos
-    charts = {
-        'evolution': {
-            'data': [{
-                'x': df_sorted['Tiempo'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
-                'y': df_sorted['Monto Acumulado'].tolist(),
-                'type': 'scatter',
-                'mode': 'lines',
-                'name': 'Monto Acumulado'
-            }],
-            'layout': {
-                'title': 'Evolución del Monto Acumulado',
-                'xaxis': {'title': 'Fecha'},
-                'yaxis': {'title': 'Monto Acumulado ($)'},
-                'height': 500
-            }
-        }
-    }
-    
-    return charts
+    try:
+        upload_store.touch(filename)
+        progress = with_profile(ProgressReporter(request.args.get('job_id')))
+        return analyze_upload(record, progress)
+    except Exception as e:
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
 @app.route('/files')
 def list_files():
     """Lista todos los archivos subidos"""
     try:
-        files = []
-        for filename in os.listdir(UPLOAD_FOLDER):
-            if filename.endswith('.csv'):
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                file_stats = os.stat(filepath)
-                files.append({
-                    'filename': filename,
-                    'size': file_stats.st_size,
-                    'uploaded': datetime.fromtimestamp(file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
-                })
+        files = [{
+            'filename': record['filename'],
+            'size': record['size'],
+            'stored_size': record['stored_size'],
+            'uploaded': record['uploaded']
+        } for record in upload_store.list()]
         
         # Ordenar por fecha de subida (más reciente primero)
         files.sort(key=lambda x: x['uploaded'], reverse=True)
@@ -493,38 +492,41 @@ def list_files():
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    """Descarga un archivo específico"""
+    """Descarga un archivo específico descomprimiéndolo al vuelo"""
     try:
         # Validar que el archivo existe y es un CSV
-        if not filename.endswith('.csv'):
+        if not filename.endswith('.csv') or '..' in filename or '/' in filename:
             return jsonify({'error': 'Invalid file type'}), 400
         
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        if not os.path.exists(filepath):
+        if upload_store.path(filename) is None:
             return jsonify({'error': 'File not found'}), 404
         
-        return send_file(filepath, as_attachment=True)
+        return Response(
+            stream_with_context(upload_store.iter_content(filename)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
     except Exception as e:
         return jsonify({'error': f'Error downloading file: {str(e)}'}), 500
 
 @app.route('/delete/<filename>', methods=['DELETE'])
 def delete_file(filename):
-    """Elimina un archivo específico"""
+    """Elimina un archivo específico (el contenido sin referencias lo libera el gc)"""
     try:
         # Validar que el archivo existe y es un CSV
-        if not filename.endswith('.csv'):
+        if not filename.endswith('.csv') or '..' in filename or '/' in filename:
             return jsonify({'error': 'Invalid file type'}), 400
         
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        if not os.path.exists(filepath):
+        if not upload_store.delete(filename):
             return jsonify({'error': 'File not found'}), 404
         
-        os.remove(filepath)
         return jsonify({'message': 'File deleted successfully'})
     except Exception as e:
         return jsonify({'error': f'Error deleting file: {str(e)}'}), 500
 
 @app.route('/generate_pdf', methods=['POST'])
+@admission_gate
+@request_profiler
 def generate_pdf():
     """Genera un PDF con el análisis de trading"""
     try:
@@ -532,12 +534,19 @@ def generate_pdf():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        # Crear archivo PDF temporal
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            pdf_path = tmp_file.name
+        # Forma de la entrada para el perfil, si se está perfilando
+        profile = current_profile()
+        if profile:
+            profile('received', bytes=request.content_length, file_type=data.get('file_type', 'trading'),
+                    charts=len(data.get('charts') or {}))
         
-        # Generar el PDF
-        create_analysis_pdf(data, pdf_path)
+        # Generar el PDF (o usar el ya generado para ese análisis)
+        analysis_id = data.get('analysis_id')
+        if analysis_id and not valid_analysis_id(analysis_id):
+            return jsonify({'error': 'Invalid analysis id'}), 400
+        pdf_path = build_pdf(data, analysis_id)
+        if profile:
+            profile('pdf', bytes=os.path.getsize(pdf_path))
         
         # Enviar el archivo PDF
         return send_file(
@@ -550,275 +559,155 @@ def generate_pdf():
     except Exception as e:
         return jsonify({'error': f'Error generating PDF: {str(e)}'}), 500
 
-def create_analysis_pdf(data, output_path):
-    """Crea un PDF con el análisis (trading o finanzas)"""
-    
-    # Configurar el documento
-    doc = SimpleDocTemplate(output_path, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Estilos personalizados
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#667eea')
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceAfter=12,
-        spaceBefore=20,
-        textColor=colors.HexColor('#764ba2')
-    )
-    
-    # Detectar tipo de archivo
-    file_type = data.get('file_type', 'trading')
-    
-    # Título principal
-    if file_type == 'finance':
-        story.append(Paragraph("Análisis Financiero Galáctico", title_style))
-    else:
-        story.append(Paragraph("Análisis de Trading Galáctico", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Fecha de generación
-    date_style = ParagraphStyle(
-        'DateStyle',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_RIGHT,
-        textColor=colors.grey
+def export_format():
+    export_format = request.args.get('format', 'xlsx')
+    return export_format if export_format in EXPORT_FORMATS else None
+
+def export_response(chunks, filename, mimetype):
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
     )
-    story.append(Paragraph(f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", date_style))
-    story.append(Spacer(1, 30))
+
+@app.route('/export/<analysis_id>')
+@admission_gate.streaming
+def export_analysis(analysis_id):
+    """Exporta las tablas de un análisis (?format=parquet|xlsx|csv&tables=...) como stream"""
+    fmt = export_format()
+    if fmt is None:
+        return jsonify({'error': f'Invalid export format, use one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    if not valid_analysis_id(analysis_id):
+        return jsonify({'error': 'Invalid analysis id'}), 400
+    names = [name for name in request.args.get('tables', '').split(',') if name] or None
     
-    # Resumen de métricas
-    story.append(Paragraph("Resumen de Métricas", heading_style))
+    try:
+        if upload_store.find_blob(analysis_id) is None:
+            return jsonify({'error': 'Analysis not found'}), 404
+        
+        # El análisis guardado (o calculado ahora si aún no existe)
+        response, code = analyze_upload({'sha256': analysis_id}, ProgressReporter(None))
+        if code != 200:
+            return response, code
+        analysis = json.loads(response.get_data())
+        tables = analysis_tables(analysis, lambda: load_upload({'sha256': analysis_id}), names)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error exporting analysis: {str(e)}'}), 500
+    
+    # Un solo archivo (una tabla o el XLSX con una hoja por tabla) o un ZIP con uno por tabla
+    files = export_files(tables, fmt)
+    if len(files) == 1:
+        name, chunks = files[0]
+        return export_response(chunks, f'{analysis_id[:12]}_{name}', MIMETYPES[fmt])
+    return export_response(stream_zip(files), f'{analysis_id[:12]}_{fmt}.zip', MIMETYPES['zip'])
+
+@app.route('/export/all')
+@admission_gate.streaming
+def export_all():
+    """Exporta las tablas de todas las cuentas en un ZIP con una carpeta por archivo"""
+    fmt = export_format()
+    if fmt is None:
+        return jsonify({'error': f'Invalid export format, use one of: {", ".join(EXPORT_FORMATS)}'}), 400
     
-    summary_data = data.get('summary', {})
+    try:
+        # Un análisis por contenido: el archivo más reciente de cada uno
+        records = {}
+        for record in sorted(upload_store.list(), key=lambda item: item['uploaded']):
+            records[record.get('sha256') or record['filename']] = record
+        
+        # Calcular aquí los análisis que falten (dentro de la cola de admisión);
+        # los datasets de operaciones se cargan al escribir cada cuenta
+        accounts = []
+        for record in records.values():
+            response, code = analyze_upload(record, ProgressReporter(None))
+            if code == 200:
+                accounts.append((record, json.loads(response.get_data())))
+    except Exception as e:
+        return jsonify({'error': f'Error exporting analyses: {str(e)}'}), 500
     
-    if file_type == 'finance':
-        summary_table_data = [
-            ['Métrica', 'Valor'],
-            ['Total de Transacciones', str(summary_data.get('total_transactions', 0))],
-            ['Monto Total', f"${summary_data.get('total_amount', 0):,.2f}"],
-            ['Transacciones de Depósito', str(summary_data.get('deposit_transactions', 0))],
-            ['Transacciones de Retiro', str(summary_data.get('withdrawal_transactions', 0))],
-            ['Monto Promedio por Transacción', f"${summary_data.get('avg_transaction', 0):,.2f}"]
-        ]
-    else:
-        summary_table_data = [
-            ['Métrica', 'Valor'],
-            ['Total de Operaciones', str(summary_data.get('total_operations', 0))],
-            ['Ganancia/Pérdida Total', f"${summary_data.get('total_profit', 0):,.2f}"],
-            ['Coste Total Swap', f"${summary_data.get('total_swap', 0):,.2f}"],
-            ['Operaciones Ganadoras', str(summary_data.get('winning_trades', 0))],
-            ['Operaciones Perdedoras', str(summary_data.get('losing_trades', 0))],
-            ['Porcentaje de Éxito', f"{summary_data.get('win_rate', 0):.2f}%"]
-        ]
-    
-    summary_table = Table(summary_table_data, colWidths=[3*inch, 2*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(summary_table)
-    story.append(Spacer(1, 30))
-    
-    # Gráficos
-    charts = data.get('charts', {})
+    def files():
+        for record, analysis in accounts:
+            tables = analysis_tables(analysis, lambda: load_upload(record))
+            folder = os.path.splitext(record['filename'])[0]
+            yield from export_files(tables, fmt, prefix=f'{folder}/')
     
-    if file_type == 'finance':
-        # Gráfico de monto por mes
-        if 'monthly' in charts:
-            story.append(Paragraph("Monto Total por Mes", heading_style))
-            monthly_chart_path = create_chart_image(charts['monthly'], 'monthly')
-            if monthly_chart_path:
-                story.append(Image(monthly_chart_path, width=6*inch, height=4*inch))
-                story.append(Spacer(1, 20))
-        
-        # Gráfico de evolución temporal
-        if 'evolution' in charts:
-            story.append(Paragraph("Evolución Temporal del Monto Acumulado", heading_style))
-            evolution_chart_path = create_chart_image(charts['evolution'], 'evolution')
-            if evolution_chart_path:
-                story.append(Image(evolution_chart_path, width=6*inch, height=4*inch))
-                story.append(Spacer(1, 20))
-        
-        # Gráfico de distribución por tipo
-        if 'type_distribution' in charts:
-            story.append(Paragraph("Distribución por Tipo de Transacción", heading_style))
-            type_chart_path = create_chart_image(charts['type_distribution'], 'type_distribution')
-            if type_chart_path:
-                story.append(Image(type_chart_path, width=6*inch, height=4*inch))
-                story.append(Spacer(1, 20))
-    else:
-        # Gráfico de instrumentos
-        if 'instrument' in charts:
-            story.append(Paragraph("Ganancia/Pérdida por Instrumento", heading_style))
-            instrument_chart_path = create_chart_image(charts['instrument'], 'instrument')
-            if instrument_chart_path:
-                story.append(Image(instrument_chart_path, width=6*inch, height=4*inch))
-                story.append(Spacer(1, 20))
-        
-        # Gráfico de evolución temporal
-        if 'evolution' in charts:
-            story.append(Paragraph("Evolución Temporal de Ganancia/Pérdida", heading_style))
-            evolution_chart_path = create_chart_image(charts['evolution'], 'evolution')
-            if evolution_chart_path:
-                story.append(Image(evolution_chart_path, width=6*inch, height=4*inch))
-                story.append(Spacer(1, 20))
-    
-    # Tabla de estadísticas por mes
-    monthly_stats = data.get('monthly_stats', [])
-    if monthly_stats:
-        story.append(Paragraph("Estadísticas por Mes", heading_style))
-        
-        if file_type == 'finance':
-            monthly_table_data = [['Mes', 'Monto Total', 'Transacciones', 'Promedio']]
-            for row in monthly_stats:
-                monthly_table_data.append([
-                    str(row.get('Mes', '')),
-                    f"${row.get('Monto Total', 0):,.2f}",
-                    str(row.get('Número Transacciones', 0)),
-                    f"${row.get('Monto Promedio', 0):,.2f}"
-                ])
-        else:
-            monthly_table_data = [['Mes', 'Ganancia/Pérdida Total', 'Operaciones', 'Promedio']]
-            for row in monthly_stats:
-                monthly_table_data.append([
-                    str(row.get('Mes', '')),
-                    f"${row.get('Ganancia/Pérdida Total', 0):,.2f}",
-                    str(row.get('Número Operaciones', 0)),
-                    f"${row.get('Ganancia/Pérdida Promedio', 0):,.2f}"
-                ])
-        
-        monthly_table = Table(monthly_table_data, colWidths=[1.5*inch, 1.5*inch, 1*inch, 1*inch])
-        monthly_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#764ba2')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 8)
-        ]))
-        
-        story.append(monthly_table)
-        story.append(Spacer(1, 20))
+    filename = f'analyses_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{fmt}.zip'
+    return export_response(stream_zip(files()), filename, MIMETYPES['zip'])
+
+@app.route('/trades/<analysis_id>')
+def list_trades(analysis_id):
+    """Página de operaciones de un análisis de trading
+
+    ?sort=time|profit|swap&order=asc|desc&limit=N y cursor=<next_cursor> o offset=N.
+    La primera página con sort=profit&order=desc es el top-N; con order=asc, el peor-N.
+    """
+    if not valid_analysis_id(analysis_id):
+        return jsonify({'error': 'Invalid analysis id'}), 400
+    
+    sort = request.args.get('sort', 'time')
+    order = request.args.get('order', 'asc')
+    if sort not in SORT_COLUMNS or order not in ('asc', 'desc'):
+        return jsonify({'error': f'Invalid sort, use sort={"|".join(SORT_COLUMNS)} and order=asc|desc'}), 400
+    try:
+        limit = int(request.args.get('limit', TRADES_PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    if not 1 <= limit <= TRADES_MAX_PAGE_SIZE or offset < 0:
+        return jsonify({'error': f'limit must be between 1 and {TRADES_MAX_PAGE_SIZE} and offset positive'}), 400
+    cursor = request.args.get('cursor')
+    if cursor and offset:
+        return jsonify({'error': 'Use either cursor or offset, not both'}), 400
     
-    # Tabla de estadísticas por tipo/instrumento
-    if file_type == 'finance':
-        type_stats = data.get('type_stats', [])
-        if type_stats:
-            story.append(Paragraph("Estadísticas por Tipo de Transacción", heading_style))
-            
-            type_table_data = [['Tipo', 'Monto Total', 'Transacciones', 'Promedio']]
-            for row in type_stats:
-                type_table_data.append([
-                    str(row.get('Tipo', '')),
-                    f"${row.get('Monto Total', 0):,.2f}",
-                    str(row.get('Número Transacciones', 0)),
-                    f"${row.get('Monto Promedio', 0):,.2f}"
-                ])
-            
-            type_table = Table(type_table_data, colWidths=[2*inch, 1.5*inch, 1*inch, 1*inch])
-            type_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                # Destacar la fila TOTAL
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ffeb3b')),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold')
-            ]))
-            
-            story.append(type_table)
-    else:
-        instrument_stats = data.get('instrument_stats', [])
-        if instrument_stats:
-            story.append(Paragraph("Estadísticas por Instrumento", heading_style))
-            
-            instrument_table_data = [['Instrumento', 'Ganancia/Pérdida Total', 'Operaciones', 'Promedio']]
-            for row in instrument_stats:
-                instrument_table_data.append([
-                    str(row.get('Instrumentos', '')),
-                    f"${row.get('Ganancia/Pérdida Total', 0):,.2f}",
-                    str(row.get('Número Operaciones', 0)),
-                    f"${row.get('Ganancia/Pérdida Promedio', 0):,.2f}"
-                ])
-            
-            instrument_table = Table(instrument_table_data, colWidths=[2*inch, 1.5*inch, 1*inch, 1*inch])
-            instrument_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                # Destacar la fila TOTAL
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ffeb3b')),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold')
-            ]))
-            
-            story.append(instrument_table)
-    
-    # Construir el PDF
-    doc.build(story)
-
-def create_chart_image(chart_data, chart_type):
-    """Crea una imagen del gráfico para incluir en el PDF"""
     try:
-        # Crear figura de Plotly
-        if chart_type in ['instrument', 'monthly', 'evolution', 'type_distribution']:
-            fig = go.Figure(data=chart_data['data'], layout=chart_data['layout'])
-        else:
-            return None
+        if upload_store.find_blob(analysis_id) is None:
+            return jsonify({'error': 'Analysis not found'}), 404
         
-        # Configurar el layout para mejor visualización en PDF
-        fig.update_layout(
-            width=800,
-            height=600,
-            margin=dict(l=50, r=50, t=50, b=50),
-            paper_bgcolor='white',
-            plot_bgcolor='white'
-        )
-        
-        # Crear archivo temporal para la imagen
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
-            image_path = tmp_file.name
-        
-        # Convertir a imagen
-        pio.write_image(fig, image_path, format='png', width=800, height=600, scale=2)
-        
-        return image_path
+        # Dataset compartido de la caché: cada página es O(n) sin copiar la tabla
+        df = load_upload({'sha256': analysis_id})
+        file_type, missing_columns = validate_columns(df)
+        if file_type != 'trading':
+            return jsonify({'error': 'Trade list is only available for trading files'}), 400
+        if missing_columns:
+            return jsonify({'error': f'Missing required columns for trading file: {missing_columns}'}), 400
         
+        return jsonify(trades_page(df, sort, order == 'desc', limit, cursor, offset))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Error creating chart image: {e}")
-        return None
+        return jsonify({'error': f'Error listing trades: {str(e)}'}), 500
+
+def profiles_authorized():
+    return valid_token(request.headers.get(PROFILE_HEADER))
+
+@app.route('/profiles')
+def list_profiles():
+    """Perfiles guardados (requiere la cabecera X-Profile-Token)"""
+    if not profiles_authorized():
+        return jsonify({'error': 'Invalid or missing profile token'}), 403
+    return jsonify({'profiles': profile_store.list()})
+
+@app.route('/profiles/<profile_id>')
+def download_profile(profile_id):
+    """Descarga un perfil: metadatos (JSON) o pilas colapsadas (?format=collapsed)"""
+    if not profiles_authorized():
+        return jsonify({'error': 'Invalid or missing profile token'}), 403
+    
+    collapsed = request.args.get('format') == 'collapsed'
+    path = profile_store.path(profile_id, '.collapsed' if collapsed else '.json')
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    if collapsed:
+        return send_file(path, as_attachment=True, download_name=f'{profile_id}.collapsed', mimetype='text/plain')
+    return send_file(path, mimetype='application/json')
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato Prometheus (barrido de retención)"""
+    return Response(prometheus_metrics(load_stats(UPLOAD_FOLDER)), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Análisis por lotes de exportaciones del broker, sin Flask ni HTTP
+
+Procesa archivos o directorios de CSVs en paralelo (un proceso por núcleo) y
+escribe los resultados en JSON, Parquet o PDF. Cada archivo se informa en
+stdout como una línea JSON en cuanto termina.
+
+Uso:
+    python -m batch_analysis exports/ -o resultados/
+    python -m batch_analysis exports/ cuenta_42.csv -o resultados/ -f json -f pdf -j 8
+
+Uso como librería:
+    from batch_analysis import iter_analyze
+    for record in iter_analyze(['exports/'], 'resultados/', formats=('json', 'parquet')):
+        print(record['input'], record['status'])
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from analysis import analyze_file, json_default
+
+OUTPUT_FORMATS = ('json', 'parquet', 'pdf')
+
+# Tablas del resultado que se exportan a Parquet (una por archivo)
+PARQUET_TABLES = ('monthly_stats', 'instrument_stats', 'reason_stats')
+
+
+def find_csv_files(paths, recursive=False):
+    """Expande rutas de archivos y directorios a la lista ordenada de CSVs"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                for root, _, names in os.walk(path):
+                    files.extend(os.path.join(root, name) for name in names if name.endswith('.csv'))
+            else:
+                files.extend(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.csv'))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f'Input not found: {path}')
+    return sorted(files)
+
+
+def output_stems(files):
+    """Nombres base de salida únicos aunque dos entradas se llamen igual"""
+    stems = []
+    seen = {}
+    for filepath in files:
+        stem = os.path.splitext(os.path.basename(filepath))[0]
+        count = seen.get(stem, 0)
+        seen[stem] = count + 1
+        stems.append(stem if count == 0 else f'{stem}_{count + 1}')
+    return stems
+
+
+def write_outputs(result, output_dir, stem, formats):
+    """Escribe el resultado en los formatos pedidos y devuelve las rutas generadas"""
+    written = []
+
+    if 'json' in formats:
+        path = os.path.join(output_dir, f'{stem}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, default=json_default, ensure_ascii=False)
+        written.append(path)
+
+    if 'parquet' in formats:
+        summary = pd.DataFrame([result['summary']])
+        tables = {'summary': summary}
+        tables.update({name: pd.DataFrame(result[name]) for name in PARQUET_TABLES if name in result})
+        for name, table in tables.items():
+            path = os.path.join(output_dir, f'{stem}.{name}.parquet')
+            table.to_parquet(path, index=False)
+            written.append(path)
+
+    if 'pdf' in formats:
+        # Import diferido: reportlab solo se carga si se pide PDF
+        from pdf_report import create_analysis_pdf
+        path = os.path.join(output_dir, f'{stem}.pdf')
+        create_analysis_pdf(result, path)
+        written.append(path)
+
+    return written
+
+
+def process_file(filepath, output_dir, stem, formats):
+    """Analiza un archivo y escribe sus salidas; nunca lanza excepciones"""
+    started = time.perf_counter()
+    record = {'input': filepath}
+    try:
+        result = analyze_file(filepath)
+        record['file_type'] = result.get('file_type', 'trading')
+        record['summary'] = result['summary']
+        record['outputs'] = write_outputs(result, output_dir, stem, formats)
+        record['status'] = 'ok'
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = str(e)
+    record['seconds'] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def iter_analyze(paths, output_dir, formats=('json',), jobs=None, recursive=False):
+    """Analiza los CSVs en paralelo y devuelve cada registro en cuanto termina"""
+    unknown = set(formats) - set(OUTPUT_FORMATS)
+    if unknown:
+        raise ValueError(f'Unknown output formats: {sorted(unknown)}')
+
+    files = find_csv_files(paths, recursive=recursive)
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = list(zip(files, output_stems(files)))
+
+    # Con un solo proceso no merece la pena crear el pool
+    if jobs == 1 or len(tasks) <= 1:
+        for filepath, stem in tasks:
+            yield process_file(filepath, output_dir, stem, formats)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(process_file, filepath, output_dir, stem, formats) for filepath, stem in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m batch_analysis',
+                                     description='Analiza exportaciones del broker por lotes')
+    parser.add_argument('inputs', nargs='+', help='Archivos CSV o directorios que los contienen')
+    parser.add_argument('-o', '--output-dir', required=True, help='Directorio donde escribir los resultados')
+    parser.add_argument('-f', '--format', dest='formats', action='append', choices=OUTPUT_FORMATS,
+                        help='Formato de salida (repetible, por defecto json)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Procesos en paralelo (por defecto, uno por núcleo)')
+    parser.add_argument('-r', '--recursive', action='store_true', help='Buscar CSVs en subdirectorios')
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for record in iter_analyze(args.inputs, args.output_dir, formats=tuple(args.formats or ['json']),
+                               jobs=args.jobs, recursive=args.recursive):
+        failures += record['status'] != 'ok'
+        print(json.dumps(record, default=json_default, ensure_ascii=False), flush=True)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
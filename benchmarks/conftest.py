@@ -0,0 +1,53 @@
+"""
+Fixtures compartidas para la suite de benchmarks del pipeline
+
+Los tamaños se controlan con la variable BENCH_ROWS (lista separada por comas),
+por ejemplo BENCH_ROWS=1000,100000,1000000.
+"""
+import glob
+import os
+import sys
+
+import pytest
+
+# Añadir el directorio del proyecto al path (igual que wsgi.py)
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+
+import synthetic_data
+
+BENCH_ROWS = [int(value) for value in os.environ.get('BENCH_ROWS', '10000').split(',') if value.strip()]
+BENCH_SEED = int(os.environ.get('BENCH_SEED', 42))
+MALFORMED_RATIO = float(os.environ.get('BENCH_MALFORMED_RATIO', 0.001))
+
+
+def pytest_configure(config):
+    # Sin baseline guardada (p. ej. mientras se renueva) no hay nada con qué comparar
+    storage = getattr(config.option, 'benchmark_storage', '') or ''
+    if getattr(config.option, 'benchmark_compare', None) and storage.startswith('file://'):
+        if not glob.glob(os.path.join(storage[len('file://'):], '*', '*.json')):
+            config.option.benchmark_compare = None
+            config.option.benchmark_compare_fail = None
+
+
+def pytest_generate_tests(metafunc):
+    if 'rows' in metafunc.fixturenames:
+        metafunc.parametrize('rows', BENCH_ROWS, ids=lambda rows: f'{rows}rows', scope='session')
+
+
+@pytest.fixture(scope='session')
+def csv_factory(tmp_path_factory):
+    """Genera (una sola vez por sesión) el CSV sintético pedido"""
+    cache = {}
+    directory = tmp_path_factory.mktemp('synthetic')
+
+    def make(kind, rows, malformed=False):
+        key = (kind, rows, malformed)
+        if key not in cache:
+            path = str(directory / f"{kind}_{rows}{'_malformed' if malformed else ''}.csv")
+            synthetic_data.write_csv(kind, path, rows, seed=BENCH_SEED,
+                                     malformed_ratio=MALFORMED_RATIO if malformed else 0.0)
+            cache[key] = path
+        return cache[key]
+
+    return make
@@ -0,0 +1,109 @@
+"""
+Benchmarks de cada etapa del pipeline de análisis
+
+Etapas: lectura del CSV (normal y con parser de respaldo), conversión de fechas,
+process_trading_data, process_finance_data, construcción de gráficos,
+serialización JSON y generación del PDF.
+"""
+import json
+import os
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import analysis
+import pdf_report
+from app import app
+
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', 5))
+
+
+def run_pedantic(benchmark, func, make_args):
+    """Ejecuta el benchmark con entradas nuevas en cada ronda (las funciones mutan el DataFrame)"""
+    return benchmark.pedantic(func, setup=lambda: (make_args(), {}), rounds=ROUNDS, iterations=1)
+
+
+def capture_call(target, func, *args):
+    """Ejecuta func y devuelve los argumentos con los que se llamó a target"""
+    with mock.patch.object(analysis, target, wraps=getattr(analysis, target)) as spy:
+        func(*args)
+    return spy.call_args.args
+
+
+@pytest.fixture(scope='session')
+def trading_df(csv_factory, rows):
+    return analysis.read_csv_file(csv_factory('trading', rows))
+
+
+@pytest.fixture(scope='session')
+def finance_df(csv_factory, rows):
+    return analysis.read_csv_file(csv_factory('finance', rows))
+
+
+@pytest.fixture(scope='session')
+def trading_result(trading_df):
+    return analysis.process_trading_data(trading_df.copy())
+
+
+@pytest.fixture(scope='session')
+def finance_result(finance_df):
+    return analysis.process_finance_data(finance_df.copy())
+
+
+@pytest.mark.parametrize('kind', ['trading', 'finance'])
+@pytest.mark.parametrize('malformed', [False, True], ids=['clean', 'malformed'])
+def test_ingest(benchmark, csv_factory, rows, kind, malformed):
+    path = csv_factory(kind, rows, malformed=malformed)
+    df = benchmark(analysis.read_csv_file, path)
+    assert len(df) == rows
+
+
+def test_parse_trading_dates(benchmark, trading_df):
+    columns = ['Horario de apertura', 'Hora de cierre']
+    df = run_pedantic(benchmark, analysis.parse_dates, lambda: (trading_df[columns].copy(), columns))
+    assert df['Horario de apertura'].notna().all()
+
+
+def test_parse_finance_dates(benchmark, finance_df):
+    df = run_pedantic(benchmark, analysis.parse_dates, lambda: (finance_df[['Tiempo']].copy(), ['Tiempo']))
+    assert df['Tiempo'].notna().all()
+
+
+def test_process_trading_data(benchmark, trading_df, rows):
+    result = run_pedantic(benchmark, analysis.process_trading_data, lambda: (trading_df.copy(),))
+    assert result['summary']['total_operations'] == rows
+
+
+def test_process_finance_data(benchmark, finance_df):
+    result = run_pedantic(benchmark, analysis.process_finance_data, lambda: (finance_df.copy(),))
+    assert result['summary']['deposit_transactions'] > 0
+
+
+def test_generate_charts(benchmark, trading_df):
+    args = capture_call('generate_charts', analysis.process_trading_data, trading_df.copy())
+    charts = benchmark(analysis.generate_charts, *args)
+    assert set(charts) >= {'instrument', 'evolution'}
+
+
+def test_generate_finance_charts(benchmark, finance_df):
+    args = capture_call('generate_finance_charts', analysis.process_finance_data, finance_df.copy())
+    charts = benchmark(analysis.generate_finance_charts, *args)
+    assert 'evolution' in charts
+
+
+@pytest.mark.parametrize('kind', ['trading', 'finance'])
+def test_json_serialization(benchmark, request, rows, kind):
+    result = request.getfixturevalue(f'{kind}_result')
+    payload = benchmark(app.json.dumps, result)
+    assert payload.startswith('{')
+
+
+@pytest.mark.parametrize('kind', ['trading', 'finance'])
+def test_create_analysis_pdf(benchmark, request, tmp_path, rows, kind):
+    # El PDF se genera a partir del JSON que envía el navegador, no del dict original
+    data = json.loads(app.json.dumps(request.getfixturevalue(f'{kind}_result')))
+    output = str(tmp_path / 'analysis.pdf')
+    benchmark(pdf_report.create_analysis_pdf, data, output)
+    assert os.path.getsize(output) > 0
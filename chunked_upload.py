@@ -0,0 +1,240 @@
+"""
+Subidas por bloques reanudables con lectura incremental del CSV
+
+Protocolo (ver las rutas /uploads en app.py):
+  1. init:     POST /uploads {filename, size}           -> {upload_id, offset: 0}
+  2. append:   PATCH /uploads/<id>  (cuerpo = bloque)
+               Upload-Offset: posición donde empieza el bloque
+               Upload-Checksum: sha256 <hex> | crc32 <hex>
+  3. status:   GET /uploads/<id>                         -> {offset, size}
+  4. complete: POST /uploads/<id>/complete               -> análisis
+
+Un bloque solo se confirma si su checksum coincide y empieza exactamente en
+el offset confirmado; si no, se rechaza sin tocar lo ya recibido y el cliente
+retoma desde `offset`. Cada bloque confirmado se lee con pandas en cuanto
+llega (las líneas completas, en partes guardadas en disco), de modo que al
+terminar la transferencia solo queda por leer el final del archivo.
+
+El estado vive en UPLOAD_FOLDER/.partial/<upload_id>/ para que cualquier
+worker pueda atender cualquier bloque; los locks son flock por sesión.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import zlib
+
+import pandas as pd
+
+from analysis import read_csv_file
+from storage import PARTIAL_DIR, write_json_atomic
+
+# Tamaño máximo de un archivo subido por bloques
+CHUNKED_MAX_SIZE_MB = int(os.environ.get('CHUNKED_MAX_SIZE_MB', 1024))
+
+# Tamaño de bloque recomendado al cliente (debe caber en MAX_CONTENT_LENGTH)
+CHUNKED_CHUNK_SIZE_MB = int(os.environ.get('CHUNKED_CHUNK_SIZE_MB', 4))
+
+# Bytes pendientes mínimos para leer una nueva parte (evita partes diminutas)
+PARSE_MIN_BYTES = int(os.environ.get('CHUNKED_PARSE_MIN_BYTES', 1024 * 1024))
+
+CHECKSUM_ALGORITHMS = ('sha256', 'crc32')
+
+
+class ChunkedUploadError(ValueError):
+    """Error del protocolo con el código HTTP que le corresponde"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def chunk_checksum(algorithm, data):
+    """Checksum en hexadecimal de un bloque"""
+    if algorithm == 'sha256':
+        return hashlib.sha256(data).hexdigest()
+    if algorithm == 'crc32':
+        return format(zlib.crc32(data) & 0xffffffff, '08x')
+    raise ChunkedUploadError(f'Unsupported checksum algorithm: {algorithm}')
+
+
+class _SessionLock:
+    """flock exclusivo sobre un archivo de la sesión"""
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'a')
+        try:
+            fcntl.flock(self.handle, fcntl.LOCK_EX | (0 if self.blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            self.handle.close()
+            self.handle = None
+        return self.handle is not None
+
+    def __exit__(self, *exc):
+        if self.handle:
+            self.handle.close()
+
+
+class ChunkedUploads:
+    """Sesiones de subida por bloques guardadas en disco"""
+
+    def __init__(self, root):
+        self.root = os.path.join(root, PARTIAL_DIR)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _dir(self, upload_id):
+        # upload_id lo genera el servidor (uuid hex): cualquier otra cosa no existe
+        if not (len(upload_id) == 32 and all(c in '0123456789abcdef' for c in upload_id)):
+            raise ChunkedUploadError('Upload not found', status=404)
+        path = os.path.join(self.root, upload_id)
+        if not os.path.isdir(path):
+            raise ChunkedUploadError('Upload not found', status=404)
+        return path
+
+    def _meta(self, directory):
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def create(self, filename, size=None, job_id=None):
+        """Inicia una sesión y devuelve su estado"""
+        max_size = CHUNKED_MAX_SIZE_MB * 1024 * 1024
+        if size is not None and (size < 0 or size > max_size):
+            raise ChunkedUploadError(f'File too large (max {CHUNKED_MAX_SIZE_MB} MB)', status=413)
+
+        upload_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, upload_id)
+        os.makedirs(os.path.join(directory, 'parts'))
+        open(os.path.join(directory, 'data'), 'wb').close()
+        meta = {'upload_id': upload_id, 'filename': filename, 'size': size, 'job_id': job_id,
+                'offset': 0, 'created': time.time()}
+        write_json_atomic(os.path.join(directory, 'meta.json'), meta)
+        write_json_atomic(os.path.join(directory, 'parsed.json'), {'offset': 0, 'header': None, 'parts': 0,
+                                                                   'rows': 0})
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """Estado de la sesión: offset confirmado, tamaño esperado y filas ya leídas"""
+        directory = self._dir(upload_id)
+        meta = self._meta(directory)
+        with open(os.path.join(directory, 'parsed.json'), encoding='utf-8') as f:
+            parsed = json.load(f)
+        return {
+            'upload_id': upload_id,
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'offset': meta['offset'],
+            'job_id': meta['job_id'],
+            'rows_parsed': parsed['rows'],
+            'chunk_size': CHUNKED_CHUNK_SIZE_MB * 1024 * 1024
+        }
+
+    def append(self, upload_id, offset, data, checksum):
+        """Añade un bloque verificado en `offset` y devuelve el nuevo offset confirmado"""
+        directory = self._dir(upload_id)
+        try:
+            algorithm, expected = checksum.strip().split(' ', 1)
+        except (AttributeError, ValueError):
+            raise ChunkedUploadError('Missing or malformed Upload-Checksum header')
+        if algorithm not in CHECKSUM_ALGORITHMS:
+            raise ChunkedUploadError(f'Unsupported checksum algorithm: {algorithm}')
+        if chunk_checksum(algorithm, data) != expected.strip().lower():
+            raise ChunkedUploadError('Chunk checksum mismatch', status=460)
+
+        with _SessionLock(os.path.join(directory, 'append.lock')):
+            meta = self._meta(directory)
+            if offset != meta['offset']:
+                raise ChunkedUploadError('Offset does not match', status=409, offset=meta['offset'])
+            new_offset = offset + len(data)
+            limit = meta['size'] if meta['size'] is not None else CHUNKED_MAX_SIZE_MB * 1024 * 1024
+            if new_offset > limit:
+                raise ChunkedUploadError('Chunk exceeds declared size', status=413, offset=meta['offset'])
+
+            with open(os.path.join(directory, 'data'), 'r+b') as f:
+                # Sobrescribir desde el offset confirmado descarta restos de un intento fallido
+                f.seek(offset)
+                f.write(data)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            meta['offset'] = new_offset
+            write_json_atomic(os.path.join(directory, 'meta.json'), meta)
+        return new_offset
+
+    def parse_pending(self, upload_id, final=False):
+        """Lee con pandas las líneas completas ya confirmadas que aún no se han leído
+
+        Se llama tras cada bloque (fuera de la respuesta) y al completar. Si otro
+        proceso ya está leyendo esta sesión, no hace nada salvo en la llamada final:
+        el que lee sigue con los bloques que lleguen mientras tanto.
+        """
+        directory = self._dir(upload_id)
+        with _SessionLock(os.path.join(directory, 'parse.lock'), blocking=final) as acquired:
+            if not acquired:
+                return None
+            parsed_path = os.path.join(directory, 'parsed.json')
+            with open(parsed_path, encoding='utf-8') as f:
+                state = json.load(f)
+            while self._parse_step(directory, state, final):
+                write_json_atomic(parsed_path, state)
+                if final:
+                    break
+            return state
+
+    def _parse_step(self, directory, state, final):
+        """Lee una parte nueva si hay datos suficientes; devuelve False si no había nada que leer"""
+        confirmed = self._meta(directory)['offset']
+        if not final and confirmed - state['offset'] < PARSE_MIN_BYTES:
+            return False
+
+        with open(os.path.join(directory, 'data'), 'rb') as f:
+            f.seek(state['offset'])
+            pending = f.read(confirmed - state['offset'])
+
+        if state['header'] is None:
+            newline = pending.find(b'\n')
+            if newline < 0:
+                if not final:
+                    return False
+                newline = len(pending)
+            state['header'] = pending[:newline + 1].decode('utf-8')
+            state['offset'] += newline + 1
+            pending = pending[newline + 1:]
+
+        # Solo líneas completas, salvo al final del archivo
+        end = len(pending) if final else pending.rfind(b'\n') + 1
+        if end > 0:
+            df = read_csv_file(state['header'].encode('utf-8') + pending[:end])
+            df.to_pickle(os.path.join(directory, 'parts', f"{state['parts']:06d}.pkl"))
+            state['parts'] += 1
+            state['rows'] += len(df)
+            state['offset'] += end
+        return final or end > 0
+
+    def complete(self, upload_id):
+        """Termina la lectura y devuelve (ruta de los datos, metadatos, DataFrame completo)"""
+        directory = self._dir(upload_id)
+        meta = self._meta(directory)
+        if meta['size'] is not None and meta['offset'] != meta['size']:
+            raise ChunkedUploadError('Upload is incomplete', status=409, offset=meta['offset'])
+
+        state = self.parse_pending(upload_id, final=True)
+        parts_dir = os.path.join(directory, 'parts')
+        frames = [pd.read_pickle(os.path.join(parts_dir, name)) for name in sorted(os.listdir(parts_dir))]
+        if frames:
+            df = pd.concat(frames, ignore_index=True)
+        else:
+            # Archivo con solo la cabecera (o vacío)
+            df = read_csv_file((state['header'] or '').encode('utf-8'))
+        return os.path.join(directory, 'data'), meta, df
+
+    def discard(self, upload_id):
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
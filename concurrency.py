@@ -0,0 +1,166 @@
+"""
+Modelo de concurrencia: tamaño de los workers de gunicorn y control de admisión
+
+Cada análisis carga el CSV completo en pandas, así que el límite real del
+servidor es la memoria y no el número de CPUs. worker_count() elige el número
+de workers según la memoria disponible (límite del cgroup del contenedor o
+memoria total) contando que cada uno puede tener ADMISSION_MAX_ACTIVE análisis
+en curso a la vez, y admission_gate limita cuántas rutas caras (subidas, PDF) se
+ejecutan a la vez en cada worker: las que no caben esperan en una cola
+acotada y, si la cola está llena, reciben 429 con Retry-After. Las rutas
+baratas (/files, /progress, ...) no pasan por la cola y siguen respondiendo.
+"""
+import functools
+import math
+import os
+import threading
+import time
+
+from flask import jsonify, make_response
+
+# Memoria estimada por análisis en curso (pico de un archivo grande con pandas)
+WORKER_MEMORY_MB = int(os.environ.get('GUNICORN_WORKER_MEMORY_MB', 512))
+
+# Fracción de la memoria disponible que pueden usar los workers
+WORKER_MEMORY_FRACTION = float(os.environ.get('GUNICORN_MEMORY_FRACTION', 0.75))
+
+# Rutas caras ejecutándose a la vez por worker
+ADMISSION_MAX_ACTIVE = int(os.environ.get('ADMISSION_MAX_ACTIVE', 2))
+
+# Peticiones caras esperando turno por worker (cada una ocupa un hilo)
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 4))
+
+# Segundos máximos de espera en la cola antes de responder 429
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30))
+
+# Límites de memoria de cgroup v2 y v1 (contenedores)
+CGROUP_MEMORY_FILES = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+
+
+def memory_limit_bytes():
+    """Memoria disponible para la aplicación: límite del cgroup o memoria total del sistema"""
+    total = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    total = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+
+    for path in CGROUP_MEMORY_FILES:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # 'max' (v2) o un número enorme (v1) significan sin límite
+        if value.isdigit() and (total is None or int(value) < total):
+            return int(value)
+    return total
+
+
+def worker_count(cpu_count, memory_bytes=None, worker_memory_mb=None, fraction=None, max_active=None):
+    """Workers por CPU (2 x CPUs + 1) sin superar los que caben en memoria
+
+    El peor caso es que todos los workers tengan max_active análisis en curso:
+    cada worker reserva max_active x worker_memory_mb.
+    """
+    worker_memory_mb = worker_memory_mb or WORKER_MEMORY_MB
+    fraction = fraction or WORKER_MEMORY_FRACTION
+    max_active = max_active or ADMISSION_MAX_ACTIVE
+    by_cpu = cpu_count * 2 + 1
+    if not memory_bytes:
+        return by_cpu
+    by_memory = int(memory_bytes * fraction // (worker_memory_mb * max_active * 1024 * 1024))
+    return max(1, min(by_cpu, by_memory))
+
+
+class AdmissionGate:
+    """Cola acotada para rutas caras; se usa como decorador de la vista
+
+    Seguro entre hilos (gthread) y con gevent (threading parcheado). El estado
+    es por worker: la capacidad total es workers x max_active.
+    """
+
+    def __init__(self, max_active=None, max_queue=None, queue_timeout=None):
+        self.max_active = max_active or ADMISSION_MAX_ACTIVE
+        self.max_queue = ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = ADMISSION_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_active)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.rejected = 0
+        # Duración media (exponencial) de una petición cara, para estimar Retry-After
+        self.average_seconds = 1.0
+
+    def retry_after(self):
+        """Segundos estimados hasta que se libere sitio en la cola"""
+        with self._lock:
+            turns = (self.waiting + 1) / self.max_active
+            return max(1, math.ceil(self.average_seconds * turns))
+
+    def acquire(self):
+        """Reserva un hueco; devuelve False si la cola está llena o se agota la espera"""
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+        try:
+            admitted = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not admitted:
+            with self._lock:
+                self.rejected += 1
+        return admitted
+
+    def release(self, elapsed):
+        with self._lock:
+            self.average_seconds = 0.8 * self.average_seconds + 0.2 * elapsed
+        self._slots.release()
+
+    def busy_response(self):
+        response = jsonify({'error': 'Server busy, please retry later'})
+        response.headers['Retry-After'] = str(self.retry_after())
+        return response, 429
+
+    def __call__(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.acquire():
+                return self.busy_response()
+            started = time.perf_counter()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.release(time.perf_counter() - started)
+        return wrapper
+
+    def streaming(self, view):
+        """Como el decorador normal, para vistas que devuelven un stream
+
+        El trabajo de un stream ocurre mientras se envía, después de volver de la
+        vista: el hueco se libera cuando el servidor cierra la respuesta.
+        """
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.acquire():
+                return self.busy_response()
+            started = time.perf_counter()
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                self.release(time.perf_counter() - started)
+                raise
+            if response.is_streamed:
+                response.call_on_close(lambda: self.release(time.perf_counter() - started))
+            else:
+                self.release(time.perf_counter() - started)
+            return response
+        return wrapper
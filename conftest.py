@@ -0,0 +1,18 @@
+"""
+Configuración común de las pruebas
+
+La aplicación no arranca sin el bundle de Plotly.js: se genera una vez en un
+directorio temporal antes de importar app.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+if 'PLOTLY_BUNDLE_DIR' not in os.environ:
+    os.environ['PLOTLY_BUNDLE_DIR'] = tempfile.mkdtemp(prefix='ctd_plotly_')
+    atexit.register(shutil.rmtree, os.environ['PLOTLY_BUNDLE_DIR'], True)
+
+import plotly_bundle  # noqa: E402
+
+plotly_bundle.build_bundle()
@@ -0,0 +1,141 @@
+"""
+Caché de datasets ya leídos y tipados, compartida entre los workers de gunicorn
+
+Cada dataset se guarda una vez, por el sha256 de su contenido, como archivo
+Arrow IPC sin comprimir (por defecto en /dev/shm, memoria compartida). Los
+workers lo abren con mmap: las columnas numéricas y de fecha sin nulos del
+DataFrame apuntan directamente a esas páginas, sin copias, así que esa parte
+de la memoria no crece con el número de workers que analizan la misma cuenta.
+Las columnas de texto solo se comparten con pandas 3 (cadenas respaldadas por
+Arrow); con pandas 2 cada worker las convierte a objetos Python propios, y
+los nulos también obligan a copiar la columna.
+
+Cada worker que tiene un dataset abierto mantiene un flock compartido sobre su
+archivo (referencia) mientras el DataFrame existe; la expulsión LRU por
+presupuesto solo elimina los archivos que nadie tiene abiertos.
+"""
+import fcntl
+import mmap
+import os
+import re
+import tempfile
+import time
+import weakref
+
+import pyarrow as pa
+
+from sweeper import select_evictions
+
+# Directorio de la caché: memoria compartida si existe /dev/shm
+DATASET_CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'copytrading-datasets'))
+
+# Tamaño máximo de la caché (0 = desactivada)
+DATASET_CACHE_MB = int(os.environ.get('DATASET_CACHE_MB', 512))
+
+# Cambiarla cuando cambie cómo se leen o tipan los CSV: invalida lo ya guardado
+FORMAT_VERSION = 1
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class DatasetCache:
+    """Datasets tipados por sha256 del contenido, abiertos con mmap y expulsados por LRU"""
+
+    def __init__(self, directory=None, budget_bytes=None):
+        self.directory = directory or DATASET_CACHE_DIR
+        self.budget_bytes = DATASET_CACHE_MB * 1024 * 1024 if budget_bytes is None else budget_bytes
+        if self.budget_bytes:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        if not KEY_PATTERN.match(key or ''):
+            raise ValueError(f'Invalid dataset key: {key}')
+        return os.path.join(self.directory, f'{key}-v{FORMAT_VERSION}.arrow')
+
+    def get(self, key):
+        """DataFrame del dataset (sobre el mmap cuando se puede), o None si no está en caché"""
+        if not self.budget_bytes:
+            return None
+        try:
+            handle = open(self.path(key), 'rb')
+        except FileNotFoundError:
+            return None
+        # Referencia compartida: impide que otro proceso lo expulse mientras se usa
+        fcntl.flock(handle, fcntl.LOCK_SH)
+        try:
+            # mmap del mismo descriptor bloqueado (no de la ruta, que otro worker puede reemplazar)
+            buffer = pa.py_buffer(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+            df = pa.ipc.open_file(buffer).read_all().to_pandas(split_blocks=True)
+        except (OSError, ValueError, pa.ArrowInvalid):
+            # Expulsado justo antes de abrirlo o archivo incompleto
+            handle.close()
+            return None
+        # Marcar como usado para el LRU
+        os.utime(handle.fileno())
+        # La referencia se libera cuando el DataFrame deja de existir
+        weakref.finalize(df, handle.close)
+        return df
+
+    def put(self, key, df):
+        """Guarda un DataFrame y devuelve su versión en caché (la original si no cabe)"""
+        if not self.budget_bytes:
+            return df
+        path = self.path(key)
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if table.nbytes > self.budget_bytes:
+                return df
+            self.evict(self.budget_bytes - table.nbytes)
+            # Escribir aparte y renombrar: ningún worker ve un archivo a medias
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    with pa.ipc.new_file(f, table.schema) as writer:
+                        writer.write_table(table)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except (OSError, pa.ArrowException) as e:
+            # p. ej. /dev/shm lleno o columnas que Arrow no sabe convertir
+            print(f"⚠️  No se pudo guardar el dataset {key} en caché: {str(e)}")
+            return df
+        cached = self.get(key)
+        return df if cached is None else cached
+
+    def load(self, key, loader):
+        """Dataset en caché o, si no está, el resultado de loader() guardado en caché"""
+        df = self.get(key)
+        if df is None:
+            df = self.put(key, loader())
+        return df
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.arrow'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stats = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append({'path': path, 'size': stats.st_size, 'accessed': stats.st_mtime})
+        return entries
+
+    def evict(self, budget_bytes=None):
+        """Elimina los datasets usados hace más tiempo hasta caber en el presupuesto
+
+        Los que algún worker tiene abiertos se conservan aunque se pase del presupuesto.
+        """
+        budget_bytes = self.budget_bytes if budget_bytes is None else budget_bytes
+        removed = []
+        for item in select_evictions(self.entries(), time.time(), 0, max(budget_bytes, 1)):
+            try:
+                with open(item['path'], 'rb') as handle:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.unlink(item['path'])
+                removed.append(item['path'])
+            except (BlockingIOError, FileNotFoundError):
+                continue
+        return removed
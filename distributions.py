@@ -0,0 +1,202 @@
+"""
+Distribuciones de resultados de las operaciones con memoria fija
+
+Histogramas de Utilidad por operación, de tiempo de permanencia
+(Hora de cierre − Horario de apertura) y de P&L por hora del día × día de la
+semana. Se calculan en el servidor con np.histogram / np.bincount sobre bordes
+fijos, de modo que el tamaño de la respuesta no depende del número de
+operaciones. Los acumuladores admiten actualizaciones por bloques (streaming)
+y se pueden combinar entre sí (merge) siempre que usen los mismos bordes.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Número de intervalos del histograma de P&L
+PNL_HISTOGRAM_BINS = int(os.environ.get('PNL_HISTOGRAM_BINS', 40))
+
+# Bordes del tiempo de permanencia en minutos (escala aproximadamente logarítmica)
+HOLDING_EDGES_MINUTES = [0, 1, 2, 5, 10, 15, 30, 60, 120, 240, 480, 1440, 2880, 10080, 20160, 43200]
+HOLDING_LABELS = ['<1m', '1-2m', '2-5m', '5-10m', '10-15m', '15-30m', '30-60m', '1-2h', '2-4h', '4-8h',
+                  '8-24h', '1-2d', '2-7d', '1-2sem', '2-4sem']
+
+WEEKDAYS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+
+class FixedHistogram:
+    """Histograma de bordes fijos, acumulable por bloques y combinable"""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        counts, _ = np.histogram(values, bins=self.edges)
+        self.counts += counts
+        self.underflow += int((values < self.edges[0]).sum())
+        self.overflow += int((values > self.edges[-1]).sum())
+        return self
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('Cannot merge histograms with different edges')
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    def to_dict(self):
+        return {
+            'edges': self.edges.tolist(),
+            'counts': self.counts.tolist(),
+            'underflow': self.underflow,
+            'overflow': self.overflow,
+            'total': int(self.counts.sum()) + self.underflow + self.overflow
+        }
+
+
+class HourWeekdayGrid:
+    """P&L y número de operaciones por día de la semana × hora (7 × 24 celdas)"""
+
+    def __init__(self):
+        self.pnl = np.zeros(7 * 24, dtype=float)
+        self.trades = np.zeros(7 * 24, dtype=np.int64)
+
+    def update(self, times, pnl):
+        times = pd.DatetimeIndex(pd.to_datetime(pd.Series(times), errors='coerce'))
+        pnl = np.asarray(pnl, dtype=float)
+        mask = ~np.asarray(times.isna()) & ~np.isnan(pnl)
+        weekday = np.asarray(times.weekday)[mask].astype(np.int64)
+        hour = np.asarray(times.hour)[mask].astype(np.int64)
+        cells = weekday * 24 + hour
+        self.pnl += np.bincount(cells, weights=pnl[mask], minlength=7 * 24)
+        self.trades += np.bincount(cells, minlength=7 * 24)
+        return self
+
+    def merge(self, other):
+        self.pnl += other.pnl
+        self.trades += other.trades
+        return self
+
+    def to_dict(self):
+        return {
+            'weekdays': WEEKDAYS,
+            'hours': list(range(24)),
+            'pnl': np.round(self.pnl, 2).reshape(7, 24).tolist(),
+            'trades': self.trades.reshape(7, 24).tolist()
+        }
+
+
+def pnl_edges(values, bins=None):
+    """Bordes simétricos alrededor de 0 que cubren del percentil 1 al 99"""
+    bins = bins or PNL_HISTOGRAM_BINS
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.linspace(-1.0, 1.0, bins + 1)
+
+    # Las colas extremas van a underflow/overflow para no aplastar el resto
+    low, high = np.percentile(values, [1, 99])
+    limit = max(abs(low), abs(high)) or 1.0
+    half = max(bins // 2, 1)
+    step = limit / half
+    return np.arange(-half, half + 1) * step
+
+
+class TradeDistributions:
+    """Acumulador de las tres distribuciones de un conjunto de operaciones"""
+
+    def __init__(self, pnl_edges):
+        self.pnl = FixedHistogram(pnl_edges)
+        self.holding = FixedHistogram(HOLDING_EDGES_MINUTES)
+        self.hour_weekday = HourWeekdayGrid()
+
+    def update(self, df):
+        """Añade un bloque de operaciones con fechas ya convertidas"""
+        self.pnl.update(df['Utilidad'])
+        holding = (df['Hora de cierre'] - df['Horario de apertura']).dt.total_seconds() / 60.0
+        # Duraciones negativas indican datos inconsistentes: se descartan
+        self.holding.update(holding.where(holding >= 0))
+        self.hour_weekday.update(df['Horario de apertura'], df['Utilidad'])
+        return self
+
+    def merge(self, other):
+        self.pnl.merge(other.pnl)
+        self.holding.merge(other.holding)
+        self.hour_weekday.merge(other.hour_weekday)
+        return self
+
+    def to_dict(self):
+        holding = self.holding.to_dict()
+        holding['labels'] = HOLDING_LABELS
+        return {
+            'pnl': self.pnl.to_dict(),
+            'holding_minutes': holding,
+            'hour_weekday': self.hour_weekday.to_dict()
+        }
+
+
+def compute_distributions(df):
+    """Calcula las distribuciones de un DataFrame de operaciones completo"""
+    return TradeDistributions(pnl_edges(df['Utilidad'])).update(df).to_dict()
+
+
+def generate_distribution_charts(distributions):
+    """Gráficos de las distribuciones en el formato de Plotly.js"""
+    pnl = distributions['pnl']
+    edges = np.asarray(pnl['edges'])
+    centers = np.round((edges[:-1] + edges[1:]) / 2, 2).tolist()
+    holding = distributions['holding_minutes']
+    grid = distributions['hour_weekday']
+    return {
+        'pnl_histogram': {
+            'data': [{
+                'x': centers,
+                'y': pnl['counts'],
+                'type': 'bar',
+                'marker': {'color': ['#d73027' if c < 0 else '#1a9850' for c in centers]}
+            }],
+            'layout': {
+                'title': 'Distribución de Ganancia/Pérdida por Operación',
+                'xaxis': {'title': 'Ganancia/Pérdida ($)'},
+                'yaxis': {'title': 'Operaciones'},
+                'bargap': 0.05,
+                'height': 500
+            }
+        },
+        'holding_histogram': {
+            'data': [{
+                'x': holding['labels'],
+                'y': holding['counts'],
+                'type': 'bar',
+                'marker': {'color': '#667eea'}
+            }],
+            'layout': {
+                'title': 'Distribución del Tiempo de Permanencia',
+                'xaxis': {'title': 'Duración'},
+                'yaxis': {'title': 'Operaciones'},
+                'height': 500
+            }
+        },
+        'hour_weekday': {
+            'data': [{
+                'x': grid['hours'],
+                'y': grid['weekdays'],
+                'z': grid['pnl'],
+                'type': 'heatmap',
+                'colorscale': 'RdYlGn',
+                'zmid': 0
+            }],
+            'layout': {
+                'title': 'Ganancia/Pérdida por Hora y Día de la Semana',
+                'xaxis': {'title': 'Hora de apertura', 'dtick': 1},
+                'yaxis': {'autorange': 'reversed'},
+                'height': 500
+            }
+        }
+    }
@@ -0,0 +1,120 @@
+"""
+Evolución conjunta de depósitos y ganancia/pérdida realizada de una cuenta
+
+Alinea los depósitos manuales acumulados (archivo de finanzas) con la
+ganancia/pérdida realizada acumulada (archivo de posiciones cerradas)
+mediante un merge as-of sobre los tiempos ordenados: cada instante toma el
+último valor conocido de cada serie. El coste es lineal en el número total de
+filas (más la ordenación), sin productos cartesianos ni búsquedas por fila.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from analysis import parse_dates
+from rolling_analytics import evaluation_times
+
+# Puntos máximos de la serie devuelta
+EQUITY_MAX_POINTS = int(os.environ.get('EQUITY_MAX_POINTS', 1000))
+
+
+def cumulative_events(times, amounts, column):
+    """Serie acumulada ordenada por tiempo, con un valor por instante"""
+    events = pd.DataFrame({'time': times, column: pd.to_numeric(amounts, errors='coerce')})
+    events = events.dropna(subset=['time']).fillna({column: 0.0})
+    events = events.sort_values('time', kind='stable')
+    events[column] = events[column].cumsum()
+    # Si varias filas comparten instante, quedarse con el acumulado final
+    return events.drop_duplicates('time', keep='last').reset_index(drop=True)
+
+
+def manual_deposits(finance_df):
+    """Depósitos manuales (mismo criterio que process_finance_data)"""
+    parse_dates(finance_df, ['Tiempo'])
+    deposits = finance_df[(finance_df['Tipo'] == 'Depósito') & (finance_df['Pasarela de pago'] == 'Manual')]
+    return cumulative_events(deposits['Tiempo'], deposits['Monto'], 'deposits')
+
+
+def realized_pnl(trading_df):
+    """Ganancia/pérdida realizada acumulada en la hora de cierre de cada operación"""
+    parse_dates(trading_df, ['Horario de apertura', 'Hora de cierre'])
+    trades = trading_df.dropna(subset=['Horario de apertura', 'Hora de cierre'])
+    return cumulative_events(trades['Hora de cierre'], trades['Utilidad'], 'pnl')
+
+
+def build_equity_timeline(trading_df, finance_df, max_points=None):
+    """Serie de depósitos, P&L, capital y ROI alineados en el tiempo, más un resumen"""
+    max_points = max_points or EQUITY_MAX_POINTS
+    deposits = manual_deposits(finance_df)
+    pnl = realized_pnl(trading_df)
+
+    # Instantes de la serie: todos los eventos, o una rejilla regular si superan el presupuesto
+    all_times = np.union1d(deposits['time'].to_numpy(dtype='datetime64[ns]').astype(np.int64),
+                           pnl['time'].to_numpy(dtype='datetime64[ns]').astype(np.int64))
+    if len(all_times) == 0:
+        timeline = pd.DataFrame({'time': pd.DatetimeIndex([], dtype='datetime64[ns]')})
+    else:
+        timeline = pd.DataFrame({'time': pd.to_datetime(evaluation_times(all_times, max_points))})
+
+    # Merge as-of: cada instante toma el último acumulado conocido de cada serie
+    timeline = pd.merge_asof(timeline, deposits.astype({'time': 'datetime64[ns]'}), on='time', direction='backward')
+    timeline = pd.merge_asof(timeline, pnl.astype({'time': 'datetime64[ns]'}), on='time', direction='backward')
+    timeline[['deposits', 'pnl']] = timeline[['deposits', 'pnl']].fillna(0.0)
+    timeline['equity'] = timeline['deposits'] + timeline['pnl']
+    # ROI sobre el capital depositado hasta ese instante (indefinido sin depósitos)
+    timeline['roi'] = timeline['pnl'] / timeline['deposits'].where(timeline['deposits'] > 0) * 100
+
+    total_deposits = float(deposits['deposits'].iloc[-1]) if len(deposits) else 0.0
+    total_pnl = float(pnl['pnl'].iloc[-1]) if len(pnl) else 0.0
+
+    return {
+        'summary': {
+            'total_deposits': round(total_deposits, 2),
+            'realized_pnl': round(total_pnl, 2),
+            'final_equity': round(total_deposits + total_pnl, 2),
+            'roi': round(total_pnl / total_deposits * 100, 2) if total_deposits > 0 else None,
+            'deposit_count': len(deposits),
+            'trade_count': int(len(trading_df.dropna(subset=['Hora de cierre']))),
+            'start': timeline['time'].min().strftime('%Y-%m-%d %H:%M:%S') if len(timeline) else None,
+            'end': timeline['time'].max().strftime('%Y-%m-%d %H:%M:%S') if len(timeline) else None
+        },
+        'series': {
+            'x': timeline['time'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+            'deposits': timeline['deposits'].round(2).tolist(),
+            'pnl': timeline['pnl'].round(2).tolist(),
+            'equity': timeline['equity'].round(2).tolist(),
+            'roi': [None if np.isnan(v) else v for v in timeline['roi'].round(2).tolist()]
+        }
+    }
+
+
+def generate_equity_charts(timeline):
+    """Gráficos de capital vs. depósitos y de ROI en el formato de Plotly.js"""
+    series = timeline['series']
+    return {
+        'equity': {
+            'data': [
+                {'x': series['x'], 'y': series['equity'], 'type': 'scatter', 'mode': 'lines', 'name': 'Capital'},
+                {'x': series['x'], 'y': series['deposits'], 'type': 'scatter', 'mode': 'lines',
+                 'name': 'Depósitos Acumulados', 'line': {'dash': 'dot'}},
+                {'x': series['x'], 'y': series['pnl'], 'type': 'scatter', 'mode': 'lines',
+                 'name': 'Ganancia/Pérdida Acumulada'}
+            ],
+            'layout': {
+                'title': 'Capital vs. Depósitos en el Tiempo',
+                'xaxis': {'title': 'Fecha'},
+                'yaxis': {'title': 'Monto ($)'},
+                'height': 500
+            }
+        },
+        'roi': {
+            'data': [{'x': series['x'], 'y': series['roi'], 'type': 'scatter', 'mode': 'lines', 'name': 'ROI'}],
+            'layout': {
+                'title': 'Rentabilidad sobre el Capital Depositado',
+                'xaxis': {'title': 'Fecha'},
+                'yaxis': {'title': 'ROI (%)'},
+                'height': 500
+            }
+        }
+    }
@@ -0,0 +1,305 @@
+"""
+Exportación de las tablas de un análisis en Parquet, XLSX o CSV como stream
+
+Tablas de un análisis de trading: summary, monthly_stats, instrument_stats,
+reason_stats (del análisis guardado) y trades, una fila por operación ordenada
+por cierre con la utilidad acumulada (del dataset). Las de finanzas: summary,
+monthly_stats y transactions.
+
+Cada escritor es un generador de bloques de bytes: las filas se convierten y
+se escriben por lotes de EXPORT_BATCH_ROWS y cada bloque se envía en cuanto
+está listo, así que ni la tabla de operaciones ni el archivo resultante
+tienen que estar enteros en memoria. Varias tablas (o varias cuentas) se
+empaquetan en un ZIP escrito también como stream. El XLSX se genera
+directamente (SpreadsheetML mínimo, una hoja por tabla) sin dependencias.
+"""
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_FORMATS = ('parquet', 'xlsx', 'csv')
+
+# Filas convertidas y escritas de una vez
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', 50000))
+
+TABLES = {
+    'trading': ('summary', 'monthly_stats', 'instrument_stats', 'reason_stats', 'trades'),
+    'finance': ('summary', 'monthly_stats', 'transactions')
+}
+
+MIMETYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'zip': 'application/zip'
+}
+
+# Filas de datos por hoja (Excel admite 1.048.576 contando la cabecera)
+XLSX_MAX_ROWS = 1048575
+
+# Caracteres de control que XML no admite
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class StreamBuffer:
+    """Archivo de solo escritura (sin seek) cuyo contenido se recoge con drain()"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class TableBatches:
+    """Lotes de una tabla con el esquema Arrow de la tabla entera
+
+    El tipo de una columna no se puede deducir de un solo lote: una columna
+    de texto vacía en el primero saldría como null y el resto no encajaría.
+    """
+
+    def __init__(self, batches, schema):
+        self.batches = batches
+        self.schema = schema
+
+    def __iter__(self):
+        return iter(self.batches)
+
+
+def table_schema(df, extra=None):
+    """Esquema Arrow de un DataFrame completo, más columnas añadidas al exportar"""
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for name, dtype in (extra or {}).items():
+        schema = schema.append(pa.field(name, dtype))
+    return schema
+
+
+def trades_batches(df, size=None):
+    """Operaciones con fechas válidas ordenadas por cierre, con la utilidad acumulada, por lotes"""
+    size = size or EXPORT_BATCH_ROWS
+    df = df.dropna(subset=['Horario de apertura', 'Hora de cierre'])
+    # Solo se ordena un array de índices; las filas se copian lote a lote
+    order = np.argsort(df['Hora de cierre'].to_numpy(), kind='stable')
+    cumulative = np.cumsum(pd.to_numeric(df['Utilidad'], errors='coerce').fillna(0).to_numpy()[order])
+    for start in range(0, len(order), size):
+        batch = df.take(order[start:start + size]).reset_index(drop=True)
+        batch['Utilidad acumulada'] = cumulative[start:start + size]
+        yield batch
+
+
+def transactions_batches(df, size=None):
+    """Transacciones con fecha válida ordenadas por fecha, por lotes"""
+    size = size or EXPORT_BATCH_ROWS
+    df = df.dropna(subset=['Tiempo'])
+    order = np.argsort(df['Tiempo'].to_numpy(), kind='stable')
+    for start in range(0, len(order), size):
+        yield df.take(order[start:start + size]).reset_index(drop=True)
+
+
+def analysis_tables(analysis, load_dataset, names=None):
+    """Tablas pedidas de un análisis como {nombre: iterable de DataFrames}
+
+    `load_dataset` devuelve el DataFrame tipado; solo se llama si se pide la
+    tabla de operaciones o transacciones.
+    """
+    file_type = analysis.get('file_type', 'trading')
+    available = TABLES[file_type]
+    names = names or available
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f'Unknown tables for {file_type} analysis: {unknown}')
+
+    tables = {}
+    for name in names:
+        if name == 'summary':
+            tables[name] = [pd.DataFrame([analysis['summary']])]
+        elif name == 'trades':
+            df = load_dataset()
+            tables[name] = TableBatches(trades_batches(df), table_schema(df, {'Utilidad acumulada': pa.float64()}))
+        elif name == 'transactions':
+            df = load_dataset()
+            tables[name] = TableBatches(transactions_batches(df), table_schema(df))
+        else:
+            tables[name] = [pd.DataFrame(analysis.get(name) or [])]
+    return tables
+
+
+def stream_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+
+def stream_parquet(frames):
+    buffer = StreamBuffer()
+    writer = None
+    # Esquema de la tabla entera si se conoce (TableBatches); si no, el del primer lote
+    schema = getattr(frames, 'schema', None)
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+        if writer is None:
+            schema = table.schema
+            writer = pq.ParquetWriter(buffer, schema)
+        # Un row group por lote
+        writer.write_table(table)
+        yield buffer.drain()
+    if writer is None:
+        if schema is None:
+            return
+        # Tabla sin filas: archivo vacío con sus columnas
+        writer = pq.ParquetWriter(buffer, schema)
+    writer.close()
+    yield buffer.drain()
+
+
+def _column_cells(series):
+    """Celdas SpreadsheetML de una columna (vectorizado por columna)"""
+    if pd.api.types.is_bool_dtype(series):
+        return '<c t="b"><v>' + series.astype(int).astype(str) + '</v></c>'
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.astype(float)
+        text = series.astype(str) if pd.api.types.is_integer_dtype(series) else values.map(repr)
+        cells = '<c><v>' + text + '</v></c>'
+        return cells.where(np.isfinite(values), '<c/>')
+    if pd.api.types.is_datetime64_any_dtype(series):
+        text = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+    else:
+        text = series.astype(object).where(series.notna(), None)
+    text = text.map(lambda value: None if value is None or value != value
+                    else escape(_XML_INVALID.sub('', str(value))))
+    cells = '<c t="inlineStr"><is><t xml:space="preserve">' + text + '</t></is></c>'
+    return cells.where(text.notna(), '<c/>')
+
+
+def _xlsx_rows(frame):
+    if frame.empty:
+        return ''
+    rows = pd.Series('<row>', index=frame.index)
+    for column in frame.columns:
+        rows = rows + _column_cells(frame[column])
+    return ''.join(rows + '</row>')
+
+
+def _xlsx_header(columns):
+    cells = ''.join(f'<c t="inlineStr"><is><t>{escape(str(column))}</t></is></c>' for column in columns)
+    return f'<row>{cells}</row>'
+
+
+SHEET_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+SHEET_END = '</sheetData></worksheet>'
+
+
+def stream_xlsx(sheets):
+    """XLSX con una hoja por tabla; las tablas de más de XLSX_MAX_ROWS siguen en otra hoja"""
+    buffer = StreamBuffer()
+    names = []
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+
+        def new_sheet(name, columns):
+            # Nombres de hoja de 31 caracteres como máximo
+            part = sum(1 for existing in names if existing.startswith(name[:28]))
+            names.append(name[:31] if not part else f'{name[:28]}_{part + 1}')
+            sheet = archive.open(f'xl/worksheets/sheet{len(names)}.xml', 'w')
+            sheet.write((SHEET_START + _xlsx_header(columns)).encode('utf-8'))
+            return sheet
+
+        def close_sheet(sheet):
+            sheet.write(SHEET_END.encode('utf-8'))
+            sheet.close()
+
+        for name, frames in sheets.items():
+            sheet = None
+            rows = 0
+            for frame in frames:
+                start = 0
+                while sheet is None or start < len(frame):
+                    if sheet is None or rows == XLSX_MAX_ROWS:
+                        if sheet is not None:
+                            close_sheet(sheet)
+                        sheet = new_sheet(name, frame.columns)
+                        rows = 0
+                    chunk = frame.iloc[start:start + XLSX_MAX_ROWS - rows]
+                    sheet.write(_xlsx_rows(chunk).encode('utf-8'))
+                    rows += len(chunk)
+                    start += len(chunk)
+                    yield buffer.drain()
+            # Una tabla sin lotes (sin operaciones) también tiene su hoja, vacía
+            close_sheet(sheet if sheet is not None else new_sheet(name, []))
+
+        sheets_xml = ''.join(f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>'
+                             for i, name in enumerate(names, 1))
+        relations = ''.join(f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                            f'relationships/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                            for i in range(1, len(names) + 1))
+        overrides = ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/'
+                            f'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                            for i in range(1, len(names) + 1))
+        archive.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'{overrides}</Types>'))
+        archive.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+            'officeDocument" Target="xl/workbook.xml"/></Relationships>'))
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheets_xml}</sheets></workbook>'))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{relations}</Relationships>'))
+    yield buffer.drain()
+
+
+def stream_zip(files):
+    """ZIP de archivos dados como (nombre, generador de bytes), escrito como stream"""
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in files:
+            with archive.open(name, 'w', force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    yield buffer.drain()
+    yield buffer.drain()
+
+
+def export_files(tables, export_format, prefix=''):
+    """Archivos (nombre, generador) de unas tablas: un XLSX con todas o un archivo por tabla"""
+    if export_format == 'xlsx':
+        return [(f'{prefix}analysis.xlsx', stream_xlsx(tables))]
+    writer = stream_parquet if export_format == 'parquet' else stream_csv
+    return [(f'{prefix}{name}.{export_format}', writer(frames)) for name, frames in tables.items()]
@@ -2,13 +2,32 @@
 
 import os
 import multiprocessing
+import subprocess
+import sys
+
+# Importar concurrency.py aunque gunicorn se lance desde otro directorio
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from concurrency import memory_limit_bytes, worker_count
 
 # Configuración del servidor
 bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
-worker_connections = 1000
-timeout = 30
+
+# Workers: un número fijo o 'auto' (2 x CPUs + 1, limitado por la memoria disponible,
+# GUNICORN_WORKER_MEMORY_MB y ADMISSION_MAX_ACTIVE, porque cada análisis carga el CSV
+# entero en pandas y un worker puede tener varios en curso)
+_workers = os.environ.get('GUNICORN_WORKERS', 'auto')
+workers = int(_workers) if _workers.isdigit() else worker_count(multiprocessing.cpu_count(), memory_limit_bytes())
+
+# sync | gthread | gevent. gthread: los streams de progreso (/progress, SSE) y las
+# rutas baratas ocupan un hilo, no un proceso entero. gevent requiere instalar gevent.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Con gthread, dejar hilos libres para rutas baratas:
+# ADMISSION_MAX_ACTIVE + ADMISSION_MAX_QUEUE + PROGRESS_MAX_STREAMS < threads
+threads = int(os.environ.get('GUNICORN_THREADS', 12))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# Los PDF y los análisis de archivos grandes tardan más de 30 s
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
 keepalive = 2
 
 # Configuración de logging
@@ -24,10 +43,35 @@ limit_request_field_size = 8190
 # Configuración de procesos
 max_requests = 1000
 max_requests_jitter = 100
-preload_app = True
+# Con gevent, la aplicación se importa tras el monkey patching en cada worker
+# (si no, los locks de concurrency.py bloquearían el worker entero)
+preload_app = worker_class != 'gevent'
 
 # Configuración de archivos estáticos (nginx se encargará de esto)
 # raw_env = [
 #     'UPLOAD_FOLDER=/var/www/copytrading-dashboard/uploads',
 #     'SECRET_KEY=your-secret-key-here'
 # ]
+
+# Barrido de retención (sweeper.py): un único proceso por instancia lanzado por el
+# master, no uno por worker. Desactivar con SWEEPER_ENABLED=false.
+# El master lanza el supervisor (sweeper.py --supervise), que es quien arranca el
+# barrido y lo relanza si termina: el master recoge a sus hijos con waitpid(-1),
+# así que no puede esperar él mismo al barrido para saber con qué código terminó.
+def when_ready(server):
+    if os.environ.get('SWEEPER_ENABLED', 'true').lower() != 'true':
+        return
+    sweeper_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sweeper.py')
+    server.sweeper_process = subprocess.Popen([sys.executable, sweeper_path, '--supervise'])
+    server.log.info(f"Supervisor del sweeper iniciado (pid {server.sweeper_process.pid})")
+
+def on_exit(server):
+    process = getattr(server, 'sweeper_process', None)
+    if process is None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.log.warning("El supervisor del sweeper no terminó en 10 s; se mata")
+        process.kill()
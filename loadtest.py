@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga: arranca gunicorn con la configuración de producción y le envía tráfico mixto
+
+Reproduce a un ritmo objetivo (llegadas de Poisson, en lazo abierto) una mezcla
+configurable de subidas de CSVs sintéticos de varios tamaños, PDFs, listados
+(/files) y descargas (/download). La latencia se mide desde el instante en que
+tocaba enviar cada petición, así que incluye la espera en el cliente cuando el
+servidor no da abasto (sin "coordinated omission").
+
+Informa por ruta de p50/p95/p99, throughput y tasas de error, rechazo (429) y
+timeout, más la memoria (RSS) de cada proceso de gunicorn, y guarda todo en un
+JSON para comparar ejecuciones (--compare).
+
+Cada subida es un archivo distinto (cambia el ID de la primera operación) salvo
+una fracción --repeat que repite uno ya subido y prueba la caché de resultados.
+
+Uso:
+    python loadtest.py --rate 5 --duration 60
+    python loadtest.py --mix upload=2,pdf=1,files=4,download=3 --sizes 1000,20000,100000 -o carga.json
+    python loadtest.py --env GUNICORN_WORKERS=4 --env GUNICORN_THREADS=16 --compare carga.json
+    python loadtest.py --url http://localhost:5000       # contra un servidor ya arrancado
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+from synthetic_data import generate_csv_bytes
+
+ENDPOINTS = ('upload', 'pdf', 'files', 'download')
+DEFAULT_MIX = 'upload=3,pdf=1,files=4,download=2'
+DEFAULT_SIZES = '1000,10000,50000'
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_mix(text):
+    """'upload=3,files=1' -> {'upload': 3.0, 'files': 1.0}"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f'Unknown endpoint in mix: {name} (use {", ".join(ENDPOINTS)})')
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError('The mix needs at least one endpoint with positive weight')
+    return mix
+
+
+def arrival_schedule(rate, duration, mix, seed=42):
+    """Instantes (segundos desde el inicio) y ruta de cada petición: Poisson a `rate` por segundo"""
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    schedule = []
+    offset = rng.expovariate(rate)
+    while offset < duration:
+        schedule.append((offset, rng.choices(names, weights)[0]))
+        offset += rng.expovariate(rate)
+    return schedule
+
+
+def summarize(samples, elapsed):
+    """Latencias (ms) y tasas de unas muestras {'status', 'latency', 'timeout'}"""
+    total = len(samples)
+    timeouts = sum(1 for sample in samples if sample['timeout'])
+    rejected = sum(1 for sample in samples if sample['status'] == 429)
+    errors = sum(1 for sample in samples if not sample['timeout'] and sample['status'] != 429
+                 and not 200 <= (sample['status'] or 0) < 400)
+    latencies = np.array([sample['latency'] for sample in samples if not sample['timeout']]) * 1000
+    summary = {
+        'requests': total,
+        'ok': total - timeouts - rejected - errors,
+        'errors': errors,
+        'rejected': rejected,
+        'timeouts': timeouts,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'rejected_rate': round(rejected / total, 4) if total else 0.0,
+        'timeout_rate': round(timeouts / total, 4) if total else 0.0,
+        'throughput': round((total - timeouts - rejected - errors) / elapsed, 3) if elapsed else 0.0
+    }
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary.update(p50_ms=round(p50, 1), p95_ms=round(p95, 1), p99_ms=round(p99, 1),
+                       max_ms=round(float(latencies.max()), 1))
+    return summary
+
+
+def multipart_body(fields, files):
+    """Cuerpo multipart/form-data: campos de texto y archivos (nombre, contenido)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: text/csv\r\n\r\n'.encode())
+        parts.append(content)
+        parts.append(b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Payloads:
+    """CSVs de trading sintéticos por tamaño; cada subida es un archivo distinto salvo las repetidas"""
+
+    def __init__(self, sizes, seed=42):
+        self.files = {rows: generate_csv_bytes('trading', rows, seed=seed + rows) for rows in sizes}
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def unique(self, rows):
+        """El CSV base con otro ID en la primera operación (otro contenido, mismo tamaño)"""
+        content = self.files[rows]
+        start = content.index(b'\n') + 1
+        end = content.index(b',', start)
+        with self.lock:
+            self.counter += 1
+            number = self.counter
+        new_id = f'L{number:0{end - start - 1}d}'.encode()[:end - start]
+        return content[:start] + new_id + content[end:]
+
+
+class HttpClient:
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, headers=None):
+        """(estado, cuerpo); lee la respuesta entera, como un navegador"""
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+
+class LoadTest:
+    """Envía el tráfico de la prueba y recoge una muestra por petición"""
+
+    def __init__(self, client, payloads, repeat=0.1, seed=42):
+        self.client = client
+        self.payloads = payloads
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        # Análisis recientes (para /generate_pdf) y archivos subidos (para /download)
+        self.analyses = deque(maxlen=50)
+        self.uploaded = {}
+        self.filenames = []
+
+    def _choice(self, items):
+        with self.lock:
+            return self.rng.choice(items) if items else None
+
+    def _random(self):
+        with self.lock:
+            return self.rng.random()
+
+    def upload(self):
+        rows = self._choice(sorted(self.payloads.files))
+        repeated = self._choice(self.uploaded.get(rows, []))
+        if repeated is not None and self._random() < self.repeat:
+            content = repeated
+        else:
+            content = self.payloads.unique(rows)
+        body, content_type = multipart_body({}, {'file': (f'carga_{rows}.csv', content)})
+        status, data = self.client.request('POST', '/upload', body, {'Content-Type': content_type})
+        if status == 200:
+            with self.lock:
+                self.analyses.append(data)
+                uploaded = self.uploaded.setdefault(rows, [])
+                if len(uploaded) < 5:
+                    uploaded.append(content)
+        return status, f'upload:{rows}'
+
+    def pdf(self):
+        analysis = self._choice(list(self.analyses))
+        if analysis is None:
+            raise ValueError('No analysis to render yet')
+        status, _ = self.client.request('POST', '/generate_pdf', analysis, {'Content-Type': 'application/json'})
+        return status, 'pdf'
+
+    def files(self):
+        status, data = self.client.request('GET', '/files')
+        if status == 200:
+            names = [item['filename'] for item in json.loads(data)['files']]
+            with self.lock:
+                self.filenames = names
+        return status, 'files'
+
+    def download(self):
+        filename = self._choice(self.filenames)
+        if filename is None:
+            raise ValueError('No uploaded file to download yet')
+        status, _ = self.client.request('GET', f'/download/{quote(filename)}')
+        return status, 'download'
+
+    def warm_up(self):
+        """Una subida por tamaño y un listado, fuera de la medida: da destinos a PDFs y descargas"""
+        for _ in self.payloads.files:
+            status, name = self.upload()
+            if status != 200:
+                raise RuntimeError(f'Warm-up {name} failed with HTTP {status}')
+        self.files()
+
+    def call(self, endpoint, scheduled):
+        """Una petición como muestra; los fallos de red o de respuesta cuentan como error, no paran la prueba"""
+        sample = {'endpoint': endpoint, 'status': None, 'timeout': False}
+        try:
+            sample['status'], sample['name'] = getattr(self, endpoint)()
+        except socket.timeout:
+            sample['timeout'] = True
+        # IncompleteRead, BadStatusLine, JSON inválido en /files, nada que pedir todavía...
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            sample['error'] = str(e)
+        sample['latency'] = time.perf_counter() - scheduled
+        return sample
+
+    def run(self, schedule, concurrency):
+        """Lanza cada petición en su instante (lazo abierto) y devuelve (muestras, segundos)"""
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            started = time.perf_counter()
+            futures = []
+            for offset, endpoint in schedule:
+                delay = started + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self.call, endpoint, started + offset))
+            samples = [future.result() for future in futures]
+        return samples, time.perf_counter() - started
+
+
+def read_rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(pid):
+    children = []
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    # El nombre del proceso va entre paréntesis y puede contener espacios
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        children.append(int(name))
+            except (OSError, ValueError, IndexError):
+                continue
+    return children
+
+
+def process_role(pid, master_pid):
+    if pid == master_pid:
+        return 'master'
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return 'sweeper' if b'sweeper.py' in f.read() else 'worker'
+    except OSError:
+        return 'worker'
+
+
+class RssSampler:
+    """Muestrea cada `interval` segundos el RSS del master de gunicorn y de sus hijos"""
+
+    def __init__(self, master_pid, interval=1.0):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.processes = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+
+    def sample_once(self):
+        for pid in [self.master_pid] + child_pids(self.master_pid):
+            rss = read_rss_mb(pid)
+            if rss is None:
+                continue
+            process = self.processes.setdefault(pid, {'pid': pid, 'role': process_role(pid, self.master_pid),
+                                                      'rss_mb_peak': 0.0, 'samples': 0})
+            process['rss_mb_peak'] = round(max(process['rss_mb_peak'], rss), 1)
+            process['rss_mb_last'] = round(rss, 1)
+            process['samples'] += 1
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.sample_once()
+
+    def start(self):
+        self.sample_once()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample_once()
+        return sorted(self.processes.values(), key=lambda process: (process['role'] != 'master', process['pid']))
+
+
+class GunicornServer:
+    """gunicorn con gunicorn.conf.py sobre un almacén y una caché temporales"""
+
+    def __init__(self, port, env=None, config=None):
+        self.port = port
+        self.config = config or os.path.join(PROJECT_DIR, 'gunicorn.conf.py')
+        self.directory = tempfile.mkdtemp(prefix='loadtest-')
+        self.cache_dir = tempfile.mkdtemp(prefix='loadtest-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        self.env = dict(os.environ, PORT=str(port), UPLOAD_FOLDER=os.path.join(self.directory, 'uploads'),
+                        DATASET_CACHE_DIR=self.cache_dir, LOG_LEVEL='warning', **(env or {}))
+        self.log_path = os.path.join(self.directory, 'gunicorn.log')
+        self.process = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self, timeout=60):
+        with open(self.log_path, 'wb') as log:
+            self.process = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '--config', self.config, '--chdir', PROJECT_DIR,
+                 'wsgi:application'], env=self.env, stdout=log, stderr=subprocess.STDOUT, cwd=self.directory)
+        client = HttpClient(self.url, timeout=5)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with code {self.process.returncode}, see {self.log_path}')
+            try:
+                if client.request('GET', '/files')[0] == 200:
+                    return self
+            except OSError:
+                pass
+            time.sleep(0.5)
+        self.stop()
+        raise RuntimeError(f'gunicorn did not answer in {timeout}s, see {self.log_path}')
+
+    def stop(self, keep_files=False):
+        if self.process and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        if not keep_files:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def build_report(samples, elapsed, processes, config):
+    groups = {}
+    for sample in samples:
+        groups.setdefault(sample['endpoint'], []).append(sample)
+        # Las subidas también por tamaño de archivo
+        if sample.get('name', '').startswith('upload:'):
+            groups.setdefault(sample['name'], []).append(sample)
+    return {
+        'started': config.pop('started'),
+        'config': config,
+        'elapsed': round(elapsed, 2),
+        'achieved_rate': round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        'endpoints': dict({'all': summarize(samples, elapsed)},
+                          **{name: summarize(group, elapsed) for name, group in sorted(groups.items())}),
+        'processes': processes
+    }
+
+
+def print_report(report, previous=None):
+    print(f"\n📊 {report['endpoints']['all']['requests']} peticiones en {report['elapsed']}s "
+          f"({report['achieved_rate']}/s, objetivo {report['config']['rate']}/s)")
+    print(f"{'ruta':<16}{'n':>6}{'ok/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>7}{'429':>7}{'t/o':>7}")
+    for name, stats in report['endpoints'].items():
+        print(f"{name:<16}{stats['requests']:>6}{stats['throughput']:>8}{stats.get('p50_ms', '-'):>9}"
+              f"{stats.get('p95_ms', '-'):>9}{stats.get('p99_ms', '-'):>9}{stats['error_rate']:>7.1%}"
+              f"{stats['rejected_rate']:>7.1%}{stats['timeout_rate']:>7.1%}")
+    if report['processes']:
+        print('\n🧠 Memoria (RSS, MB)')
+        for process in report['processes']:
+            print(f"  {process['role']:<8} {process['pid']:>8}  pico {process['rss_mb_peak']:>8}"
+                  f"  final {process['rss_mb_last']:>8}")
+    if previous:
+        print(f"\n🔁 Comparado con {previous['started']}")
+        for name, stats in report['endpoints'].items():
+            before = previous['endpoints'].get(name)
+            if not before or 'p95_ms' not in stats or 'p95_ms' not in before:
+                continue
+            change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            print(f"  {name:<16} p95 {before['p95_ms']} → {stats['p95_ms']} ms ({change:+.0f}%)"
+                  f"  ok/s {before['throughput']} → {stats['throughput']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prueba de carga con tráfico mixto contra gunicorn')
+    parser.add_argument('--rate', type=float, default=5, help='Peticiones por segundo (objetivo)')
+    parser.add_argument('--duration', type=float, default=60, help='Segundos de tráfico medido')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Pesos por ruta (por defecto {DEFAULT_MIX})')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Filas de los CSVs subidos, separadas por comas')
+    parser.add_argument('--repeat', type=float, default=0.1,
+                        help='Fracción de subidas que repiten un archivo ya subido')
+    parser.add_argument('--timeout', type=float, default=60, help='Timeout del cliente por petición (s)')
+    parser.add_argument('--concurrency', type=int, default=64, help='Peticiones en vuelo como máximo en el cliente')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla de las llegadas y los archivos')
+    parser.add_argument('--env', action='append', default=[], metavar='CLAVE=VALOR',
+                        help='Variable de entorno de gunicorn/la app (repetible), p. ej. GUNICORN_WORKERS=4')
+    parser.add_argument('--port', type=int, default=5099, help='Puerto del gunicorn de la prueba')
+    parser.add_argument('--url', help='Usar un servidor ya arrancado en vez de lanzar gunicorn')
+    parser.add_argument('--pid', type=int, help='Con --url: pid del master para medir su memoria')
+    parser.add_argument('-o', '--output', help='JSON con el resultado (por defecto loadtest_<fecha>.json)')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior con la que comparar')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    sizes = [int(size) for size in args.sizes.split(',')]
+    env = dict(item.split('=', 1) for item in args.env)
+    started = datetime.now()
+
+    print(f"🧪 Generando CSVs sintéticos de {', '.join(map(str, sizes))} filas...", flush=True)
+    payloads = Payloads(sizes, seed=args.seed)
+
+    server = None
+    if args.url:
+        url, master_pid = args.url, args.pid
+    else:
+        server = GunicornServer(args.port, env)
+        print(f"🚀 Arrancando gunicorn en el puerto {args.port}...", flush=True)
+        server.start()
+        url, master_pid = server.url, server.process.pid
+
+    failed = False
+    try:
+        test = LoadTest(HttpClient(url, args.timeout), payloads, repeat=args.repeat, seed=args.seed)
+        test.warm_up()
+        schedule = arrival_schedule(args.rate, args.duration, mix, seed=args.seed)
+        print(f"🔥 {len(schedule)} peticiones durante {args.duration:g}s ({args.mix})", flush=True)
+        sampler = RssSampler(master_pid).start() if master_pid else None
+        samples, elapsed = test.run(schedule, args.concurrency)
+        processes = sampler.stop() if sampler else []
+    except Exception:
+        failed = True
+        raise
+    finally:
+        if server:
+            server.stop(keep_files=failed)
+
+    report = build_report(samples, elapsed, processes, {
+        'started': started.isoformat(), 'url': url, 'rate': args.rate, 'duration': args.duration, 'mix': mix,
+        'sizes': sizes, 'repeat': args.repeat, 'timeout': args.timeout, 'concurrency': args.concurrency,
+        'seed': args.seed, 'env': env
+    })
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print_report(report, previous)
+
+    output = args.output or f"loadtest_{started.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultado guardado en {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
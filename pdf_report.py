@@ -0,0 +1,436 @@
+"""
+Generación de informes PDF del análisis (trading o finanzas)
+
+No depende de Flask para poder usarse desde el procesamiento por lotes.
+
+Los gráficos se dibujan por defecto como vectores con reportlab.graphics, sin
+navegador. El backend anterior (PNG rasterizado con kaleido) sigue disponible
+con PDF_CHART_BACKEND=kaleido.
+"""
+from datetime import datetime
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.lineplots import LinePlot
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+
+from storage import TEMP_PREFIX
+
+# Backend de gráficos: 'reportlab' (vectorial, por defecto) o 'kaleido' (PNG vía navegador)
+PDF_CHART_BACKEND = os.environ.get('PDF_CHART_BACKEND', 'reportlab').lower()
+
+# Puntos máximos de una serie temporal dibujada en el PDF
+PDF_MAX_LINE_POINTS = int(os.environ.get('PDF_MAX_LINE_POINTS', 1000))
+
+CHART_WIDTH = 6*inch
+CHART_HEIGHT = 4*inch
+
+POSITIVE_COLOR = colors.HexColor('#1a9850')
+NEGATIVE_COLOR = colors.HexColor('#d73027')
+FINANCE_COLOR = colors.HexColor('#3182bd')
+LINE_COLOR = colors.HexColor('#667eea')
+PIE_COLORS = [colors.HexColor(c) for c in ('#667eea', '#764ba2', '#20c997', '#ffc107', '#fd7e14', '#e83e8c')]
+
+# kaleido lanza un navegador por exportación: una a la vez por worker, aunque haya varios hilos
+KALEIDO_LOCK = threading.Lock()
+
+def create_analysis_pdf(data, output_path):
+    """Crea un PDF con el análisis (trading o finanzas)"""
+    
+    # Configurar el documento
+    doc = SimpleDocTemplate(output_path, pagesize=A4)
+    story = []
+    styles = getSampleStyleSheet()
+    
+    # Estilos personalizados
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#667eea')
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        spaceAfter=12,
+        spaceBefore=20,
+        textColor=colors.HexColor('#764ba2')
+    )
+    
+    # Detectar tipo de archivo
+    file_type = data.get('file_type', 'trading')
+    
+    # Título principal
+    if file_type == 'finance':
+        story.append(Paragraph("Análisis Financiero Galáctico", title_style))
+    else:
+        story.append(Paragraph("Análisis de Trading Galáctico", title_style))
+    story.append(Spacer(1, 20))
+    
+    # Fecha de generación
+    date_style = ParagraphStyle(
+        'DateStyle',
+        parent=styles['Normal'],
+        fontSize=10,
+        alignment=TA_RIGHT,
+        textColor=colors.grey
+    )
+    story.append(Paragraph(f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", date_style))
+    story.append(Spacer(1, 30))
+    
+    # Resumen de métricas
+    story.append(Paragraph("Resumen de Métricas", heading_style))
+    
+    summary_data = data.get('summary', {})
+    
+    if file_type == 'finance':
+        summary_table_data = [
+            ['Métrica', 'Valor'],
+            ['Total de Transacciones', str(summary_data.get('total_transactions', 0))],
+            ['Monto Total', f"${summary_data.get('total_amount', 0):,.2f}"],
+            ['Transacciones de Depósito', str(summary_data.get('deposit_transactions', 0))],
+            ['Transacciones de Retiro', str(summary_data.get('withdrawal_transactions', 0))],
+            ['Monto Promedio por Transacción', f"${summary_data.get('avg_transaction', 0):,.2f}"]
+        ]
+    else:
+        summary_table_data = [
+            ['Métrica', 'Valor'],
+            ['Total de Operaciones', str(summary_data.get('total_operations', 0))],
+            ['Ganancia/Pérdida Total', f"${summary_data.get('total_profit', 0):,.2f}"],
+            ['Coste Total Swap', f"${summary_data.get('total_swap', 0):,.2f}"],
+            ['Operaciones Ganadoras', str(summary_data.get('winning_trades', 0))],
+            ['Operaciones Perdedoras', str(summary_data.get('losing_trades', 0))],
+            ['Porcentaje de Éxito', f"{summary_data.get('win_rate', 0):.2f}%"]
+        ]
+    
+    summary_table = Table(summary_table_data, colWidths=[3*inch, 2*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    
+    story.append(summary_table)
+    story.append(Spacer(1, 30))
+    
+    # Gráficos
+    charts = data.get('charts', {})
+    
+    if file_type == 'finance':
+        # Gráfico de monto por mes
+        if 'monthly' in charts:
+            story.append(Paragraph("Monto Total por Mes", heading_style))
+            monthly_chart = create_chart_flowable(charts['monthly'], 'monthly')
+            if monthly_chart:
+                story.append(monthly_chart)
+                story.append(Spacer(1, 20))
+        
+        # Gráfico de evolución temporal
+        if 'evolution' in charts:
+            story.append(Paragraph("Evolución Temporal del Monto Acumulado", heading_style))
+            evolution_chart = create_chart_flowable(charts['evolution'], 'evolution')
+            if evolution_chart:
+                story.append(evolution_chart)
+                story.append(Spacer(1, 20))
+        
+        # Gráfico de distribución por tipo
+        if 'type_distribution' in charts:
+            story.append(Paragraph("Distribución por Tipo de Transacción", heading_style))
+            type_chart = create_chart_flowable(charts['type_distribution'], 'type_distribution')
+            if type_chart:
+                story.append(type_chart)
+                story.append(Spacer(1, 20))
+    else:
+        # Gráfico de instrumentos
+        if 'instrument' in charts:
+            story.append(Paragraph("Ganancia/Pérdida por Instrumento", heading_style))
+            instrument_chart = create_chart_flowable(charts['instrument'], 'instrument')
+            if instrument_chart:
+                story.append(instrument_chart)
+                story.append(Spacer(1, 20))
+        
+        # Gráfico de evolución temporal
+        if 'evolution' in charts:
+            story.append(Paragraph("Evolución Temporal de Ganancia/Pérdida", heading_style))
+            evolution_chart = create_chart_flowable(charts['evolution'], 'evolution')
+            if evolution_chart:
+                story.append(evolution_chart)
+                story.append(Spacer(1, 20))
+    
+    # Tabla de estadísticas por mes
+    monthly_stats = data.get('monthly_stats', [])
+    if monthly_stats:
+        story.append(Paragraph("Estadísticas por Mes", heading_style))
+        
+        if file_type == 'finance':
+            monthly_table_data = [['Mes', 'Monto Total', 'Transacciones', 'Promedio']]
+            for row in monthly_stats:
+                monthly_table_data.append([
+                    str(row.get('Mes', '')),
+                    f"${row.get('Monto Total', 0):,.2f}",
+                    str(row.get('Número Transacciones', 0)),
+                    f"${row.get('Monto Promedio', 0):,.2f}"
+                ])
+        else:
+            monthly_table_data = [['Mes', 'Ganancia/Pérdida Total', 'Operaciones', 'Promedio']]
+            for row in monthly_stats:
+                monthly_table_data.append([
+                    str(row.get('Mes', '')),
+                    f"${row.get('Ganancia/Pérdida Total', 0):,.2f}",
+                    str(row.get('Número Operaciones', 0)),
+                    f"${row.get('Ganancia/Pérdida Promedio', 0):,.2f}"
+                ])
+        
+        monthly_table = Table(monthly_table_data, colWidths=[1.5*inch, 1.5*inch, 1*inch, 1*inch])
+        monthly_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#764ba2')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('FONTSIZE', (0, 1), (-1, -1), 8)
+        ]))
+        
+        story.append(monthly_table)
+        story.append(Spacer(1, 20))
+    
+    # Tabla de estadísticas por tipo/instrumento
+    if file_type == 'finance':
+        type_stats = data.get('type_stats', [])
+        if type_stats:
+            story.append(Paragraph("Estadísticas por Tipo de Transacción", heading_style))
+            
+            type_table_data = [['Tipo', 'Monto Total', 'Transacciones', 'Promedio']]
+            for row in type_stats:
+                type_table_data.append([
+                    str(row.get('Tipo', '')),
+                    f"${row.get('Monto Total', 0):,.2f}",
+                    str(row.get('Número Transacciones', 0)),
+                    f"${row.get('Monto Promedio', 0):,.2f}"
+                ])
+            
+            type_table = Table(type_table_data, colWidths=[2*inch, 1.5*inch, 1*inch, 1*inch])
+            type_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 10),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+                # Destacar la fila TOTAL
+                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ffeb3b')),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold')
+            ]))
+            
+            story.append(type_table)
+    else:
+        instrument_stats = data.get('instrument_stats', [])
+        if instrument_stats:
+            story.append(Paragraph("Estadísticas por Instrumento", heading_style))
+            
+            instrument_table_data = [['Instrumento', 'Ganancia/Pérdida Total', 'Operaciones', 'Promedio']]
+            for row in instrument_stats:
+                instrument_table_data.append([
+                    str(row.get('Instrumentos', '')),
+                    f"${row.get('Ganancia/Pérdida Total', 0):,.2f}",
+                    str(row.get('Número Operaciones', 0)),
+                    f"${row.get('Ganancia/Pérdida Promedio', 0):,.2f}"
+                ])
+            
+            instrument_table = Table(instrument_table_data, colWidths=[2*inch, 1.5*inch, 1*inch, 1*inch])
+            instrument_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 10),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+                # Destacar la fila TOTAL
+                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ffeb3b')),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold')
+            ]))
+            
+            story.append(instrument_table)
+    
+    # Construir el PDF
+    doc.build(story)
+
+def create_chart_flowable(chart_data, chart_type):
+    """Devuelve el gráfico listo para el PDF con el backend configurado"""
+    if PDF_CHART_BACKEND == 'kaleido':
+        image_path = create_chart_image(chart_data, chart_type)
+        return Image(image_path, width=CHART_WIDTH, height=CHART_HEIGHT) if image_path else None
+    return create_chart_drawing(chart_data, chart_type)
+
+def create_chart_drawing(chart_data, chart_type):
+    """Dibuja el gráfico como vectores de reportlab (sin navegador ni PNG)"""
+    try:
+        trace = chart_data['data'][0]
+        if chart_type == 'instrument':
+            return _bar_drawing(trace['x'], trace['y'])
+        if chart_type == 'monthly':
+            return _bar_drawing(trace['x'], trace['y'], color=FINANCE_COLOR)
+        if chart_type == 'evolution':
+            return _line_drawing(trace['x'], trace['y'])
+        if chart_type == 'type_distribution':
+            return _pie_drawing(trace.get('labels', []), trace.get('values', []))
+        return None
+    except Exception as e:
+        print(f"Error creating chart drawing: {e}")
+        return None
+
+def _bar_drawing(categories, values, color=None):
+    """Gráfico de barras; sin color fijo, verde para ganancias y rojo para pérdidas"""
+    drawing = Drawing(CHART_WIDTH, CHART_HEIGHT)
+    chart = VerticalBarChart()
+    chart.x, chart.y = 55, 70
+    chart.width, chart.height = CHART_WIDTH - 75, CHART_HEIGHT - 90
+    chart.data = [[float(v) for v in values]]
+    chart.categoryAxis.categoryNames = [str(c) for c in categories]
+    chart.categoryAxis.labels.angle = 45
+    chart.categoryAxis.labels.boxAnchor = 'ne'
+    chart.categoryAxis.labels.fontSize = 7
+    chart.categoryAxis.labels.fontName = 'Helvetica'
+    # Etiquetas siempre abajo aunque haya barras negativas
+    chart.categoryAxis.labelAxisMode = 'low'
+    chart.valueAxis.labels.fontSize = 7
+    chart.valueAxis.labels.fontName = 'Helvetica'
+    chart.valueAxis.labelTextFormat = lambda v: f'${v:,.0f}'
+    chart.valueAxis.visibleGrid = True
+    chart.valueAxis.gridStrokeColor = colors.lightgrey
+    chart.bars.strokeColor = None
+    for i, value in enumerate(chart.data[0]):
+        chart.bars[(0, i)].fillColor = color or (POSITIVE_COLOR if value >= 0 else NEGATIVE_COLOR)
+    drawing.add(chart)
+    return drawing
+
+def _line_drawing(dates, values):
+    """Serie temporal acumulada con línea de referencia en cero"""
+    times = pd.to_datetime(pd.Series(dates), errors='coerce', format='ISO8601')
+    mask = times.notna().to_numpy()
+    # Días desde epoch como eje X numérico
+    x = times[mask].to_numpy(dtype='datetime64[s]').astype(np.int64) / 86400.0
+    y = np.asarray(values, dtype=float)[mask]
+    if len(x) == 0:
+        return None
+    x, y = _decimate(x, y, PDF_MAX_LINE_POINTS)
+
+    drawing = Drawing(CHART_WIDTH, CHART_HEIGHT)
+    chart = LinePlot()
+    chart.x, chart.y = 55, 45
+    chart.width, chart.height = CHART_WIDTH - 75, CHART_HEIGHT - 65
+    chart.data = [list(zip(x.tolist(), y.tolist())), [(float(x[0]), 0.0), (float(x[-1]), 0.0)]]
+    chart.lines[0].strokeColor = LINE_COLOR
+    chart.lines[0].strokeWidth = 1.2
+    chart.lines[1].strokeColor = NEGATIVE_COLOR
+    chart.lines[1].strokeDashArray = [4, 3]
+    chart.lines[1].strokeWidth = 0.6
+    chart.xValueAxis.labelTextFormat = lambda v: pd.Timestamp(v * 86400, unit='s').strftime('%d/%m/%y')
+    chart.xValueAxis.labels.fontSize = 7
+    chart.xValueAxis.labels.fontName = 'Helvetica'
+    chart.yValueAxis.labelTextFormat = lambda v: f'${v:,.0f}'
+    chart.yValueAxis.labels.fontSize = 7
+    chart.yValueAxis.labels.fontName = 'Helvetica'
+    chart.yValueAxis.visibleGrid = True
+    chart.yValueAxis.gridStrokeColor = colors.lightgrey
+    drawing.add(chart)
+    return drawing
+
+def _pie_drawing(labels, values):
+    """Gráfico de tarta de la distribución por tipo"""
+    drawing = Drawing(CHART_WIDTH, CHART_HEIGHT)
+    chart = Pie()
+    size = CHART_HEIGHT - 80
+    chart.x, chart.y = (CHART_WIDTH - size) / 2, 40
+    chart.width = chart.height = size
+    chart.data = [float(v) for v in values]
+    chart.labels = [str(label) for label in labels]
+    chart.sideLabels = True
+    chart.slices.fontName = 'Helvetica'
+    chart.slices.strokeColor = colors.white
+    for i in range(len(chart.data)):
+        chart.slices[i].fillColor = PIE_COLORS[i % len(PIE_COLORS)]
+    drawing.add(chart)
+    return drawing
+
+def _decimate(x, y, max_points):
+    """Reduce la serie a max_points conservando el mínimo y el máximo de cada tramo"""
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    edges = np.linspace(0, n, max_points // 2 + 1).astype(int)
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        segment = y[start:end]
+        indices.extend((start + segment.argmin(), start + segment.argmax()))
+    # Conservar siempre el primer y el último punto
+    indices = np.unique([0, n - 1] + indices)
+    return x[indices], y[indices]
+
+def create_chart_image(chart_data, chart_type):
+    """Crea una imagen del gráfico para incluir en el PDF"""
+    try:
+        # Import diferido: plotly/kaleido solo se necesitan con este backend
+        import plotly.graph_objects as go
+        import plotly.io as pio
+        
+        # Crear figura de Plotly
+        if chart_type in ['instrument', 'monthly', 'evolution', 'type_distribution']:
+            # Las trazas WebGL (scattergl) no hacen falta en una imagen estática
+            data = [dict(trace, type='scatter') if trace.get('type') == 'scattergl' else trace
+                    for trace in chart_data['data']]
+            fig = go.Figure(data=data, layout=chart_data['layout'])
+        else:
+            return None
+        
+        # Configurar el layout para mejor visualización en PDF
+        fig.update_layout(
+            width=800,
+            height=600,
+            margin=dict(l=50, r=50, t=50, b=50),
+            paper_bgcolor='white',
+            plot_bgcolor='white'
+        )
+        
+        # Crear archivo temporal para la imagen
+        with tempfile.NamedTemporaryFile(delete=False, prefix=TEMP_PREFIX, suffix='.png') as tmp_file:
+            image_path = tmp_file.name
+        
+        # Convertir a imagen
+        with KALEIDO_LOCK:
+            pio.write_image(fig, image_path, format='png', width=800, height=600, scale=2)
+        
+        return image_path
+        
+    except Exception as e:
+        print(f"Error creating chart image: {e}")
+        return None
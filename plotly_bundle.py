@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Plotly.js servido por la propia aplicación: fijado, precomprimido y cacheable
+
+El dashboard no depende del CDN (plotly-latest pesa varios MB y no está
+disponible en despliegues sin Internet): /assets/<archivo> sirve el
+plotly.min.js del paquete plotly de Python, cuya versión está fijada en
+requirements. El nombre lleva la versión y el hash del contenido, así que se
+sirve con Cache-Control immutable de un año, y la versión gzip ya comprimida
+(nivel 9) va a los navegadores que la aceptan.
+
+Se sirve el bundle completo y no uno parcial con solo bar/scatter/pie: el
+dashboard también usa scattergl (curvas de evolución largas) y heatmap
+(correlación de la cartera y distribuciones), y ninguno de los bundles
+parciales oficiales de plotly.js reúne todos esos tipos. Un bundle a medida
+habría que compilarlo con la cadena de Node de plotly.js y mantenerlo a mano;
+el paquete de Python solo incluye el completo.
+
+El bundle se genera al construir la imagen Docker (o a mano en desarrollo);
+la aplicación solo lo lee y no arranca si falta.
+
+Uso:
+    python plotly_bundle.py                  # generar el bundle y su .gz en PLOTLY_BUNDLE_DIR
+    python plotly_bundle.py --dir /ruta      # en otro directorio
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+
+from storage import write_json_atomic
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Directorio de los bundles generados
+PLOTLY_BUNDLE_DIR = os.environ.get('PLOTLY_BUNDLE_DIR', os.path.join(PROJECT_DIR, 'static', 'vendor'))
+
+# Un año: el nombre cambia con el contenido, así que nunca hay que revalidar
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+MANIFEST_NAME = 'plotly.json'
+
+
+def package_bundle():
+    """plotly.min.js completo incluido en el paquete plotly de Python"""
+    import plotly
+    return os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js'), plotly.__version__
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def build_bundle(directory=None):
+    """Copia el bundle con versión y hash en el nombre, lo precomprime y escribe el manifiesto"""
+    directory = directory or PLOTLY_BUNDLE_DIR
+    os.makedirs(directory, exist_ok=True)
+    source, package_version = package_bundle()
+
+    with open(source, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    match = re.search(rb'plotly\.js v(\d+\.\d+\.\d+)', content[:1000])
+    version = match.group(1).decode('ascii') if match else 'custom'
+    name = f'plotly-{version}-{digest[:12]}.min.js'
+
+    compressed = gzip.compress(content, compresslevel=9, mtime=0)
+    _write_atomic(os.path.join(directory, name), content)
+    _write_atomic(os.path.join(directory, name + '.gz'), compressed)
+
+    # Eliminar los bundles anteriores
+    for old in os.listdir(directory):
+        if old.startswith('plotly-') and old not in (name, name + '.gz'):
+            os.unlink(os.path.join(directory, old))
+
+    manifest = {
+        'file': name,
+        'version': version,
+        'plotly_package': package_version,
+        'sha256': digest,
+        'bytes': len(content),
+        'gzip_bytes': len(compressed)
+    }
+    write_json_atomic(os.path.join(directory, MANIFEST_NAME), manifest)
+    return manifest
+
+
+def load_bundle(directory=None):
+    """Manifiesto del bundle generado (con 'directory'); RuntimeError si falta"""
+    directory = directory or PLOTLY_BUNDLE_DIR
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None or not all(os.path.isfile(os.path.join(directory, manifest['file'] + ext))
+                                   for ext in ('', '.gz')):
+        raise RuntimeError(f'Plotly.js bundle not found in {directory}: run "python plotly_bundle.py" first')
+    return dict(manifest, directory=directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera el bundle de Plotly.js que sirve la aplicación')
+    parser.add_argument('--dir', default=PLOTLY_BUNDLE_DIR, help='Directorio de salida')
+    args = parser.parse_args(argv)
+
+    manifest = build_bundle(args.dir)
+    print(f"✅ Plotly.js {manifest['version']} (plotly {manifest['plotly_package']}): {manifest['file']} "
+          f"({manifest['bytes'] / 1024:.0f} KB, {manifest['gzip_bytes'] / 1024:.0f} KB con gzip)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Correlación entre cuentas: P&L diario de cada proveedor de señales sobre un calendario común
+
+Cada cuenta se reduce a su P&L realizado por día de cierre con np.bincount
+sobre los días del calendario común (los días en que operó alguna de las
+cuentas; un día sin operaciones de una cuenta cuenta como 0). Con la matriz
+cuentas x días, la covarianza y la correlación de todas las parejas salen de
+un único producto de matrices. El coste es lineal en el total de operaciones
+más cuentas² x días, sin bucles por pareja ni por día.
+"""
+import numpy as np
+import pandas as pd
+
+
+def daily_pnl(df):
+    """Días de cierre (días desde 1970) y utilidad de las operaciones con fechas válidas"""
+    # Máscaras en vez de dropna: no copiar el resto de columnas
+    profits = pd.to_numeric(df['Utilidad'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    valid = (df['Horario de apertura'].notna() & df['Hora de cierre'].notna()).to_numpy() & ~np.isnan(profits)
+    days = df['Hora de cierre'].to_numpy()[valid].astype('datetime64[D]').astype(np.int64)
+    return days, profits[valid]
+
+
+def daily_matrix(accounts):
+    """Matriz cuentas x días de P&L diario y el calendario común (días desde 1970)"""
+    active = [days for days, _ in accounts if len(days)]
+    if not active:
+        return np.zeros((len(accounts), 0)), np.array([], dtype=np.int64)
+    first = min(days.min() for days in active)
+    span = max(days.max() for days in active) - first + 1
+    matrix = np.zeros((len(accounts), span))
+    trades = np.zeros(span, dtype=np.int64)
+    for row, (days, profits) in enumerate(accounts):
+        matrix[row] = np.bincount(days - first, weights=profits, minlength=span)
+        trades += np.bincount(days - first, minlength=span)
+    # Calendario común: los días con alguna operación (fuera fines de semana y festivos)
+    traded = trades > 0
+    return matrix[:, traded], first + np.flatnonzero(traded)
+
+
+def covariance_and_correlation(matrix):
+    """Covarianza y correlación de todas las filas en una sola operación (NaN si una cuenta no varía)"""
+    if not matrix.shape[1]:
+        empty = np.full((len(matrix), len(matrix)), np.nan)
+        return empty, empty
+    centered = matrix - matrix.mean(axis=1, keepdims=True)
+    covariance = centered @ centered.T / max(matrix.shape[1] - 1, 1)
+    deviation = np.sqrt(np.diag(covariance))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = covariance / np.outer(deviation, deviation)
+    return covariance, np.clip(correlation, -1, 1)
+
+
+def _matrix_list(matrix, decimals):
+    return [[None if np.isnan(value) else value for value in row] for row in np.round(matrix, decimals).tolist()]
+
+
+def build_correlation(names, frames):
+    """Correlación y covarianza del P&L diario entre cuentas, con resumen por cuenta"""
+    accounts = [daily_pnl(df) for df in frames]
+    matrix, calendar = daily_matrix(accounts)
+    covariance, correlation = covariance_and_correlation(matrix)
+
+    # Diversificación: correlación media entre parejas distintas
+    pairs = correlation[~np.eye(len(names), dtype=bool)]
+    pairs = pairs[~np.isnan(pairs)]
+    dates = calendar.astype('datetime64[D]').astype(str)
+
+    return {
+        'accounts': names,
+        'summary': {
+            'accounts': len(names),
+            'days': len(calendar),
+            'start': dates[0] if len(dates) else None,
+            'end': dates[-1] if len(dates) else None,
+            'average_correlation': round(float(pairs.mean()), 4) if len(pairs) else None,
+            'per_account': [{
+                'account': name,
+                'trades': int(len(days)),
+                'active_days': int(np.count_nonzero(row)),
+                'total_pnl': round(float(row.sum()), 2),
+                'daily_mean': round(float(row.mean()), 2) if len(row) else None,
+                'daily_std': round(float(np.sqrt(covariance[i, i])), 2) if len(row) else None
+            } for i, (name, (days, _), row) in enumerate(zip(names, accounts, matrix))]
+        },
+        'correlation': _matrix_list(correlation, 4),
+        'covariance': _matrix_list(covariance, 2)
+    }
+
+
+def generate_correlation_chart(result):
+    """Mapa de calor de la correlación en el formato de Plotly.js"""
+    return {
+        'correlation': {
+            'data': [{
+                'z': result['correlation'],
+                'x': result['accounts'],
+                'y': result['accounts'],
+                'type': 'heatmap',
+                'zmin': -1,
+                'zmax': 1,
+                'colorscale': 'RdBu',
+                'reversescale': True,
+                'hovertemplate': '%{y} / %{x}: %{z:.2f}<extra></extra>'
+            }],
+            'layout': {
+                'title': 'Correlación del P&L Diario entre Cuentas',
+                'xaxis': {'automargin': True},
+                'yaxis': {'automargin': True, 'autorange': 'reversed'},
+                'height': max(500, 20 * len(result['accounts']))
+            }
+        }
+    }
@@ -0,0 +1,221 @@
+"""
+Perfilado opcional por petición con salida lista para flamegraph
+
+Un hilo muestreador lee cada PROFILE_INTERVAL segundos la pila del hilo que
+atiende la petición (sys._current_frames) y cuenta las pilas repetidas. Al
+terminar se guardan dos archivos por perfil en PROFILE_DIR:
+
+  <id>.collapsed  pilas en formato "f1;f2;f3 muestras" (flamegraph.pl, speedscope)
+  <id>.json       ruta, duración, etapas con sus tiempos y forma de la entrada
+                  (filas, columnas, tipo de archivo); nunca los datos
+
+Se activa por petición con la cabecera X-Profile-Token (igual a PROFILE_TOKEN)
+o para una fracción PROFILE_SAMPLE_RATE de las peticiones perfiladas.
+"""
+import functools
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import g, make_response, request
+
+from storage import write_json_atomic
+
+# Token que activa el perfilado con la cabecera X-Profile-Token y da acceso a /profiles (vacío = desactivado)
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+
+# Fracción de peticiones perfiladas sin cabecera (0 = solo bajo petición)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+# Segundos entre muestras de la pila
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+
+# Perfiles guardados como máximo (se eliminan los más antiguos)
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 100))
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+
+def valid_token(token):
+    return bool(PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN))
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Muestreo de la pila de un hilo más las etapas que se le notifican
+
+    Se usa como `progress`: profile('dates', rows=1000) registra la etapa.
+    """
+
+    def __init__(self, route, thread_id=None, interval=None):
+        self.route = route
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or PROFILE_INTERVAL
+        self.stacks = Counter()
+        self.stages = []
+        self.input = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+        self.duration = None
+
+    def __call__(self, stage, **info):
+        # Solo números y el tipo de archivo: los mensajes de error pueden citar contenido del CSV
+        info = {key: value for key, value in info.items()
+                if key == 'file_type' or isinstance(value, (int, float))}
+        self.stages.append(dict(info, stage=stage, elapsed=round(time.perf_counter() - self.started, 4)))
+        # Forma de la entrada (nunca el contenido)
+        for key in ('rows', 'columns', 'file_type', 'bytes'):
+            if key in info and key not in self.input:
+                self.input[key] = info[key]
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = round(time.perf_counter() - self.started, 4)
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def metadata(self):
+        return {
+            'route': self.route,
+            'started': self.started_at.isoformat(),
+            'duration': self.duration,
+            'interval': self.interval,
+            'samples': sum(self.stacks.values()),
+            'stages': self.stages,
+            'input': self.input
+        }
+
+
+class ProfileStore:
+    """Perfiles guardados en disco (colapsados + metadatos)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def save(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{profile.started_at.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        with open(os.path.join(self.directory, f'{profile_id}.collapsed'), 'w', encoding='utf-8') as f:
+            f.write(profile.collapsed())
+        write_json_atomic(os.path.join(self.directory, f'{profile_id}.json'), dict(profile.metadata(), id=profile_id))
+        self.prune()
+        return profile_id
+
+    def _ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        # Los identificadores empiezan por la fecha: orden alfabético = cronológico
+        return sorted(name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def prune(self, max_files=None):
+        max_files = max_files or PROFILE_MAX_FILES
+        ids = self._ids()
+        for profile_id in ids[:max(0, len(ids) - max_files)]:
+            for extension in ('.json', '.collapsed'):
+                try:
+                    os.unlink(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    pass
+
+    def path(self, profile_id, extension):
+        """Ruta de un archivo del perfil o None si no existe (o el id no es válido)"""
+        if profile_id not in self._ids():
+            return None
+        return os.path.join(self.directory, profile_id + extension)
+
+    def list(self):
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(os.path.join(self.directory, f'{profile_id}.json'), encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            metadata.pop('stages', None)
+            profiles.append(metadata)
+        return profiles
+
+
+class RequestProfiler:
+    """Decorador de vistas: perfila la petición si se pide con el token o si toca por muestreo
+
+    Dentro de la vista, current_profile() devuelve el perfil en curso (o None).
+    """
+
+    def __init__(self, store, sample_rate=None):
+        self.store = store
+        self.sample_rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def enabled(self):
+        if valid_token(request.headers.get(PROFILE_HEADER)):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled():
+                return view(*args, **kwargs)
+            # La regla (/analyze/<filename>) y no la ruta: sin nombres de archivo de clientes
+            route = request.url_rule.rule if request.url_rule else request.path
+            profile = g.profile = Profile(route).start()
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                profile.stop()
+                try:
+                    profile_id = self.store.save(profile)
+                except OSError as e:
+                    profile_id = None
+                    print(f"⚠️  No se pudo guardar el perfil de {route}: {str(e)}")
+            if profile_id:
+                # Devolver el id para poder descargar el perfil de esta petición
+                response = make_response(response)
+                response.headers['X-Profile-Id'] = profile_id
+            return response
+        return wrapper
+
+
+def current_profile():
+    return g.get('profile')
+
+
+def with_profile(progress):
+    """Envuelve un callable de progreso para que las etapas lleguen también al perfil en curso"""
+    profile = current_profile()
+    if profile is None:
+        return progress
+
+    def report(stage, **info):
+        profile(stage, **info)
+        progress(stage, **info)
+    return report
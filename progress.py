@@ -0,0 +1,152 @@
+"""
+Progreso de análisis largos publicado como Server-Sent Events
+
+El worker que procesa /upload escribe cada etapa (bytes recibidos, filas
+leídas, fechas convertidas, agregados y gráficos) como una línea JSON en un
+archivo por trabajo. /progress/<job_id> lee ese archivo y reenvía las líneas
+como eventos SSE, así que funciona aunque la subida y el stream los atiendan
+workers o procesos distintos.
+
+Con workers gthread cada stream ocupa un hilo, así que no se mantiene abierto
+durante todo el análisis: cada conexión dura como mucho PROGRESS_STREAM_WINDOW
+segundos y el navegador reconecta solo (EventSource, con Last-Event-ID) hasta
+la etapa final. Además, cada worker limita los streams abiertos a la vez
+(PROGRESS_MAX_STREAMS) y un trabajo que no empieza se da por perdido a los
+PROGRESS_START_TIMEOUT segundos.
+
+Los archivos usan el prefijo de temporales de la aplicación, de modo que el
+barrido de retención (sweeper.py) los elimina.
+"""
+import json
+import os
+import re
+import tempfile
+import time
+
+from storage import TEMP_PREFIX
+
+PROGRESS_DIR = os.environ.get('PROGRESS_DIR', tempfile.gettempdir())
+
+# Segundos máximos sin eventos nuevos de un trabajo antes de darlo por perdido
+PROGRESS_TIMEOUT = float(os.environ.get('PROGRESS_TIMEOUT', 300))
+
+# Segundos que se espera el primer evento de un trabajo que aún no ha empezado
+PROGRESS_START_TIMEOUT = float(os.environ.get('PROGRESS_START_TIMEOUT', 15))
+
+# Segundos máximos de cada conexión; después el navegador reconecta
+PROGRESS_STREAM_WINDOW = float(os.environ.get('PROGRESS_STREAM_WINDOW', 20))
+
+# Streams abiertos a la vez por worker (cada uno ocupa un hilo con gthread)
+PROGRESS_MAX_STREAMS = int(os.environ.get('PROGRESS_MAX_STREAMS', 2))
+
+# Milisegundos tras los que reconecta un navegador sin hueco libre
+PROGRESS_BUSY_RETRY_MS = 3000
+
+# Intervalo de sondeo del archivo de eventos
+PROGRESS_POLL_INTERVAL = float(os.environ.get('PROGRESS_POLL_INTERVAL', 0.25))
+
+# Segundos sin eventos tras los que se envía un comentario de keep-alive
+KEEPALIVE_INTERVAL = 15
+
+# Etapas que terminan un trabajo
+FINAL_STAGES = ('done', 'error')
+
+JOB_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def valid_job_id(job_id):
+    return bool(job_id and JOB_ID_PATTERN.match(job_id))
+
+
+def job_path(job_id, directory=None):
+    return os.path.join(directory or PROGRESS_DIR, f'{TEMP_PREFIX}progress_{job_id}.jsonl')
+
+
+class ProgressReporter:
+    """Callable que registra una etapa: reporter('dates', rows=1000)
+
+    Sin job_id válido (el cliente no pidió progreso) no escribe nada.
+    """
+
+    def __init__(self, job_id, directory=None):
+        self.path = job_path(job_id, directory) if valid_job_id(job_id) else None
+        self.started = time.perf_counter()
+
+    def __call__(self, stage, **info):
+        if self.path is None:
+            return
+        event = {'stage': stage, 'elapsed': round(time.perf_counter() - self.started, 3)}
+        event.update(info)
+        # Una escritura por línea con O_APPEND: el lector nunca ve líneas mezcladas
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+
+def read_events(job_id, offset=0, directory=None):
+    """Eventos completos a partir de una posición del archivo; devuelve (eventos, nueva posición)"""
+    try:
+        with open(job_path(job_id, directory), 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+
+    # Ignorar una última línea a medio escribir
+    end = data.rfind(b'\n') + 1
+    events = [json.loads(line) for line in data[:end].splitlines() if line]
+    return events, offset + end
+
+
+def idle_seconds(job_id, directory=None):
+    """Segundos desde el último evento de un trabajo, o None si aún no ha empezado"""
+    try:
+        return max(0.0, time.time() - os.path.getmtime(job_path(job_id, directory)))
+    except FileNotFoundError:
+        return None
+
+
+def format_sse(event, event_id):
+    return f"id: {event_id}\nevent: progress\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def stream_events(job_id, last_event_id=0, directory=None, timeout=None, poll_interval=None,
+                  start_timeout=None, window=None):
+    """Generador de eventos SSE hasta la etapa final, el fin de la ventana o el tiempo de espera
+
+    Al acabar la ventana se cierra sin evento final y el navegador reconecta;
+    el tiempo sin eventos se mide con el archivo, así que cuenta entre conexiones.
+    """
+    timeout = PROGRESS_TIMEOUT if timeout is None else timeout
+    start_timeout = PROGRESS_START_TIMEOUT if start_timeout is None else start_timeout
+    window = PROGRESS_STREAM_WINDOW if window is None else window
+    poll_interval = poll_interval or PROGRESS_POLL_INTERVAL
+    offset = 0
+    sent = 0
+    opened = last_write = time.monotonic()
+
+    # Pedir al navegador que reintente pronto si se corta la conexión
+    yield 'retry: 1000\n\n'
+    while True:
+        events, offset = read_events(job_id, offset, directory)
+        for event in events:
+            sent += 1
+            # Al reconectar, EventSource envía Last-Event-ID: no repetir lo ya recibido
+            if sent > last_event_id:
+                yield format_sse(event, sent)
+            if event['stage'] in FINAL_STAGES:
+                return
+        now = time.monotonic()
+        idle = idle_seconds(job_id, directory)
+        if events:
+            last_write = now
+        elif (idle is None and now - opened > start_timeout) or (idle is not None and idle > timeout):
+            yield format_sse({'stage': 'timeout'}, sent + 1)
+            return
+        if now - opened > window:
+            # Liberar el hilo; el navegador reconecta y sigue desde Last-Event-ID
+            return
+        if now - last_write > KEEPALIVE_INTERVAL:
+            # Comentario SSE: mantiene viva la conexión a través de proxies
+            last_write = now
+            yield ': keep-alive\n\n'
+        time.sleep(poll_interval)
@@ -0,0 +1,136 @@
+"""
+Series móviles (rolling) de P&L, porcentaje de éxito y número de operaciones
+
+Trabaja sobre los arrays de operaciones ordenados por hora de cierre usando
+sumas prefijas: el valor de una ventana (T - w, T] es la diferencia de dos
+prefijos, y los límites de cada ventana se obtienen con dos punteros sobre
+arrays ordenados (np.searchsorted vectorizado). Así el coste es lineal en el
+número de operaciones, no cuadrático como recalcular cada ventana con pandas.
+
+La serie se evalúa en como mucho `max_points` instantes para que el gráfico
+no crezca con el número de operaciones.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Ventanas en días (configurable, p. ej. ROLLING_WINDOWS=7,30,90,180)
+ROLLING_WINDOWS = tuple(float(v) for v in os.environ.get('ROLLING_WINDOWS', '7,30,90').split(',') if v.strip())
+
+# Puntos máximos de cada serie devuelta
+ROLLING_MAX_POINTS = int(os.environ.get('ROLLING_MAX_POINTS', 500))
+
+NS_PER_DAY = 86400 * 10**9
+
+
+def window_label(days):
+    """Etiqueta de una ventana: 7 -> '7d', 0.5 -> '0.5d'"""
+    return f'{days:g}d'
+
+
+def sorted_trade_arrays(times, pnl):
+    """Convierte a arrays (int64 ns, float64) ordenados por tiempo, sin fechas inválidas"""
+    times = pd.to_datetime(pd.Series(times), errors='coerce')
+    mask = times.notna().to_numpy()
+    t = times.to_numpy(dtype='datetime64[ns]')[mask].astype(np.int64)
+    p = np.asarray(pnl, dtype=float)[mask]
+    p = np.nan_to_num(p, nan=0.0)
+
+    # Las exportaciones suelen venir ya ordenadas: evitar el sort en ese caso (O(n))
+    if len(t) > 1 and not np.all(t[1:] >= t[:-1]):
+        order = np.argsort(t, kind='stable')
+        t, p = t[order], p[order]
+    return t, p
+
+
+def evaluation_times(t, max_points):
+    """Instantes de evaluación: cada operación si caben, si no una rejilla regular"""
+    if len(t) <= max_points:
+        return t
+    return np.linspace(t[0], t[-1], max_points).astype(np.int64)
+
+
+def rolling_window_stats(t, p, eval_times, window_days):
+    """P&L, operaciones y % de éxito en la ventana (T - w, T] para cada T de eval_times"""
+    window_ns = int(window_days * NS_PER_DAY)
+    cum_pnl = np.concatenate(([0.0], np.cumsum(p)))
+    cum_wins = np.concatenate(([0], np.cumsum(p > 0)))
+
+    # Límites de ventana: eval_times está ordenado, así que ambos punteros solo avanzan
+    right = np.searchsorted(t, eval_times, side='right')
+    left = np.searchsorted(t, eval_times - window_ns, side='right')
+
+    trades = right - left
+    pnl = cum_pnl[right] - cum_pnl[left]
+    wins = cum_wins[right] - cum_wins[left]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        win_rate = np.where(trades > 0, wins * 100.0 / trades, np.nan)
+    return pnl, trades, win_rate
+
+
+def _to_list(values, decimals=2):
+    """Redondea y convierte NaN en None para que sea serializable a JSON"""
+    rounded = np.round(values.astype(float), decimals)
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+
+def compute_rolling_series(times, pnl, windows=None, max_points=None):
+    """Calcula las series móviles de cada ventana listas para graficar"""
+    windows = windows or ROLLING_WINDOWS
+    max_points = max_points or ROLLING_MAX_POINTS
+
+    t, p = sorted_trade_arrays(times, pnl)
+    if len(t) == 0:
+        return {'x': [], 'windows': {}}
+
+    eval_times = evaluation_times(t, max_points)
+    series = {}
+    for days in windows:
+        window_pnl, trades, win_rate = rolling_window_stats(t, p, eval_times, days)
+        series[window_label(days)] = {
+            'pnl': _to_list(window_pnl),
+            'trades': trades.tolist(),
+            'win_rate': _to_list(win_rate),
+        }
+
+    x = pd.DatetimeIndex(eval_times).strftime('%Y-%m-%d %H:%M:%S').tolist()
+    return {'x': x, 'windows': series}
+
+
+def generate_rolling_charts(rolling):
+    """Gráficos de P&L móvil y % de éxito móvil en el formato de Plotly.js"""
+    x = rolling['x']
+    windows = rolling['windows']
+    return {
+        'rolling_pnl': {
+            'data': [{
+                'x': x,
+                'y': values['pnl'],
+                'type': 'scatter',
+                'mode': 'lines',
+                'name': f'P&L {label}'
+            } for label, values in windows.items()],
+            'layout': {
+                'title': 'Ganancia/Pérdida Móvil por Ventana',
+                'xaxis': {'title': 'Fecha'},
+                'yaxis': {'title': 'Ganancia/Pérdida ($)'},
+                'height': 500
+            }
+        },
+        'rolling_win_rate': {
+            'data': [{
+                'x': x,
+                'y': values['win_rate'],
+                'type': 'scatter',
+                'mode': 'lines',
+                'name': f'Éxito {label}'
+            } for label, values in windows.items()],
+            'layout': {
+                'title': 'Porcentaje de Éxito Móvil por Ventana',
+                'xaxis': {'title': 'Fecha'},
+                'yaxis': {'title': 'Porcentaje de Éxito (%)', 'range': [0, 100]},
+                'height': 500
+            }
+        }
+    }
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Almacenamiento de archivos subidos direccionado por contenido
+
+Cada archivo se guarda una sola vez, comprimido (zstd si está instalado
+`zstandard`, si no gzip), bajo el SHA-256 de su contenido original:
+
+    UPLOAD_FOLDER/.blobs/ab/abcdef....csv.gz   contenido comprimido
+    UPLOAD_FOLDER/.names/<nombre>.json          registro ligero nombre -> hash
+
+Subir 50 veces la misma exportación crea 50 registros de unos cientos de bytes
+y un único blob. Al borrar un archivo solo se elimina su registro; `gc()`
+elimina después los blobs que ya no referencia ningún registro.
+
+Los resultados calculados a partir de un contenido (análisis JSON y PDF) se
+guardan junto a él en UPLOAD_FOLDER/.results/ y el gc los elimina con su blob.
+
+Los CSV sin comprimir que ya estuvieran en UPLOAD_FOLDER (formato anterior) se
+siguen listando, descargando y borrando, y `migrate` los incorpora al almacén.
+
+Uso:
+    python storage.py gc [--dry-run]
+    python storage.py migrate
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Códec para los blobs nuevos: 'zstd' (requiere zstandard) o 'gzip'
+UPLOAD_CODEC = os.environ.get('UPLOAD_CODEC', 'zstd' if zstandard else 'gzip')
+
+# Blobs más recientes que esto no se recolectan (protege subidas en curso)
+GC_GRACE_SECONDS = int(os.environ.get('GC_GRACE_SECONDS', 3600))
+
+CODEC_EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+
+# Sesiones de subida por bloques en curso (chunked_upload.py)
+PARTIAL_DIR = '.partial'
+
+# Resultados precalculados por contenido; cambiar la versión invalida los anteriores
+RESULTS_DIR = '.results'
+RESULTS_VERSION = 3
+RESULT_EXTENSIONS = {'analysis': '.json.gz', 'pdf': '.pdf'}
+
+# Prefijo de los artefactos temporales (PDF, PNG) para que el barrido los reconozca
+TEMP_PREFIX = 'ctd_'
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def open_data_file(path, mode='rb'):
+    """Abre un archivo de datos descomprimiendo según la extensión (.zst, .gz o sin comprimir)"""
+    text = 't' in mode
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read .zst files')
+        return zstandard.open(path, mode, encoding='utf-8' if text else None)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8' if text else None)
+    return open(path, mode, encoding='utf-8' if text else None)
+
+
+def _compressed_writer(path, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required for the zstd codec')
+        return zstandard.open(path, 'wb', cctx=zstandard.ZstdCompressor(level=10))
+    if codec == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    raise ValueError(f'Unknown codec: {codec}')
+
+
+def write_json_atomic(path, data):
+    """Escribe un JSON de forma atómica (archivo temporal + rename)"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class UploadStore:
+    """Blobs comprimidos por hash y registros de nombre que apuntan a ellos"""
+
+    def __init__(self, root, codec=None):
+        self.root = root
+        self.codec = codec or UPLOAD_CODEC
+        self.blobs_dir = os.path.join(root, '.blobs')
+        self.names_dir = os.path.join(root, '.names')
+        self.results_dir = os.path.join(root, RESULTS_DIR)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.names_dir, exist_ok=True)
+        os.makedirs(self.results_dir, exist_ok=True)
+
+    def _record_path(self, filename):
+        return os.path.join(self.names_dir, filename + '.json')
+
+    def _legacy_path(self, filename):
+        return os.path.join(self.root, filename)
+
+    def find_blob(self, sha256):
+        """Ruta del blob con ese hash (con cualquier códec) o None"""
+        directory = os.path.join(self.blobs_dir, sha256[:2])
+        for extension in CODEC_EXTENSIONS.values():
+            path = os.path.join(directory, f'{sha256}.csv{extension}')
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, stream, filename, uploaded=None):
+        """Guarda el contenido de un stream binario con ese nombre y devuelve su registro"""
+        # Hashear y comprimir en una sola pasada, sin cargar el archivo en memoria
+        fd, tmp_path = tempfile.mkstemp(dir=self.blobs_dir, suffix='.tmp')
+        os.close(fd)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with _compressed_writer(tmp_path, self.codec) as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+
+            sha256 = hasher.hexdigest()
+            blob_path = self.find_blob(sha256)
+            if blob_path:
+                # Contenido ya almacenado: renovar la fecha para que gc no lo recoja ahora
+                os.remove(tmp_path)
+                os.utime(blob_path)
+            else:
+                os.makedirs(os.path.join(self.blobs_dir, sha256[:2]), exist_ok=True)
+                blob_path = os.path.join(self.blobs_dir, sha256[:2],
+                                         f'{sha256}.csv{CODEC_EXTENSIONS[self.codec]}')
+                os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        record = {
+            'filename': filename,
+            'sha256': sha256,
+            'size': size,
+            'stored_size': os.path.getsize(blob_path),
+            'uploaded': (uploaded or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        }
+        write_json_atomic(self._record_path(filename), record)
+        return record
+
+    def get(self, filename):
+        """Registro de un archivo por nombre o None si no existe"""
+        try:
+            with open(self._record_path(filename), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def path(self, filename):
+        """Ruta legible con open_data_file/pd.read_csv del contenido de un archivo, o None"""
+        record = self.get(filename)
+        if record:
+            return self.find_blob(record['sha256'])
+        legacy = self._legacy_path(filename)
+        return legacy if os.path.isfile(legacy) else None
+
+    def touch(self, filename):
+        """Marca un archivo como usado ahora (la expulsión LRU usa esta fecha)"""
+        for path in (self._record_path(filename), self._legacy_path(filename)):
+            if os.path.isfile(path):
+                os.utime(path)
+                return
+
+    def iter_content(self, filename, chunk_size=64 * 1024):
+        """Genera el contenido descomprimido por bloques (para respuestas en streaming)"""
+        path = self.path(filename)
+        if path is None:
+            raise FileNotFoundError(filename)
+        self.touch(filename)
+        with open_data_file(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def list(self):
+        """Registros de todos los archivos, incluidos los CSV sin migrar"""
+        records = []
+        for name in os.listdir(self.names_dir):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.names_dir, name), encoding='utf-8') as f:
+                        record = json.load(f)
+                        # Último uso: fecha de modificación del registro (ver touch)
+                        record['accessed'] = os.fstat(f.fileno()).st_mtime
+                except FileNotFoundError:
+                    # Borrado mientras se listaba
+                    continue
+                records.append(record)
+        for name in os.listdir(self.root):
+            path = self._legacy_path(name)
+            if name.endswith('.csv') and os.path.isfile(path):
+                stats = os.stat(path)
+                records.append({
+                    'filename': name,
+                    'size': stats.st_size,
+                    'stored_size': stats.st_size,
+                    'accessed': stats.st_mtime,
+                    'uploaded': datetime.fromtimestamp(stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
+                })
+        return records
+
+    def delete(self, filename):
+        """Elimina el registro (el blob queda para gc); devuelve False si no existía"""
+        for path in (self._record_path(filename), self._legacy_path(filename)):
+            if os.path.isfile(path):
+                os.remove(path)
+                return True
+        return False
+
+    def result_path(self, sha256, kind, variant=None):
+        """Ruta del resultado ('analysis' o 'pdf') de un contenido, exista o no
+
+        `variant` distingue resultados del mismo contenido calculados con otros
+        ajustes (p. ej. analysis.results_variant()).
+        """
+        if not (len(sha256) == 64 and all(c in '0123456789abcdef' for c in sha256)):
+            raise ValueError(f'Invalid content hash: {sha256}')
+        suffix = f'-{variant}' if variant else ''
+        return os.path.join(self.results_dir, f'{sha256}-v{RESULTS_VERSION}{suffix}{RESULT_EXTENSIONS[kind]}')
+
+    def read_result(self, sha256, kind, variant=None):
+        """Contenido de un resultado guardado (descomprimido) o None"""
+        try:
+            with open_data_file(self.result_path(sha256, kind, variant)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write_result(self, sha256, kind, data, variant=None):
+        """Guarda un resultado de forma atómica (el análisis, comprimido)"""
+        path = self.result_path(sha256, kind, variant)
+        fd, tmp_path = tempfile.mkstemp(dir=self.results_dir, suffix='.tmp')
+        os.close(fd)
+        with (gzip.open(tmp_path, 'wb', compresslevel=6) if path.endswith('.gz') else open(tmp_path, 'wb')) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def referenced_hashes(self):
+        return {record['sha256'] for record in self.list() if 'sha256' in record}
+
+    def gc(self, dry_run=False, grace_seconds=None):
+        """Elimina los blobs sin registros que los referencien; devuelve lo liberado"""
+        grace_seconds = GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        referenced = self.referenced_hashes()
+        cutoff = time.time() - grace_seconds
+        removed = []
+        freed = 0
+        for root, _, names in os.walk(self.blobs_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                sha256 = name.split('.', 1)[0]
+                if sha256 in referenced or os.path.getmtime(path) > cutoff:
+                    continue
+                freed += os.path.getsize(path)
+                removed.append(path)
+                if not dry_run:
+                    os.remove(path)
+        # Resultados de contenidos que ya no referencia ningún registro
+        for name in os.listdir(self.results_dir):
+            path = os.path.join(self.results_dir, name)
+            if name.split('-', 1)[0] in referenced or os.path.getmtime(path) > cutoff:
+                continue
+            freed += os.path.getsize(path)
+            removed.append(path)
+            if not dry_run:
+                os.remove(path)
+        return {'removed': removed, 'freed_bytes': freed, 'dry_run': dry_run}
+
+    def migrate(self):
+        """Incorpora al almacén los CSV sin comprimir del formato anterior"""
+        migrated = []
+        for name in sorted(os.listdir(self.root)):
+            path = self._legacy_path(name)
+            if not (name.endswith('.csv') and os.path.isfile(path)):
+                continue
+            uploaded = datetime.fromtimestamp(os.stat(path).st_ctime)
+            with open(path, 'rb') as f:
+                self.put(f, name, uploaded=uploaded)
+            os.remove(path)
+            migrated.append(name)
+        return migrated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mantenimiento del almacén de archivos subidos')
+    parser.add_argument('command', choices=['gc', 'migrate'], help='Operación a realizar')
+    parser.add_argument('--root', default=os.environ.get('UPLOAD_FOLDER', 'uploads'), help='Carpeta del almacén')
+    parser.add_argument('--dry-run', action='store_true', help='Solo mostrar lo que gc eliminaría')
+    args = parser.parse_args(argv)
+
+    store = UploadStore(args.root)
+    if args.command == 'gc':
+        result = store.gc(dry_run=args.dry_run)
+        action = 'se eliminarían' if args.dry_run else 'eliminados'
+        print(f"🧹 {len(result['removed'])} blobs {action} ({result['freed_bytes']} bytes)")
+    else:
+        migrated = store.migrate()
+        print(f"✅ {len(migrated)} archivos migrados al almacén")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Barrido de retención de archivos subidos y artefactos temporales
+
+Aplica dos presupuestos a cada zona:
+  - antigüedad: se elimina lo que no se ha usado en más de N días/horas
+  - tamaño total: si se supera, se expulsa lo usado menos recientemente (LRU)
+
+Los de los archivos subidos están desactivados salvo que se configuren
+(UPLOAD_RETENTION_DAYS, UPLOAD_BUDGET_MB); los de los temporales, activados.
+
+Zonas:
+  - uploads: archivos del almacén (storage.py). Los registros de un mismo
+    contenido se expulsan juntos y después gc() libera el blob.
+  - temp: PDFs, PNGs y archivos de progreso con prefijo `ctd_` en el
+    directorio temporal del sistema (los que dejan /generate_pdf,
+    create_chart_image y /upload), y las subidas por bloques abandonadas
+    (UPLOAD_FOLDER/.partial, solo por antigüedad).
+
+Se ejecuta una vez por instancia, no una por worker: gunicorn lanza desde el
+master un supervisor (--supervise) que arranca el barrido como hijo suyo y lo
+relanza si termina (ver gunicorn.conf.py). El directorio temporal es de cada
+contenedor, así que cada instancia barre el suyo; lo que vive en UPLOAD_FOLDER
+(almacén y subidas por bloques) puede estar en un volumen compartido, así que
+solo lo barre quien tiene el flock sobre UPLOAD_FOLDER/.sweeper.lock. El
+resultado acumulado de ese barrido se guarda en UPLOAD_FOLDER/.sweeper.json y
+se publica en /metrics.
+
+Uso:
+    python sweeper.py               # un barrido
+    python sweeper.py --dry-run     # solo informar de lo que se eliminaría
+    python sweeper.py --loop        # barrer cada SWEEP_INTERVAL_SECONDS
+    python sweeper.py --supervise   # --loop en un proceso hijo, relanzado si termina
+"""
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from storage import UploadStore, PARTIAL_DIR, TEMP_PREFIX, write_json_atomic
+
+# Presupuestos de los archivos subidos (0 = sin límite). Desactivados por defecto:
+# expulsar una subida borra también su análisis y su PDF, así que es opcional
+UPLOAD_RETENTION_DAYS = float(os.environ.get('UPLOAD_RETENTION_DAYS', 0))
+UPLOAD_BUDGET_MB = float(os.environ.get('UPLOAD_BUDGET_MB', 0))
+
+# Presupuestos de los artefactos temporales (0 = sin límite)
+TEMP_RETENTION_HOURS = float(os.environ.get('TEMP_RETENTION_HOURS', 24))
+TEMP_BUDGET_MB = float(os.environ.get('TEMP_BUDGET_MB', 512))
+
+# Horas sin actividad tras las que se abandona una subida por bloques
+UPLOAD_SESSION_TTL_HOURS = float(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24))
+
+SWEEP_INTERVAL_SECONDS = int(os.environ.get('SWEEP_INTERVAL_SECONDS', 3600))
+SWEEP_DRY_RUN = os.environ.get('SWEEP_DRY_RUN', 'false').lower() == 'true'
+
+# Espera antes de relanzar un barrido que ha terminado (se duplica en cada fallo seguido)
+SWEEPER_RESTART_DELAY = 5
+SWEEPER_MAX_RESTART_DELAY = 300
+
+LOCK_NAME = '.sweeper.lock'
+STATS_NAME = '.sweeper.json'
+
+MB = 1024 * 1024
+
+
+def select_evictions(items, now, max_age_seconds, budget_bytes):
+    """Elige qué expulsar: lo caducado y, si se pasa del presupuesto, lo menos usado
+
+    Cada elemento es un dict con 'size' y 'accessed' (epoch). Devuelve la lista de
+    elementos a eliminar, cada uno con su 'reason' ('age' o 'size').
+    """
+    evicted = []
+    kept = []
+    for item in items:
+        if max_age_seconds and item['accessed'] < now - max_age_seconds:
+            evicted.append(dict(item, reason='age'))
+        else:
+            kept.append(item)
+
+    if budget_bytes:
+        total = sum(item['size'] for item in kept)
+        # LRU: primero lo usado hace más tiempo
+        for item in sorted(kept, key=lambda item: item['accessed']):
+            if total <= budget_bytes:
+                break
+            evicted.append(dict(item, reason='size'))
+            total -= item['size']
+    return evicted
+
+
+def upload_items(store):
+    """Contenidos del almacén con todos los nombres que los referencian"""
+    groups = {}
+    for record in store.list():
+        key = record.get('sha256') or record['filename']
+        group = groups.setdefault(key, {'names': [], 'size': record['stored_size'], 'accessed': 0,
+                                        'legacy': 'sha256' not in record})
+        group['names'].append(record['filename'])
+        group['accessed'] = max(group['accessed'], record['accessed'])
+    return list(groups.values())
+
+
+def temp_items(temp_dir):
+    """Artefactos temporales de la aplicación"""
+    items = []
+    for name in os.listdir(temp_dir):
+        path = os.path.join(temp_dir, name)
+        if name.startswith(TEMP_PREFIX) and os.path.isfile(path):
+            stats = os.stat(path)
+            items.append({'path': path, 'size': stats.st_size, 'accessed': stats.st_mtime})
+    return items
+
+
+def session_items(root):
+    """Subidas por bloques en curso (UPLOAD_FOLDER/.partial/<id>) con su última actividad"""
+    partial_dir = os.path.join(root, PARTIAL_DIR)
+    if not os.path.isdir(partial_dir):
+        return []
+    items = []
+    for upload_id in os.listdir(partial_dir):
+        path = os.path.join(partial_dir, upload_id)
+        try:
+            accessed = os.path.getmtime(os.path.join(path, 'meta.json'))
+        except FileNotFoundError:
+            accessed = os.path.getmtime(path)
+        size = sum(os.path.getsize(os.path.join(dirpath, name))
+                   for dirpath, _, names in os.walk(path) for name in names)
+        items.append({'path': path, 'size': size, 'accessed': accessed})
+    return items
+
+
+def sweep(store, temp_dir=None, dry_run=False, now=None, upload_max_age=None, upload_budget=None,
+          temp_max_age=None, temp_budget=None, shared=True):
+    """Ejecuta un barrido y devuelve lo eliminado (o lo que se eliminaría) por zona
+
+    Con shared=False solo se barre el directorio temporal local: el almacén y
+    las subidas por bloques quedan para el proceso que tiene el lock.
+    """
+    temp_dir = temp_dir or tempfile.gettempdir()
+    now = now or time.time()
+    upload_max_age = UPLOAD_RETENTION_DAYS * 86400 if upload_max_age is None else upload_max_age
+    upload_budget = UPLOAD_BUDGET_MB * MB if upload_budget is None else upload_budget
+    temp_max_age = TEMP_RETENTION_HOURS * 3600 if temp_max_age is None else temp_max_age
+    temp_budget = TEMP_BUDGET_MB * MB if temp_budget is None else temp_budget
+
+    # Archivos subidos: eliminar los nombres y dejar que gc libere los blobs
+    uploads = select_evictions(upload_items(store), now, upload_max_age, upload_budget) if shared else []
+    if not dry_run:
+        for item in uploads:
+            for name in item['names']:
+                store.delete(name)
+    collected = store.gc(dry_run=dry_run) if shared else {'removed': [], 'freed_bytes': 0}
+    if dry_run:
+        # Los blobs de lo expulsado aún tienen referencias: contarlos aparte
+        upload_bytes = collected['freed_bytes'] + sum(item['size'] for item in uploads)
+    else:
+        # Los CSV sin migrar no pasan por gc: se liberan al borrar su nombre
+        upload_bytes = collected['freed_bytes'] + sum(item['size'] for item in uploads if item['legacy'])
+
+    temps = select_evictions(temp_items(temp_dir), now, temp_max_age, temp_budget)
+    # Subidas por bloques abandonadas: solo por antigüedad, nunca por presupuesto
+    if shared:
+        temps += select_evictions(session_items(store.root), now, UPLOAD_SESSION_TTL_HOURS * 3600, 0)
+    if not dry_run:
+        for item in temps:
+            if os.path.isdir(item['path']):
+                shutil.rmtree(item['path'], ignore_errors=True)
+                continue
+            try:
+                os.remove(item['path'])
+            except FileNotFoundError:
+                pass
+
+    return {
+        'dry_run': dry_run,
+        'uploads': {
+            'removed_names': sum(len(item['names']) for item in uploads),
+            'removed_blobs': len(collected['removed']),
+            'reclaimed_bytes': upload_bytes
+        },
+        'temp': {
+            'removed_files': len(temps),
+            'reclaimed_bytes': sum(item['size'] for item in temps)
+        }
+    }
+
+
+def load_stats(root):
+    """Estadísticas acumuladas de los barridos (vacías si aún no hubo ninguno)"""
+    try:
+        with open(os.path.join(root, STATS_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def record_stats(root, result, seconds):
+    """Acumula el resultado de un barrido en UPLOAD_FOLDER/.sweeper.json"""
+    stats = load_stats(root)
+    stats['runs'] = stats.get('runs', 0) + 1
+    stats['last_run'] = time.time()
+    stats['last_duration_seconds'] = round(seconds, 3)
+    stats['last_result'] = result
+    # En modo prueba no se libera nada: no se suma a los contadores
+    if not result['dry_run']:
+        totals = stats.setdefault('totals', {})
+        for area in ('uploads', 'temp'):
+            area_totals = totals.setdefault(area, {'reclaimed_bytes': 0, 'removed_files': 0})
+            area_totals['reclaimed_bytes'] += result[area]['reclaimed_bytes']
+            area_totals['removed_files'] += result[area].get('removed_names', result[area].get('removed_files', 0))
+    write_json_atomic(os.path.join(root, STATS_NAME), stats)
+    return stats
+
+
+def prometheus_metrics(stats):
+    """Estadísticas del barrido en formato de texto de Prometheus"""
+    totals = stats.get('totals', {})
+    last = stats.get('last_result', {})
+    lines = [
+        '# HELP ctd_sweeper_runs_total Completed retention sweeps.',
+        '# TYPE ctd_sweeper_runs_total counter',
+        f"ctd_sweeper_runs_total {stats.get('runs', 0)}",
+        '# HELP ctd_sweeper_last_run_timestamp_seconds Unix time of the last sweep.',
+        '# TYPE ctd_sweeper_last_run_timestamp_seconds gauge',
+        f"ctd_sweeper_last_run_timestamp_seconds {stats.get('last_run', 0)}",
+        '# HELP ctd_sweeper_dry_run Whether the last sweep was a dry run.',
+        '# TYPE ctd_sweeper_dry_run gauge',
+        f"ctd_sweeper_dry_run {int(bool(last.get('dry_run')))}",
+        '# HELP ctd_sweeper_reclaimed_bytes_total Bytes reclaimed by the sweeper.',
+        '# TYPE ctd_sweeper_reclaimed_bytes_total counter',
+    ]
+    for area in ('uploads', 'temp'):
+        lines.append(f'ctd_sweeper_reclaimed_bytes_total{{area="{area}"}} '
+                     f"{totals.get(area, {}).get('reclaimed_bytes', 0)}")
+    lines += [
+        '# HELP ctd_sweeper_removed_files_total Files removed by the sweeper.',
+        '# TYPE ctd_sweeper_removed_files_total counter',
+    ]
+    for area in ('uploads', 'temp'):
+        lines.append(f'ctd_sweeper_removed_files_total{{area="{area}"}} '
+                     f"{totals.get(area, {}).get('removed_files', 0)}")
+    lines += [
+        '# HELP ctd_sweeper_last_reclaimable_bytes Bytes reclaimed (or reclaimable, in dry runs) by the last sweep.',
+        '# TYPE ctd_sweeper_last_reclaimable_bytes gauge',
+    ]
+    for area in ('uploads', 'temp'):
+        lines.append(f'ctd_sweeper_last_reclaimable_bytes{{area="{area}"}} '
+                     f"{last.get(area, {}).get('reclaimed_bytes', 0)}")
+    return '\n'.join(lines) + '\n'
+
+
+def acquire_leader_lock(root, blocking=False, name=LOCK_NAME):
+    """Intenta ser el único barrendero del despliegue; devuelve el archivo bloqueado o None
+
+    Otros servicios de un solo proceso (watcher.py) lo usan con su propio `name`.
+    """
+    handle = open(os.path.join(root, name), 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+
+def run_once(store, dry_run=False, shared=True):
+    started = time.perf_counter()
+    result = sweep(store, dry_run=dry_run, shared=shared)
+    # Las estadísticas viven en el volumen compartido: solo las escribe quien tiene el lock
+    if shared:
+        record_stats(store.root, result, time.perf_counter() - started)
+    return result
+
+
+def run_forever(store, interval=None, dry_run=False):
+    """Barre periódicamente el temporal local, y el almacén mientras se tenga el lock"""
+    interval = interval or SWEEP_INTERVAL_SECONDS
+    lock = None
+    while True:
+        if lock is None:
+            lock = acquire_leader_lock(store.root)
+        try:
+            result = run_once(store, dry_run=dry_run, shared=lock is not None)
+            print(f"🧹 Barrido: {json.dumps(result)}", flush=True)
+        except Exception as e:
+            print(f"❌ Error en el barrido: {str(e)}", flush=True)
+        time.sleep(interval)
+
+
+def supervise(command, stopping=None, restart_delay=None, max_delay=None):
+    """Ejecuta `command` como hijo y lo relanza con espera creciente si termina
+
+    El supervisor es quien espera al hijo, así que su código de salida es
+    fiable (el master de gunicorn recoge a sus propios hijos con waitpid(-1)).
+    Un hijo terminado por SIGTERM/SIGINT es una parada deliberada.
+    """
+    stopping = stopping or threading.Event()
+    restart_delay = restart_delay or SWEEPER_RESTART_DELAY
+    max_delay = max_delay or SWEEPER_MAX_RESTART_DELAY
+    delay = restart_delay
+    while not stopping.is_set():
+        started = time.monotonic()
+        process = subprocess.Popen(command)
+        while process.poll() is None and not stopping.is_set():
+            time.sleep(0.1)
+        if stopping.is_set():
+            stop_process(process)
+            return
+        code = process.returncode
+        if code in (-signal.SIGTERM, -signal.SIGINT):
+            print(f'⏹️  Sweeper detenido por la señal {-code}', flush=True)
+            return
+        # Si llevaba tiempo funcionando, el fallo no es seguido: volver a la espera inicial
+        if time.monotonic() - started > max_delay:
+            delay = restart_delay
+        print(f'❌ Sweeper terminó con código {code}; se relanza en {delay} s', flush=True)
+        if stopping.wait(delay):
+            return
+        delay = min(delay * 2, max_delay)
+
+
+def stop_process(process, timeout=10):
+    """SIGTERM y, si no ha terminado en `timeout` segundos, SIGKILL"""
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Retención de archivos subidos y temporales')
+    parser.add_argument('--root', default=os.environ.get('UPLOAD_FOLDER', 'uploads'), help='Carpeta del almacén')
+    parser.add_argument('--dry-run', action='store_true', default=SWEEP_DRY_RUN,
+                        help='Solo informar de lo que se eliminaría')
+    parser.add_argument('--loop', action='store_true', help='Barrer cada SWEEP_INTERVAL_SECONDS')
+    parser.add_argument('--supervise', action='store_true',
+                        help='Ejecutar --loop en un proceso hijo y relanzarlo si termina')
+    args = parser.parse_args(argv)
+
+    if args.supervise:
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+        command = [sys.executable, os.path.abspath(__file__), '--loop', '--root', args.root]
+        if args.dry_run:
+            command.append('--dry-run')
+        supervise(command, stopping)
+        return 0
+
+    store = UploadStore(args.root)
+    if args.loop:
+        run_forever(store, dry_run=args.dry_run)
+        return 0
+
+    lock = acquire_leader_lock(store.root)
+    if lock is None:
+        print('⏭️  Otro proceso está barriendo el almacén; solo se barre el temporal local')
+        result = run_once(store, dry_run=args.dry_run, shared=False)
+        print(json.dumps(result, indent=2))
+        return 0
+    with lock:
+        result = run_once(store, dry_run=args.dry_run)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Generador de exportaciones sintéticas del broker (posiciones cerradas y finanzas)
+
+Produce CSVs reproducibles (misma semilla = mismo archivo) de cualquier tamaño,
+incluyendo filas mal formadas con comas sin escapar en la última columna, que
+son las que activan el parser manual de respaldo de la aplicación.
+
+Uso:
+    python synthetic_data.py trading 100000 -o uploads/demo_trading.csv
+    python synthetic_data.py finance 5000 --malformed 0.01 -o finanzas.csv
+"""
+import argparse
+import io
+import sys
+
+import numpy as np
+import pandas as pd
+
+TRADING_COLUMNS = ['ID', 'Instrumentos', 'Tipo', 'Volumen', 'Horario de apertura', 'Precio de apertura',
+                   'Hora de cierre', 'Precio de cierre', 'Swap', 'Utilidad', 'Razón']
+
+FINANCE_COLUMNS = ['ID', 'Tipo', 'Tiempo', 'Monto', 'Estatus', 'Pasarela de pago', 'Detalles']
+
+# Instrumentos con su precio de referencia y peso relativo de operaciones
+INSTRUMENTS = {
+    'US100.': (23400.0, 0.22),
+    'XAUUSD': (2450.0, 0.20),
+    'EURUSD': (1.09, 0.14),
+    'GBPUSD': (1.28, 0.08),
+    'USDJPY': (148.5, 0.08),
+    'US30.': (39500.0, 0.07),
+    'US500.': (5500.0, 0.07),
+    'BTCUSD': (62000.0, 0.05),
+    'GER40.': (18500.0, 0.04),
+    'USOIL': (78.0, 0.03),
+    'XAGUSD': (29.0, 0.02),
+}
+
+REASONS = ['Usuario', 'Take Profit', 'Stop Loss', 'Stop Out']
+REASON_WEIGHTS = [0.45, 0.30, 0.23, 0.02]
+
+# Valores de la última columna que contienen comas sin escapar
+MALFORMED_REASONS = ['Stop Loss, cierre parcial', 'Usuario, cierre desde móvil']
+FINANCE_DETAILS = ['Depósito manual', 'Retiro a cuenta bancaria', 'Ajuste de saldo', 'Bono de bienvenida']
+MALFORMED_DETAILS = ['Depósito manual, ref. interna', 'Ajuste de saldo, corrección, soporte']
+
+DEFAULT_CHUNK_SIZE = 250_000
+
+
+def _chunk_rng(seed, chunk_index):
+    """Generador aleatorio independiente y reproducible por bloque"""
+    return np.random.default_rng(np.random.SeedSequence([seed, chunk_index]))
+
+
+def _format_times(values):
+    """Formatea timestamps con milisegundos como en la exportación original"""
+    return np.datetime_as_string(np.asarray(values, dtype='datetime64[ns]').astype('datetime64[ms]'), unit='ms')
+
+
+def generate_trading_frame(rows, seed=42, malformed_ratio=0.0, start='2023-01-02', chunk_index=0):
+    """Genera un DataFrame de posiciones cerradas con el formato del broker"""
+    rng = _chunk_rng(seed, chunk_index)
+    names = list(INSTRUMENTS)
+    base_prices = np.array([INSTRUMENTS[name][0] for name in names])
+    weights = np.array([INSTRUMENTS[name][1] for name in names])
+    instrument_idx = rng.choice(len(names), size=rows, p=weights / weights.sum())
+
+    # Aperturas separadas ~7 minutos de media
+    start_ns = pd.Timestamp(start).value
+    gaps = rng.exponential(420.0, size=rows) * 10**9
+    open_ns = start_ns + np.cumsum(gaps).astype(np.int64)
+    holding_ns = (rng.lognormal(mean=7.0, sigma=1.5, size=rows) * 10**9).astype(np.int64)
+    close_ns = open_ns + holding_ns
+
+    open_price = base_prices[instrument_idx] * (1 + rng.normal(0, 0.02, size=rows))
+    close_price = open_price * (1 + rng.normal(0.0001, 0.002, size=rows))
+    volume = rng.choice([0.01, 0.05, 0.1, 0.2, 0.5, 1.0], size=rows, p=[0.3, 0.25, 0.2, 0.12, 0.08, 0.05])
+    side = rng.choice(['Compra', 'Venta'], size=rows)
+
+    # Resultado con ligera asimetría positiva y colas gruesas
+    profit = rng.standard_t(df=3, size=rows) * 12.0 * volume * 10 + 0.15
+    swap = np.where(rng.random(rows) < 0.15, -np.abs(rng.normal(0.4, 0.6, size=rows)), 0.0)
+    reasons = np.array(REASONS)[rng.choice(len(REASONS), size=rows, p=REASON_WEIGHTS)].astype(object)
+
+    if malformed_ratio > 0:
+        malformed = rng.random(rows) < malformed_ratio
+        reasons[malformed] = rng.choice(MALFORMED_REASONS, size=int(malformed.sum()))
+
+    ids = np.char.add('W', np.char.zfill((rng.integers(10**15, 10**16, size=rows)).astype(str), 16))
+
+    return pd.DataFrame({
+        'ID': ids,
+        'Instrumentos': np.array(names)[instrument_idx],
+        'Tipo': side,
+        'Volumen': volume,
+        'Horario de apertura': _format_times(open_ns),
+        'Precio de apertura': np.round(open_price, 5),
+        'Hora de cierre': _format_times(close_ns),
+        'Precio de cierre': np.round(close_price, 5),
+        'Swap': np.round(swap, 2),
+        'Utilidad': np.round(profit, 2),
+        'Razón': reasons,
+    }, columns=TRADING_COLUMNS)
+
+
+def generate_finance_frame(rows, seed=42, malformed_ratio=0.0, start='2023-01-02', chunk_index=0):
+    """Genera un DataFrame de transacciones financieras con el formato del broker"""
+    rng = _chunk_rng(seed, chunk_index)
+
+    # Transacciones separadas ~3 días de media
+    start_ns = pd.Timestamp(start).value
+    gaps = rng.exponential(3 * 86400.0, size=rows) * 10**9
+    times = start_ns + np.cumsum(gaps).astype(np.int64)
+
+    kinds = rng.choice(['Depósito', 'Retiro'], size=rows, p=[0.75, 0.25])
+    gateways = rng.choice(['Manual', 'Tarjeta', 'Transferencia', 'Cripto'], size=rows, p=[0.55, 0.2, 0.15, 0.1])
+    status = rng.choice(['Completado', 'Pendiente', 'Rechazado'], size=rows, p=[0.9, 0.06, 0.04])
+    amount = np.round(rng.lognormal(mean=6.0, sigma=1.0, size=rows), 2)
+    details = np.array(FINANCE_DETAILS)[rng.choice(len(FINANCE_DETAILS), size=rows)].astype(object)
+
+    if malformed_ratio > 0:
+        malformed = rng.random(rows) < malformed_ratio
+        details[malformed] = rng.choice(MALFORMED_DETAILS, size=int(malformed.sum()))
+
+    ids = np.char.add('T', np.char.zfill((rng.integers(10**9, 10**10, size=rows)).astype(str), 10))
+
+    return pd.DataFrame({
+        'ID': ids,
+        'Tipo': kinds,
+        'Tiempo': _format_times(times),
+        'Monto': amount,
+        'Estatus': status,
+        'Pasarela de pago': gateways,
+        'Detalles': details,
+    }, columns=FINANCE_COLUMNS)
+
+
+GENERATORS = {
+    'trading': generate_trading_frame,
+    'finance': generate_finance_frame,
+}
+
+# Columna temporal que ordena cada tipo de archivo
+TIME_COLUMNS = {
+    'trading': 'Horario de apertura',
+    'finance': 'Tiempo',
+}
+
+
+def _frame_to_csv_lines(df):
+    """Serializa un bloque dejando la última columna sin comillas (como el broker)"""
+    head = df.iloc[:, :-1].to_csv(index=False, header=False, lineterminator='\n').split('\n')[:-1]
+    tail = df.iloc[:, -1].astype(str).tolist()
+    return ''.join(f"{a},{b}\n" for a, b in zip(head, tail))
+
+
+def write_csv(kind, output, rows, seed=42, malformed_ratio=0.0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Escribe un CSV sintético por bloques en una ruta o en un objeto de texto abierto"""
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown file kind: {kind}")
+
+    generator = GENERATORS[kind]
+    columns = TRADING_COLUMNS if kind == 'trading' else FINANCE_COLUMNS
+
+    handle = open(output, 'w', encoding='utf-8', newline='') if isinstance(output, str) else output
+    try:
+        handle.write(','.join(columns) + '\n')
+        written = 0
+        chunk_index = 0
+        start = '2023-01-02'
+        while written < rows:
+            size = min(chunk_size, rows - written)
+            frame = generator(size, seed=seed, malformed_ratio=malformed_ratio, start=start,
+                              chunk_index=chunk_index)
+            handle.write(_frame_to_csv_lines(frame))
+            # Cada bloque continúa donde terminó el anterior
+            start = frame[TIME_COLUMNS[kind]].iloc[-1]
+            written += size
+            chunk_index += 1
+    finally:
+        if isinstance(output, str):
+            handle.close()
+
+    return output
+
+
+def generate_csv_bytes(kind, rows, seed=42, malformed_ratio=0.0):
+    """Devuelve el contenido CSV sintético en memoria (útil para pruebas y carga)"""
+    buffer = io.StringIO()
+    write_csv(kind, buffer, rows, seed=seed, malformed_ratio=malformed_ratio)
+    return buffer.getvalue().encode('utf-8')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera exportaciones sintéticas del broker')
+    parser.add_argument('kind', choices=sorted(GENERATORS), help='Tipo de archivo a generar')
+    parser.add_argument('rows', type=int, help='Número de filas')
+    parser.add_argument('-o', '--output', required=True, help='Ruta del CSV de salida')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla para reproducibilidad')
+    parser.add_argument('--malformed', type=float, default=0.0,
+                        help='Proporción de filas con comas sin escapar en la última columna')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Filas por bloque de escritura')
+    args = parser.parse_args(argv)
+
+    write_csv(args.kind, args.output, args.rows, seed=args.seed,
+              malformed_ratio=args.malformed, chunk_size=args.chunk_size)
+    print(f"✅ {args.rows} filas de tipo '{args.kind}' escritas en {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
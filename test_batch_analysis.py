@@ -0,0 +1,41 @@
+"""
+Pruebas del análisis por lotes (sin Flask)
+"""
+import json
+import os
+import subprocess
+import sys
+
+import batch_analysis
+import synthetic_data
+
+
+def test_batch_analysis_does_not_import_flask():
+    code = 'import sys, batch_analysis, analysis; print("flask" in sys.modules)'
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert output.strip() == b'False'
+
+
+def test_iter_analyze_reports_every_file(tmp_path):
+    inputs = tmp_path / 'inputs'
+    inputs.mkdir()
+    synthetic_data.write_csv('trading', str(inputs / 'cuenta_a.csv'), 3000)
+    synthetic_data.write_csv('finance', str(inputs / 'cuenta_b.csv'), 500)
+    (inputs / 'roto.csv').write_text('x,y\n1,2\n', encoding='utf-8')
+
+    output_dir = tmp_path / 'out'
+    records = list(batch_analysis.iter_analyze([str(inputs)], str(output_dir), jobs=2))
+    by_name = {os.path.basename(record['input']): record for record in records}
+
+    assert by_name['cuenta_a.csv']['status'] == 'ok'
+    assert by_name['cuenta_a.csv']['summary']['total_operations'] == 3000
+    assert by_name['cuenta_b.csv']['file_type'] == 'finance'
+    assert by_name['roto.csv']['status'] == 'error'
+    assert 'Missing required columns' in by_name['roto.csv']['error']
+
+    with open(output_dir / 'cuenta_a.json', encoding='utf-8') as f:
+        assert json.load(f)['summary']['total_operations'] == 3000
+
+
+def test_output_stems_are_unique():
+    assert batch_analysis.output_stems(['a/x.csv', 'b/x.csv', 'c/y.csv']) == ['x', 'x_2', 'y']
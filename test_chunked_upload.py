@@ -0,0 +1,132 @@
+"""
+Pruebas de las subidas por bloques reanudables
+"""
+import hashlib
+import zlib
+
+import pandas as pd
+import pytest
+
+import app as app_module
+import chunked_upload
+from analysis import read_csv_file
+from chunked_upload import ChunkedUploads, ChunkedUploadError
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+
+def _sha(data):
+    return 'sha256 ' + hashlib.sha256(data).hexdigest()
+
+
+def _upload_in_chunks(uploads, upload_id, content, chunk_size):
+    offset = 0
+    while offset < len(content):
+        chunk = content[offset:offset + chunk_size]
+        offset = uploads.append(upload_id, offset, chunk, _sha(chunk))
+        uploads.parse_pending(upload_id)
+    return offset
+
+
+def test_incremental_parse_matches_full_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunked_upload, 'PARSE_MIN_BYTES', 1)
+    content = generate_csv_bytes('trading', 3000, malformed_ratio=0.02)
+    uploads = ChunkedUploads(str(tmp_path))
+    upload_id = uploads.create('cuenta.csv', size=len(content))['upload_id']
+
+    # Bloques que cortan líneas (y caracteres UTF-8) por la mitad
+    _upload_in_chunks(uploads, upload_id, content, 7777)
+    assert uploads.status(upload_id)['rows_parsed'] > 0
+    _, _, df = uploads.complete(upload_id)
+
+    expected = read_csv_file(content)
+    assert len(df) == 3000
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+def test_rejects_bad_checksum_and_wrong_offset(tmp_path):
+    uploads = ChunkedUploads(str(tmp_path))
+    upload_id = uploads.create('cuenta.csv', size=10)['upload_id']
+
+    with pytest.raises(ChunkedUploadError) as error:
+        uploads.append(upload_id, 0, b'abcde', 'sha256 ' + '0' * 64)
+    assert error.value.status == 460
+    assert uploads.status(upload_id)['offset'] == 0
+
+    crc = format(zlib.crc32(b'abcde') & 0xffffffff, '08x')
+    assert uploads.append(upload_id, 0, b'abcde', f'crc32 {crc}') == 5
+
+    # Reenviar un bloque ya confirmado: el servidor indica dónde continuar
+    with pytest.raises(ChunkedUploadError) as error:
+        uploads.append(upload_id, 0, b'abcde', _sha(b'abcde'))
+    assert (error.value.status, error.value.offset) == (409, 5)
+
+    with pytest.raises(ChunkedUploadError) as error:
+        uploads.append(upload_id, 5, b'toolong', _sha(b'toolong'))
+    assert error.value.status == 413
+
+    with pytest.raises(ChunkedUploadError) as error:
+        uploads.complete(upload_id)
+    assert error.value.status == 409
+
+    with pytest.raises(ChunkedUploadError) as error:
+        uploads.status('../../etc')
+    assert error.value.status == 404
+
+
+def test_chunked_endpoints_resume_and_analyze(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path), codec='gzip'))
+    monkeypatch.setattr(app_module, 'chunked_uploads', ChunkedUploads(str(tmp_path)))
+    client = app_module.app.test_client()
+    content = generate_csv_bytes('trading', 2000)
+
+    response = client.post('/uploads', json={'filename': 'grande.csv', 'size': len(content)})
+    assert response.status_code == 201
+    upload_id = response.get_json()['upload_id']
+
+    half = len(content) // 2
+    response = client.patch(f'/uploads/{upload_id}', data=content[:half],
+                            headers={'Upload-Offset': '0', 'Upload-Checksum': _sha(content[:half])})
+    assert response.get_json() == {'offset': half}
+
+    # Tras un corte, el cliente consulta el offset confirmado y continúa
+    offset = client.get(f'/uploads/{upload_id}').get_json()['offset']
+    assert offset == half
+    response = client.patch(f'/uploads/{upload_id}', data=content[offset:],
+                            headers={'Upload-Offset': str(offset), 'Upload-Checksum': _sha(content[offset:])})
+    assert response.get_json() == {'offset': len(content)}
+
+    response = client.post(f'/uploads/{upload_id}/complete',
+                           json={'sha256': hashlib.sha256(content).hexdigest()})
+    assert response.status_code == 200
+    assert response.get_json()['summary']['total_operations'] == 2000
+
+    # La sesión desaparece y el archivo queda en el almacén
+    assert client.get(f'/uploads/{upload_id}').status_code == 404
+    files = client.get('/files').get_json()['files']
+    assert [f['size'] for f in files] == [len(content)]
+
+
+def test_complete_rejects_whole_file_checksum_mismatch(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path), codec='gzip'))
+    monkeypatch.setattr(app_module, 'chunked_uploads', ChunkedUploads(str(tmp_path)))
+    client = app_module.app.test_client()
+    content = generate_csv_bytes('trading', 200)
+
+    upload_id = client.post('/uploads', json={'filename': 'dañado.csv', 'size': len(content)}).get_json()['upload_id']
+    client.patch(f'/uploads/{upload_id}', data=content,
+                 headers={'Upload-Offset': '0', 'Upload-Checksum': _sha(content)})
+
+    # 400 y no 460 (que el cliente reintenta): el archivo entero no coincide
+    response = client.post(f'/uploads/{upload_id}/complete', json={'sha256': '0' * 64})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'File checksum mismatch'}
+    assert client.get(f'/uploads/{upload_id}').status_code == 404
+    assert client.get('/files').get_json()['files'] == []
+
+
+def test_init_validates_filename(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'chunked_uploads', ChunkedUploads(str(tmp_path)))
+    client = app_module.app.test_client()
+    assert client.post('/uploads', json={'filename': '../x.csv'}).status_code == 400
+    assert client.post('/uploads', json={'filename': 'x.txt'}).status_code == 400
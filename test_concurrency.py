@@ -0,0 +1,86 @@
+"""
+Pruebas del tamaño de workers y del control de admisión de rutas caras
+"""
+import threading
+import time
+
+import app as app_module
+import concurrency
+from concurrency import AdmissionGate, worker_count
+from storage import UploadStore
+
+
+def test_worker_count_is_limited_by_memory():
+    gb = 1024 ** 3
+    assert worker_count(4, None) == 9
+    assert worker_count(4, 64 * gb, worker_memory_mb=512, fraction=0.75, max_active=1) == 9
+    assert worker_count(4, 2 * gb, worker_memory_mb=512, fraction=0.75, max_active=1) == 3
+    assert worker_count(4, 256 * 1024 ** 2, worker_memory_mb=512, fraction=0.75, max_active=1) == 1
+
+
+def test_worker_count_reserves_memory_for_every_active_analysis(monkeypatch):
+    gb = 1024 ** 3
+    # 6 GB x 0.75 = 4.5 GB: caben 9 análisis de 512 MB, pero con 2 por worker solo 4 workers
+    assert worker_count(8, 6 * gb, worker_memory_mb=512, fraction=0.75, max_active=1) == 9
+    assert worker_count(8, 6 * gb, worker_memory_mb=512, fraction=0.75, max_active=2) == 4
+    assert worker_count(8, 6 * gb, worker_memory_mb=512, fraction=0.75, max_active=4) == 2
+
+    # Por defecto se usa ADMISSION_MAX_ACTIVE
+    monkeypatch.setattr(concurrency, 'ADMISSION_MAX_ACTIVE', 3)
+    assert worker_count(8, 6 * gb, worker_memory_mb=512, fraction=0.75) == 3
+
+
+def test_memory_limit_prefers_cgroup(tmp_path, monkeypatch):
+    limit = tmp_path / 'memory.max'
+    limit.write_text('1073741824\n')
+    monkeypatch.setattr(concurrency, 'CGROUP_MEMORY_FILES', (str(limit),))
+    assert concurrency.memory_limit_bytes() == 1024 ** 3
+
+    limit.write_text('max\n')
+    assert concurrency.memory_limit_bytes() > 0
+
+
+def test_gate_queues_then_rejects_with_retry_after(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path), codec='gzip'))
+    gate = AdmissionGate(max_active=1, max_queue=1, queue_timeout=5)
+    running = threading.Event()
+    finish = threading.Event()
+
+    @gate
+    def slow_view():
+        running.set()
+        finish.wait(5)
+        return 'ok'
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(slow_view()))
+    first.start()
+    running.wait(5)
+    queued = threading.Thread(target=lambda: results.append(slow_view()))
+    queued.start()
+    while gate.waiting == 0:
+        time.sleep(0.01)
+
+    # Un hueco ocupado y la cola llena: la siguiente petición cara se rechaza al momento
+    with app_module.app.test_request_context():
+        response, status = slow_view()
+    assert status == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert gate.rejected == 1
+
+    # Las rutas baratas no pasan por la cola
+    assert app_module.app.test_client().get('/files').status_code == 200
+
+    finish.set()
+    first.join(5)
+    queued.join(5)
+    assert results == ['ok', 'ok']
+
+
+def test_gate_rejects_after_queue_timeout():
+    gate = AdmissionGate(max_active=1, max_queue=1, queue_timeout=0.05)
+    assert gate.acquire()
+    assert not gate.acquire()
+    assert gate.waiting == 0 and gate.rejected == 1
+    gate.release(0.1)
+    assert gate.acquire()
@@ -0,0 +1,77 @@
+"""
+Pruebas de la caché de datasets compartida entre workers
+"""
+import gc
+import hashlib
+import io
+import json
+
+import pytest
+
+import app as app_module
+from analysis import analyze_dataframe, json_default, read_csv_file, read_typed_file
+from dataset_cache import DatasetCache
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+
+def _key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_cached_dataset_is_mapped_and_analyzes_the_same(tmp_path):
+    data = generate_csv_bytes('trading', 2000, malformed_ratio=0.01)
+    cache = DatasetCache(str(tmp_path), budget_bytes=10 ** 8)
+    cache.load(_key(data), lambda: read_typed_file(data))
+
+    df = cache.load(_key(data), lambda: pytest.fail('the dataset should come from the cache'))
+    # Las columnas apuntan al archivo mapeado (solo lectura), no a una copia
+    assert not df['Utilidad'].to_numpy().flags.writeable
+
+    expected = analyze_dataframe(read_csv_file(data))
+    assert json.dumps(analyze_dataframe(df), default=json_default, sort_keys=True) == \
+        json.dumps(expected, default=json_default, sort_keys=True)
+
+
+def test_lru_eviction_keeps_datasets_in_use(tmp_path):
+    datasets = [generate_csv_bytes('finance', 500, seed=seed) for seed in range(3)]
+    first = DatasetCache(str(tmp_path), budget_bytes=10 ** 8).put(_key(datasets[0]), read_typed_file(datasets[0]))
+    size = DatasetCache(str(tmp_path)).entries()[0]['size']
+    cache = DatasetCache(str(tmp_path), budget_bytes=int(size * 1.5))
+
+    # El primero sigue abierto: no se expulsa aunque se pase del presupuesto
+    cache.put(_key(datasets[1]), read_typed_file(datasets[1]))
+    assert cache.get(_key(datasets[0])) is not None
+    assert len(cache.entries()) == 2
+
+    # Al soltarlo, el siguiente guardado lo expulsa (el menos usado)
+    del first
+    gc.collect()
+    cache.put(_key(datasets[2]), read_typed_file(datasets[2]))
+    assert cache.get(_key(datasets[0])) is None
+    assert cache.get(_key(datasets[2])) is not None
+
+
+def test_disabled_cache_returns_loader_result(tmp_path):
+    cache = DatasetCache(str(tmp_path / 'off'), budget_bytes=0)
+    assert cache.load('0' * 64, lambda: 'df') == 'df'
+    assert not (tmp_path / 'off').exists()
+
+
+def test_reanalyze_uses_shared_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    monkeypatch.setattr(app_module, 'dataset_cache', DatasetCache(str(tmp_path / 'cache'), budget_bytes=10 ** 8))
+    client = app_module.app.test_client()
+
+    response = client.post('/upload', data={'file': (io.BytesIO(generate_csv_bytes('trading', 300)), 'cuenta.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    filename = client.get('/files').get_json()['files'][0]['filename']
+
+    # Otro worker: el dataset ya está en la caché compartida, no se vuelve a leer el CSV
+    monkeypatch.setattr(app_module, 'read_typed_file', lambda path: pytest.fail('CSV read again'))
+    response = client.get(f'/analyze/{filename}')
+    assert response.status_code == 200
+    assert response.get_json()['summary']['total_operations'] == 300
+
+    assert client.get('/analyze/missing.csv').status_code == 404
@@ -0,0 +1,63 @@
+"""
+Pruebas de los histogramas de tamaño fijo
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analysis
+import distributions
+import synthetic_data
+
+
+def _trades(rows, seed):
+    df = synthetic_data.generate_trading_frame(rows, seed=seed)
+    return analysis.parse_dates(df, ['Horario de apertura', 'Hora de cierre'])
+
+
+def test_streaming_chunks_equal_single_pass():
+    df = _trades(5000, seed=1)
+    edges = distributions.pnl_edges(df['Utilidad'])
+
+    whole = distributions.TradeDistributions(edges).update(df)
+    merged = distributions.TradeDistributions(edges)
+    for start in range(0, len(df), 1200):
+        chunk = distributions.TradeDistributions(edges).update(df.iloc[start:start + 1200])
+        merged.merge(chunk)
+
+    assert whole.to_dict() == merged.to_dict()
+    assert whole.to_dict()['pnl']['total'] == 5000
+    assert sum(sum(row) for row in whole.to_dict()['hour_weekday']['trades']) == 5000
+
+
+def test_payload_size_does_not_grow_with_trades():
+    small = json.dumps(distributions.compute_distributions(_trades(1000, seed=2)))
+    large = json.dumps(distributions.compute_distributions(_trades(50000, seed=3)))
+    assert len(large) < len(small) * 1.5
+
+
+def test_hour_weekday_grid_matches_pandas():
+    df = _trades(3000, seed=4)
+    grid = distributions.HourWeekdayGrid().update(df['Horario de apertura'], df['Utilidad']).to_dict()
+
+    expected = df.groupby([df['Horario de apertura'].dt.weekday, df['Horario de apertura'].dt.hour])['Utilidad'].sum()
+    for (weekday, hour), value in expected.items():
+        assert abs(grid['pnl'][weekday][hour] - round(value, 2)) < 1e-6
+
+
+def test_histograms_track_out_of_range_values():
+    histogram = distributions.FixedHistogram([0, 10, 20]).update([-5, 0, 5, 10, 20, 25, np.nan])
+    assert histogram.to_dict() == {'edges': [0.0, 10.0, 20.0], 'counts': [2, 2], 'underflow': 1,
+                                   'overflow': 1, 'total': 6}
+
+    with pytest.raises(ValueError):
+        histogram.merge(distributions.FixedHistogram([0, 5, 20]))
+
+    holding = distributions.TradeDistributions([-1, 0, 1]).update(pd.DataFrame({
+        'Utilidad': [0.5],
+        'Horario de apertura': pd.to_datetime(['2024-01-01 10:00']),
+        'Hora de cierre': pd.to_datetime(['2024-01-01 09:00']),
+    })).to_dict()['holding_minutes']
+    assert holding['total'] == 0
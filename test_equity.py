@@ -0,0 +1,96 @@
+"""
+Pruebas de la evolución conjunta de depósitos y P&L realizada
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+import equity
+from app import app
+from synthetic_data import generate_csv_bytes, generate_finance_frame, generate_trading_frame
+
+
+def _trades(rows):
+    return pd.DataFrame([{'Horario de apertura': close, 'Hora de cierre': close, 'Utilidad': pnl}
+                         for close, pnl in rows])
+
+
+def _finance(rows):
+    return pd.DataFrame([{'Tipo': kind, 'Tiempo': time, 'Monto': amount, 'Pasarela de pago': gateway}
+                         for kind, time, amount, gateway in rows])
+
+
+def test_asof_alignment():
+    trading = _trades([('2024-01-03 10:00', 50.0), ('2024-01-01 12:00', -20.0), ('2024-01-05 09:00', 30.0)])
+    finance = _finance([
+        ('Depósito', '2024-01-01 09:00', 1000.0, 'Manual'),
+        ('Depósito', '2024-01-04 09:00', 500.0, 'Manual'),
+        ('Depósito', '2024-01-02 09:00', 9999.0, 'Tarjeta'),
+        ('Retiro', '2024-01-02 10:00', 200.0, 'Manual'),
+    ])
+    result = equity.build_equity_timeline(trading, finance)
+    series = result['series']
+
+    assert series['x'] == ['2024-01-01 09:00:00', '2024-01-01 12:00:00', '2024-01-03 10:00:00',
+                           '2024-01-04 09:00:00', '2024-01-05 09:00:00']
+    assert series['deposits'] == [1000.0, 1000.0, 1000.0, 1500.0, 1500.0]
+    assert series['pnl'] == [0.0, -20.0, 30.0, 30.0, 60.0]
+    assert series['equity'] == [1000.0, 980.0, 1030.0, 1530.0, 1560.0]
+    assert series['roi'] == [0.0, -2.0, 3.0, 2.0, 4.0]
+    assert result['summary'] == {
+        'total_deposits': 1500.0, 'realized_pnl': 60.0, 'final_equity': 1560.0, 'roi': 4.0,
+        'deposit_count': 2, 'trade_count': 3,
+        'start': '2024-01-01 09:00:00', 'end': '2024-01-05 09:00:00'
+    }
+
+
+def test_pnl_before_first_deposit_has_no_roi():
+    trading = _trades([('2024-01-01 08:00', 10.0)])
+    finance = _finance([('Depósito', '2024-01-02 08:00', 100.0, 'Manual')])
+    series = equity.build_equity_timeline(trading, finance)['series']
+
+    assert series['roi'] == [None, 10.0]
+    assert series['equity'] == [10.0, 110.0]
+
+
+def test_point_budget_matches_naive_lookup():
+    trading = generate_trading_frame(3000, seed=3)
+    finance = generate_finance_frame(400, seed=3)
+    # Tiempos en segundos enteros para poder comparar con las fechas formateadas de la serie
+    trading['Hora de cierre'] = pd.to_datetime(trading['Hora de cierre']).dt.floor('s')
+    finance['Tiempo'] = pd.to_datetime(finance['Tiempo']).dt.floor('s')
+    result = equity.build_equity_timeline(trading.copy(), finance.copy(), max_points=200)
+    series = result['series']
+    assert len(series['x']) == 200
+
+    closes = pd.to_datetime(trading['Hora de cierre'])
+    deposits = finance[(finance['Tipo'] == 'Depósito') & (finance['Pasarela de pago'] == 'Manual')]
+    deposit_times = pd.to_datetime(deposits['Tiempo'])
+    for i in (0, 50, 123, 199):
+        t = pd.Timestamp(series['x'][i])
+        assert np.isclose(series['pnl'][i], trading['Utilidad'][closes <= t].sum(), atol=0.01)
+        assert np.isclose(series['deposits'][i], deposits['Monto'][deposit_times <= t].sum(), atol=0.01)
+
+
+def test_equity_endpoint():
+    client = app.test_client()
+    response = client.post('/analyze/equity', data={
+        'trading_file': (io.BytesIO(generate_csv_bytes('trading', 500)), 'posiciones.csv'),
+        'finance_file': (io.BytesIO(generate_csv_bytes('finance', 50)), 'finanzas.csv'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['summary']['trade_count'] == 500
+    assert set(data['charts']) == {'equity', 'roi'}
+
+
+def test_equity_endpoint_rejects_swapped_files():
+    client = app.test_client()
+    response = client.post('/analyze/equity', data={
+        'trading_file': (io.BytesIO(generate_csv_bytes('finance', 50)), 'finanzas.csv'),
+        'finance_file': (io.BytesIO(generate_csv_bytes('trading', 50)), 'posiciones.csv'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 400
@@ -0,0 +1,168 @@
+"""
+Pruebas de la exportación de tablas en Parquet, XLSX y CSV
+"""
+import io
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import app as app_module
+import export
+from analysis import read_typed_file
+from dataset_cache import DatasetCache
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    monkeypatch.setattr(app_module, 'dataset_cache', DatasetCache(str(tmp_path / 'cache'), budget_bytes=10 ** 8))
+    # Lotes pequeños para que la tabla de operaciones se escriba en varios
+    monkeypatch.setattr(export, 'EXPORT_BATCH_ROWS', 70)
+    # buffered=True en las exportaciones: el stream se lee entero y se cierra, liberando
+    # el hueco de admisión como haría el servidor
+    return app_module.app.test_client()
+
+
+def _upload(client, kind, rows, name):
+    response = client.post('/upload', data={'file': (io.BytesIO(generate_csv_bytes(kind, rows)), name)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _sheet_rows(archive, index):
+    root = ET.fromstring(archive.read(f'xl/worksheets/sheet{index}.xml'))
+    return [[''.join(cell.itertext()) for cell in row] for row in root.iter(f'{{{NS["s"]}}}row')]
+
+
+def test_trades_are_sorted_with_cumulative_profit_in_batches(tmp_path):
+    df = read_typed_file_from_bytes(tmp_path, generate_csv_bytes('trading', 250))
+    batches = list(export.trades_batches(df, size=100))
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+
+    trades = pd.concat(batches, ignore_index=True)
+    assert trades['Hora de cierre'].is_monotonic_increasing
+    assert trades['Utilidad acumulada'].iloc[-1] == pytest.approx(df['Utilidad'].sum())
+    assert trades['Utilidad acumulada'].tolist() == pytest.approx(trades['Utilidad'].cumsum().tolist())
+
+
+def read_typed_file_from_bytes(tmp_path, content):
+    path = tmp_path / 'cuenta.csv'
+    path.write_bytes(content)
+    return read_typed_file(str(path))
+
+
+def test_parquet_schema_comes_from_the_whole_table(monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_BATCH_ROWS', 50)
+    df = read_typed_file(generate_csv_bytes('trading', 200)).sort_values('Hora de cierre')
+    # Columna de texto (object, como en pandas 2) vacía en todo el primer lote
+    df['Razón'] = df['Razón'].astype(object)
+    df.loc[df.index[:100], 'Razón'] = None
+
+    tables = export.analysis_tables({'file_type': 'trading'}, lambda: df, ['trades'])
+    table = pq.read_table(io.BytesIO(b''.join(export.stream_parquet(tables['trades']))))
+    assert str(table.schema.field('Razón').type) == 'string'
+    assert table.num_rows == 200 and table.column('Razón').null_count == 100
+
+    # Sin filas: un Parquet vacío con las columnas de la tabla
+    empty = export.analysis_tables({'file_type': 'trading'}, lambda: df.iloc[:0], ['trades'])
+    table = pq.read_table(io.BytesIO(b''.join(export.stream_parquet(empty['trades']))))
+    assert table.num_rows == 0 and 'Utilidad acumulada' in table.column_names
+
+
+def test_export_parquet_and_csv(client):
+    data = _upload(client, 'trading', 300, 'cuenta.csv')
+    analysis_id = data['analysis_id']
+
+    # Una sola tabla: el archivo directamente, con varios row groups
+    response = client.get(f'/export/{analysis_id}?format=parquet&tables=trades', buffered=True)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.apache.parquet'
+    parquet = pq.ParquetFile(io.BytesIO(response.data))
+    assert parquet.metadata.num_rows == 300 and parquet.num_row_groups == 5
+    trades = parquet.read().to_pandas()
+    assert trades['Utilidad acumulada'].iloc[-1] == pytest.approx(data['summary']['total_profit'], abs=0.01)
+
+    # Varias tablas: un ZIP con un archivo por tabla
+    response = client.get(f'/export/{analysis_id}?format=csv', buffered=True)
+    assert response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert sorted(archive.namelist()) == sorted(f'{name}.csv' for name in export.TABLES['trading'])
+    monthly = pd.read_csv(archive.open('monthly_stats.csv'))
+    assert monthly.to_dict('records') == pd.DataFrame(data['monthly_stats']).to_dict('records')
+    # Cabecera una sola vez aunque se escriba por lotes
+    assert len(pd.read_csv(archive.open('trades.csv'))) == 300
+
+
+def test_export_xlsx_has_one_sheet_per_table(client):
+    data = _upload(client, 'finance', 200, 'finanzas.csv')
+
+    response = client.get(f'/export/{data["analysis_id"]}?format=xlsx', buffered=True)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    sheets = [sheet.get('name') for sheet in workbook.iter(f'{{{NS["s"]}}}sheet')]
+    assert sheets == list(export.TABLES['finance'])
+
+    summary = _sheet_rows(archive, 1)
+    assert summary[0] == list(data['summary'])
+    transactions = _sheet_rows(archive, 3)
+    assert len(transactions) == 201
+    assert transactions[1][0] <= transactions[-1][0]
+
+
+def test_export_xlsx_splits_long_tables(monkeypatch):
+    monkeypatch.setattr(export, 'XLSX_MAX_ROWS', 4)
+    frames = [pd.DataFrame({'a': range(3), 'b': ['x', None, '<&>']}), pd.DataFrame({'a': range(3), 'b': 'y'})]
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(export.stream_xlsx({'trades': frames, 'vacía': []}))))
+    assert [len(_sheet_rows(archive, index)) for index in (1, 2, 3)] == [5, 3, 1]
+    assert _sheet_rows(archive, 1)[3] == ['2', '<&>']
+    assert b'trades_2' in archive.read('xl/workbook.xml')
+
+
+def test_export_all_accounts(client):
+    _upload(client, 'trading', 120, 'cuenta_a.csv')
+    _upload(client, 'finance', 80, 'cuenta_b.csv')
+
+    response = client.get('/export/all?format=parquet', buffered=True)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    folders = {name.split('/')[0] for name in archive.namelist()}
+    assert len(folders) == 2
+    names = {name.split('/')[1] for name in archive.namelist()}
+    assert {'trades.parquet', 'transactions.parquet'} <= names
+
+
+def test_export_errors(client):
+    data = _upload(client, 'trading', 50, 'cuenta.csv')
+    assert client.get(f'/export/{data["analysis_id"]}?format=pdf').status_code == 400
+    assert client.get(f'/export/{data["analysis_id"]}?tables=transactions').status_code == 400
+    assert client.get('/export/not-an-id').status_code == 400
+    assert client.get(f'/export/{"0" * 64}').status_code == 404
+
+
+def test_export_holds_admission_slot_until_stream_closes(client, monkeypatch):
+    data = _upload(client, 'trading', 300, 'cuenta.csv')
+    gate = app_module.admission_gate
+    monkeypatch.setattr(gate, '_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(gate, 'max_queue', 0)
+
+    # El ZIP se escribe mientras se envía: el hueco sigue ocupado hasta cerrarlo
+    streaming = client.get(f'/export/{data["analysis_id"]}?format=csv')
+    assert streaming.status_code == 200
+    assert client.get('/export/all?format=csv').status_code == 429
+    assert client.get('/files').status_code == 200
+
+    archive = zipfile.ZipFile(io.BytesIO(streaming.get_data()))
+    assert len(pd.read_csv(archive.open('trades.csv'))) == 300
+    streaming.close()
+    with client.get('/export/all?format=csv') as response:
+        assert response.status_code == 200
@@ -0,0 +1,102 @@
+"""
+Pruebas de la herramienta de prueba de carga
+"""
+import http.client
+import io
+import threading
+
+import pandas as pd
+import pytest
+from werkzeug.serving import make_server
+
+import app as app_module
+import loadtest
+from dataset_cache import DatasetCache
+from storage import UploadStore
+
+
+def test_parse_mix_and_schedule():
+    mix = loadtest.parse_mix('upload=3,files=1')
+    assert mix == {'upload': 3.0, 'files': 1.0}
+    with pytest.raises(ValueError):
+        loadtest.parse_mix('upload=1,delete=2')
+
+    schedule = loadtest.arrival_schedule(50, 20, mix, seed=1)
+    assert schedule == loadtest.arrival_schedule(50, 20, mix, seed=1)
+    assert 900 < len(schedule) < 1100
+    assert all(0 <= offset < 20 for offset, _ in schedule)
+    uploads = sum(1 for _, endpoint in schedule if endpoint == 'upload')
+    assert 0.7 < uploads / len(schedule) < 0.8
+
+
+def test_summarize_rates_and_percentiles():
+    samples = [{'status': 200, 'latency': i / 1000, 'timeout': False} for i in range(1, 97)]
+    samples += [{'status': 429, 'latency': 0.001, 'timeout': False},
+                {'status': 500, 'latency': 0.001, 'timeout': False},
+                {'status': None, 'latency': 0.001, 'timeout': False},
+                {'status': None, 'latency': 60, 'timeout': True}]
+    summary = loadtest.summarize(samples, elapsed=10)
+    assert (summary['ok'], summary['rejected'], summary['errors'], summary['timeouts']) == (96, 1, 2, 1)
+    assert summary['timeout_rate'] == 0.01 and summary['throughput'] == 9.6
+    assert summary['max_ms'] == 96.0 and 45 < summary['p50_ms'] < 50
+
+
+def test_unique_payloads_are_valid_and_distinct():
+    payloads = loadtest.Payloads([200])
+    first, second = payloads.unique(200), payloads.unique(200)
+    assert first != second and len(first) == len(payloads.files[200])
+    df = pd.read_csv(io.BytesIO(first))
+    assert len(df) == 200 and df['ID'].iloc[0].startswith('L')
+
+
+def test_broken_responses_are_error_samples():
+    class BrokenClient:
+        def __init__(self, failure=None, body=b''):
+            self.failure = failure
+            self.body = body
+
+        def request(self, method, path, body=None, headers=None):
+            if self.failure:
+                raise self.failure
+            return 200, self.body
+
+    test = loadtest.LoadTest(BrokenClient(http.client.IncompleteRead(b'ab', 10)), loadtest.Payloads([100]))
+    assert test.call('files', 0)['error']
+    test.client = BrokenClient(http.client.BadStatusLine('x'))
+    assert test.call('upload', 0)['error']
+    test.client = BrokenClient(body=b'<html>')
+    assert test.call('files', 0)['error']
+
+    # Sin análisis ni archivos todavía: error de la muestra, no TypeError en quote(None)
+    test.client = BrokenClient(body=b'%PDF')
+    for endpoint in ('pdf', 'download'):
+        sample = test.call(endpoint, 0)
+        assert sample['status'] is None and sample['error']
+
+    report = loadtest.build_report([test.call('files', 0)], 1.0, [], {'started': 'x', 'rate': 1})
+    assert report['endpoints']['all']['errors'] == 1
+
+
+def test_load_test_against_local_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    monkeypatch.setattr(app_module, 'dataset_cache', DatasetCache(str(tmp_path / 'cache'), budget_bytes=10 ** 8))
+    monkeypatch.setattr(app_module, 'create_analysis_pdf',
+                        lambda data, path: open(path, 'wb').write(b'%PDF-1.4\n'))
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = loadtest.HttpClient(f'http://127.0.0.1:{server.server_port}', timeout=30)
+        test = loadtest.LoadTest(client, loadtest.Payloads([100, 300]), repeat=0.5)
+        test.warm_up()
+        schedule = loadtest.arrival_schedule(20, 1.5, loadtest.parse_mix(loadtest.DEFAULT_MIX))
+        samples, elapsed = test.run(schedule, concurrency=8)
+    finally:
+        server.shutdown()
+
+    report = loadtest.build_report(samples, elapsed, [], {'started': 'x', 'rate': 20})
+    assert report['endpoints']['all']['requests'] == len(schedule)
+    assert report['endpoints']['all']['ok'] == len(schedule)
+    assert {'upload', 'files'} <= set(report['endpoints'])
+    # Se suben archivos nuevos (más los repetidos) además de los del calentamiento
+    assert len(app_module.upload_store.list()) > 2
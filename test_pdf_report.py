@@ -0,0 +1,72 @@
+"""
+Pruebas de la generación del PDF con gráficos vectoriales
+"""
+import json
+
+import numpy as np
+from reportlab.graphics.shapes import Drawing
+
+import analysis
+import pdf_report
+import synthetic_data
+
+
+def _analysis_json(kind, rows, tmp_path):
+    path = str(tmp_path / f'{kind}.csv')
+    synthetic_data.write_csv(kind, path, rows)
+    return json.loads(json.dumps(analysis.analyze_file(path), default=analysis.json_default))
+
+
+def test_every_chart_type_renders_as_drawing(tmp_path):
+    data = _analysis_json('trading', 3000, tmp_path)
+    charts = data['charts']
+    assert isinstance(pdf_report.create_chart_drawing(charts['instrument'], 'instrument'), Drawing)
+    assert isinstance(pdf_report.create_chart_drawing(charts['evolution'], 'evolution'), Drawing)
+
+    monthly = {'data': [{'x': ['2024-01', '2024-02'], 'y': [100.0, 250.5], 'type': 'bar'}]}
+    pie = {'data': [{'labels': ['Depósito', 'Retiro'], 'values': [800.0, 200.0], 'type': 'pie'}]}
+    assert isinstance(pdf_report.create_chart_drawing(monthly, 'monthly'), Drawing)
+    assert isinstance(pdf_report.create_chart_drawing(pie, 'type_distribution'), Drawing)
+    assert pdf_report.create_chart_drawing(monthly, 'unknown') is None
+
+
+def test_decimate_keeps_extremes_and_endpoints():
+    x = np.arange(10000, dtype=float)
+    y = x % 97
+    y[5000] = -50.0
+    dx, dy = pdf_report._decimate(x, y, 200)
+    assert len(dy) <= 202
+    assert dx[0] == 0 and dx[-1] == 9999
+    assert dy.min() == -50.0 and dy.max() == 96.0
+
+
+def test_pdf_has_no_raster_images(tmp_path):
+    data = _analysis_json('trading', 20000, tmp_path)
+    output = tmp_path / 'analysis.pdf'
+    pdf_report.create_analysis_pdf(data, str(output))
+
+    content = output.read_bytes()
+    assert content.startswith(b'%PDF')
+    assert b'/Subtype /Image' not in content
+    assert len(content) < 200 * 1024
+
+
+def test_finance_pdf_draws_monthly_bars_and_type_pie(tmp_path, monkeypatch):
+    data = _analysis_json('finance', 500, tmp_path)
+    assert [chart['data'][0]['type'] for chart in data['charts'].values()] == ['bar', 'scatter', 'pie']
+
+    drawn = []
+    create_chart_drawing = pdf_report.create_chart_drawing
+
+    def recording(chart_data, chart_type):
+        drawing = create_chart_drawing(chart_data, chart_type)
+        drawn.append((chart_type, type(drawing)))
+        return drawing
+
+    monkeypatch.setattr(pdf_report, 'create_chart_drawing', recording)
+    output = tmp_path / 'finance.pdf'
+    pdf_report.create_analysis_pdf(data, str(output))
+
+    assert drawn == [('monthly', Drawing), ('evolution', Drawing), ('type_distribution', Drawing)]
+    content = output.read_bytes()
+    assert content.startswith(b'%PDF') and b'/Subtype /Image' not in content
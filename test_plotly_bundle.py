@@ -0,0 +1,89 @@
+"""
+Pruebas del bundle de Plotly.js servido por la aplicación y del cambio a trazas WebGL
+"""
+import gzip
+import io
+import os
+
+import pytest
+
+import analysis
+import app as app_module
+import plotly_bundle
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+
+def test_build_bundle_from_pinned_package(tmp_path):
+    directory = str(tmp_path / 'vendor')
+    os.makedirs(directory)
+    (tmp_path / 'vendor' / 'plotly-0.0.1-old.min.js').write_bytes(b'old')
+    with pytest.raises(RuntimeError):
+        plotly_bundle.load_bundle(directory)
+
+    manifest = plotly_bundle.build_bundle(directory)
+    source, version = plotly_bundle.package_bundle()
+    assert manifest['plotly_package'] == version
+    assert manifest['file'] == f"plotly-{manifest['version']}-{manifest['sha256'][:12]}.min.js"
+    with gzip.open(os.path.join(directory, manifest['file'] + '.gz')) as f, open(source, 'rb') as original:
+        assert f.read() == original.read()
+    assert sorted(os.listdir(directory)) == [manifest['file'], manifest['file'] + '.gz', 'plotly.json']
+    assert plotly_bundle.load_bundle(directory)['directory'] == directory
+
+    # La aplicación no lo regenera: si falta un archivo, error en lugar de escribir en el árbol
+    os.remove(os.path.join(directory, manifest['file'] + '.gz'))
+    with pytest.raises(RuntimeError):
+        plotly_bundle.load_bundle(directory)
+
+
+def test_serves_pinned_precompressed_bundle():
+    client = app_module.app.test_client()
+    page = client.get('/').get_data(as_text=True)
+    src = f"/assets/{app_module.plotly_bundle['file']}"
+    assert f'<script src="{src}">' in page and 'cdn.plot.ly' not in page
+
+    response = client.get(src, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert len(response.data) == app_module.plotly_bundle['gzip_bytes']
+    assert gzip.decompress(response.data).startswith(b'/**')
+
+    plain = client.get(src)
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.data) == app_module.plotly_bundle['bytes']
+
+    cached = client.get(src, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert client.get('/assets/plotly-latest.min.js').status_code == 404
+
+
+def test_evolution_switches_to_webgl_above_threshold(monkeypatch):
+    assert analysis.line_trace_type(analysis.SCATTERGL_THRESHOLD) == 'scatter'
+    assert analysis.line_trace_type(analysis.SCATTERGL_THRESHOLD + 1) == 'scattergl'
+
+    df = analysis.read_typed_file(generate_csv_bytes('trading', 300))
+    assert analysis.process_trading_data(df.copy())['charts']['evolution']['data'][0]['type'] == 'scatter'
+
+    monkeypatch.setattr(analysis, 'SCATTERGL_THRESHOLD', 100)
+    assert analysis.process_trading_data(df.copy())['charts']['evolution']['data'][0]['type'] == 'scattergl'
+    finance = analysis.read_typed_file(generate_csv_bytes('finance', 300))
+    assert analysis.process_finance_data(finance)['charts']['evolution']['data'][0]['type'] == 'scattergl'
+
+
+def test_stored_analyses_follow_the_threshold(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    client = app_module.app.test_client()
+    content = generate_csv_bytes('trading', 300)
+
+    def evolution_type():
+        response = client.post('/upload', data={'file': (io.BytesIO(content), 'cuenta.csv')},
+                               content_type='multipart/form-data')
+        return response.get_json()['charts']['evolution']['data'][0]['type']
+
+    assert evolution_type() == 'scatter'
+    # El análisis guardado con otro umbral no se reutiliza
+    monkeypatch.setattr(analysis, 'SCATTERGL_THRESHOLD', 100)
+    assert evolution_type() == 'scattergl'
+    assert len(os.listdir(app_module.upload_store.results_dir)) == 2
@@ -0,0 +1,76 @@
+"""
+Pruebas de la correlación del P&L diario entre cuentas
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as app_module
+from dataset_cache import DatasetCache
+from portfolio import build_correlation, daily_matrix, daily_pnl
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+
+def _trades(closes, profits):
+    closes = pd.to_datetime(closes)
+    return pd.DataFrame({'Horario de apertura': closes - pd.Timedelta(minutes=5), 'Hora de cierre': closes,
+                         'Utilidad': profits})
+
+
+def test_daily_pnl_on_shared_calendar():
+    a = _trades(['2024-01-01 10:00', '2024-01-01 15:00', '2024-01-02 09:00', '2024-01-04 12:00'], [10, 5, -3, 8])
+    b = _trades(['2024-01-02 11:00', '2024-01-04 11:00', None], [2, -4, 100])
+    matrix, calendar = daily_matrix([daily_pnl(a), daily_pnl(b)])
+
+    # El 3 de enero no operó nadie: fuera del calendario
+    assert calendar.astype('datetime64[D]').astype(str).tolist() == ['2024-01-01', '2024-01-02', '2024-01-04']
+    assert matrix.tolist() == [[15, -3, 8], [0, 2, -4]]
+
+    result = build_correlation(['a', 'b'], [a, b])
+    assert np.array(result['correlation']) == pytest.approx(np.round(np.corrcoef(matrix), 4))
+    assert np.array(result['covariance']) == pytest.approx(np.round(np.cov(matrix), 2))
+    assert result['summary']['days'] == 3
+    assert result['summary']['per_account'][1]['trades'] == 2
+
+
+def test_constant_account_has_undefined_correlation():
+    a = _trades(['2024-01-01', '2024-01-02', '2024-01-03'], [1, 2, 3])
+    b = _trades(['2024-01-01', '2024-01-02', '2024-01-03'], [2, 4, 6])
+    flat = _trades(['2024-01-01', '2024-01-02', '2024-01-03'], [5, 5, 5])
+    result = build_correlation(['a', 'b', 'flat'], [a, b, flat])
+    assert result['correlation'][0][1] == 1.0
+    assert result['correlation'][2] == [None, None, None]
+    assert result['summary']['average_correlation'] == 1.0
+
+
+def test_portfolio_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    monkeypatch.setattr(app_module, 'dataset_cache', DatasetCache(str(tmp_path / 'cache'), budget_bytes=10 ** 8))
+    client = app_module.app.test_client()
+
+    ids = []
+    for name, kind, seed in [('proveedor_a.csv', 'trading', 1), ('proveedor_b.csv', 'trading', 2),
+                             ('proveedor_c.csv', 'trading', 3), ('finanzas.csv', 'finance', 4)]:
+        content = generate_csv_bytes(kind, 200, seed=seed)
+        response = client.post('/upload', data={'file': (io.BytesIO(content), name)},
+                               content_type='multipart/form-data')
+        ids.append(response.get_json()['analysis_id'])
+
+    # Sin cuerpo: todas las cuentas de trading guardadas
+    response = client.post('/portfolio/correlation')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['accounts']) == 3 and all('proveedor' in name for name in data['accounts'])
+    assert len(data['correlation']) == 3 and data['correlation'][0][0] == 1.0
+    assert data['charts']['correlation']['data'][0]['type'] == 'heatmap'
+
+    response = client.post('/portfolio/correlation', json={'analysis_ids': ids[:2]})
+    assert response.get_json()['summary']['accounts'] == 2
+
+    assert client.post('/portfolio/correlation', json={'analysis_ids': ids[:1]}).status_code == 400
+    assert client.post('/portfolio/correlation', json={'analysis_ids': [ids[0], ids[3]]}).status_code == 400
+    assert client.post('/portfolio/correlation', json={'analysis_ids': ['x']}).status_code == 400
+    assert client.post('/portfolio/correlation', json={'analysis_ids': [ids[0], '0' * 64]}).status_code == 404
@@ -0,0 +1,88 @@
+"""
+Pruebas del perfilado opcional por petición
+"""
+import io
+import time
+
+import app as app_module
+import profiling
+from profiling import Profile, ProfileStore
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+
+def _busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def test_profile_samples_stacks_and_sanitizes_stages():
+    profile = Profile('/upload', interval=0.001).start()
+    _busy_loop(0.1)
+    profile('parsed', rows=10, columns=3, file_type='trading')
+    profile('error', message='bad value "EURUSD" in row 2')
+    profile.stop()
+
+    assert profile.metadata()['samples'] > 0
+    assert '_busy_loop (test_profiling.py:' in profile.collapsed()
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in profile.collapsed().splitlines())
+    assert profile.input == {'rows': 10, 'columns': 3, 'file_type': 'trading'}
+    assert 'message' not in profile.stages[1]
+
+
+def test_store_prunes_oldest(tmp_path):
+    store = ProfileStore(str(tmp_path))
+    ids = []
+    for _ in range(3):
+        profile = Profile('/upload').start()
+        profile.stop()
+        ids.append(store.save(profile))
+    store.prune(max_files=2)
+    assert sorted(p['id'] for p in store.list()) == sorted(ids)[1:]
+    assert store.path('../etc/passwd', '.json') is None
+
+
+def _setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    store = ProfileStore(str(tmp_path / 'profiles'))
+    monkeypatch.setattr(app_module, 'profile_store', store)
+    monkeypatch.setattr(app_module.request_profiler, 'store', store)
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 'secret')
+    return app_module.app.test_client()
+
+
+def _upload(client, headers=None):
+    return client.post('/upload', headers=headers or {}, content_type='multipart/form-data', data={
+        'file': (io.BytesIO(generate_csv_bytes('trading', 400)), 'cuenta.csv')})
+
+
+def test_upload_profiled_with_token_and_downloadable(tmp_path, monkeypatch):
+    client = _setup(tmp_path, monkeypatch)
+    response = _upload(client, {'X-Profile-Token': 'secret'})
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+
+    assert 'X-Profile-Id' not in _upload(client).headers
+    assert 'X-Profile-Id' not in _upload(client, {'X-Profile-Token': 'wrong'}).headers
+
+    assert client.get('/profiles').status_code == 403
+    auth = {'X-Profile-Token': 'secret'}
+    profiles = client.get('/profiles', headers=auth).get_json()['profiles']
+    assert [p['id'] for p in profiles] == [profile_id]
+    assert profiles[0]['route'] == '/upload'
+    assert profiles[0]['input'] == {'bytes': profiles[0]['input']['bytes'], 'rows': 400, 'columns': 11,
+                                    'file_type': 'trading'}
+
+    metadata = client.get(f'/profiles/{profile_id}', headers=auth).get_json()
+    assert [s['stage'] for s in metadata['stages']] == ['received', 'parsed', 'dates', 'aggregations', 'charts',
+                                                        'done']
+    collapsed = client.get(f'/profiles/{profile_id}?format=collapsed', headers=auth)
+    assert collapsed.status_code == 200
+    assert client.get('/profiles/missing', headers=auth).status_code == 404
+
+
+def test_sample_rate_profiles_without_header(tmp_path, monkeypatch):
+    client = _setup(tmp_path, monkeypatch)
+    monkeypatch.setattr(app_module.request_profiler, 'sample_rate', 1.0)
+    assert 'X-Profile-Id' in _upload(client).headers
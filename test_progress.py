@@ -0,0 +1,118 @@
+"""
+Pruebas del progreso de análisis publicado como Server-Sent Events
+"""
+import io
+import json
+import os
+import threading
+import time
+
+import app as app_module
+import progress
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+
+def _events(chunks):
+    return [json.loads(line[len('data: '):]) for chunk in chunks for line in chunk.splitlines()
+            if line.startswith('data: ')]
+
+
+def test_stream_until_final_stage(tmp_path):
+    reporter = progress.ProgressReporter('job1', directory=str(tmp_path))
+    reporter('received', bytes=10)
+    reporter('parsed', rows=3)
+    reporter('done')
+    reporter('ignored')
+
+    chunks = list(progress.stream_events('job1', directory=str(tmp_path), timeout=1, poll_interval=0.01))
+    assert [e['stage'] for e in _events(chunks)] == ['received', 'parsed', 'done']
+
+    # Al reconectar con Last-Event-ID solo llega lo que faltaba
+    chunks = list(progress.stream_events('job1', last_event_id=2, directory=str(tmp_path), timeout=1,
+                                         poll_interval=0.01))
+    assert [e['stage'] for e in _events(chunks)] == ['done']
+    assert any(chunk.startswith('id: 3') for chunk in chunks)
+
+
+def test_stream_times_out_without_events(tmp_path):
+    progress.ProgressReporter('stale', directory=str(tmp_path))('received', bytes=10)
+    # Último evento hace 10 minutos: el trabajo se da por perdido aunque se reconecte
+    past = time.time() - 600
+    os.utime(progress.job_path('stale', str(tmp_path)), (past, past))
+    chunks = list(progress.stream_events('stale', directory=str(tmp_path), timeout=300, poll_interval=0.01))
+    assert [e['stage'] for e in _events(chunks)] == ['received', 'timeout']
+
+
+def test_stream_window_releases_connection(tmp_path):
+    reporter = progress.ProgressReporter('job3', directory=str(tmp_path))
+    reporter('received', bytes=10)
+
+    # Trabajo en curso: la conexión se cierra sin etapa final y el navegador reconecta
+    chunks = list(progress.stream_events('job3', directory=str(tmp_path), timeout=60, window=0.05,
+                                         poll_interval=0.01))
+    assert [e['stage'] for e in _events(chunks)] == ['received']
+
+    reporter('done')
+    chunks = list(progress.stream_events('job3', last_event_id=1, directory=str(tmp_path), timeout=60,
+                                         window=0.05, poll_interval=0.01))
+    assert [e['stage'] for e in _events(chunks)] == ['done']
+
+
+def test_job_that_never_starts_times_out_early(tmp_path):
+    chunks = list(progress.stream_events('never', directory=str(tmp_path), timeout=60, start_timeout=0.05,
+                                         window=60, poll_interval=0.01))
+    assert [e['stage'] for e in _events(chunks)] == ['timeout']
+
+
+def test_partial_lines_are_not_read(tmp_path):
+    path = progress.job_path('job2', str(tmp_path))
+    with open(path, 'w') as f:
+        f.write('{"stage": "received"}\n{"stage": "par')
+    events, offset = progress.read_events('job2', directory=str(tmp_path))
+    assert [e['stage'] for e in events] == ['received']
+    assert offset == len('{"stage": "received"}\n')
+
+
+def test_reporter_without_job_id_is_noop(tmp_path):
+    for job_id in (None, '', '../etc/passwd'):
+        progress.ProgressReporter(job_id, directory=str(tmp_path))('parsed', rows=1)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_reports_every_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    monkeypatch.setattr(progress, 'PROGRESS_DIR', str(tmp_path))
+    client = app_module.app.test_client()
+
+    response = client.post('/upload', data={
+        'job_id': 'abc-123',
+        'file': (io.BytesIO(generate_csv_bytes('trading', 500)), 'cuenta.csv'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+
+    with client.get('/progress/abc-123') as response:
+        assert response.mimetype == 'text/event-stream'
+        events = _events([response.get_data(as_text=True)])
+    assert [e['stage'] for e in events] == ['received', 'parsed', 'dates', 'aggregations', 'charts', 'done']
+    assert events[1]['rows'] == 500
+
+    assert client.get('/progress/bad.id').status_code == 400
+
+
+def test_concurrent_streams_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(progress, 'PROGRESS_DIR', str(tmp_path))
+    monkeypatch.setattr(app_module, 'progress_slots', threading.BoundedSemaphore(1))
+    progress.ProgressReporter('busy')('done')
+    client = app_module.app.test_client()
+
+    open_stream = client.get('/progress/busy')
+    # Sin hueco libre: respuesta inmediata que solo pide reconectar más tarde
+    rejected = client.get('/progress/busy')
+    assert rejected.get_data(as_text=True) == f'retry: {progress.PROGRESS_BUSY_RETRY_MS}\n\n'
+
+    # Al cerrar el stream se libera el hueco
+    assert _events([open_stream.get_data(as_text=True)])[0]['stage'] == 'done'
+    open_stream.close()
+    with client.get('/progress/busy') as response:
+        assert _events([response.get_data(as_text=True)])[0]['stage'] == 'done'
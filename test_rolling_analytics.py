@@ -0,0 +1,55 @@
+"""
+Pruebas de las series móviles frente a un cálculo directo con pandas
+"""
+import numpy as np
+import pandas as pd
+
+import rolling_analytics
+
+
+def _random_trades(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Tiempos irregulares y desordenados, con empates
+    times = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 200 * 86400, size=n), unit='s')
+    times = times.floor('h')
+    pnl = np.round(rng.normal(0, 10, size=n), 2)
+    return pd.Series(times), pd.Series(pnl)
+
+
+def _naive(times, pnl, eval_time, days):
+    mask = (times > eval_time - pd.Timedelta(days=days)) & (times <= eval_time)
+    window = pnl[mask]
+    win_rate = (window > 0).sum() * 100.0 / len(window) if len(window) else None
+    return window.sum(), len(window), win_rate
+
+
+def test_matches_naive_per_trade():
+    times, pnl = _random_trades(300)
+    result = rolling_analytics.compute_rolling_series(times, pnl, windows=(7, 30), max_points=1000)
+
+    assert len(result['x']) == 300
+    for i in (0, 57, 150, 299):
+        eval_time = pd.Timestamp(result['x'][i])
+        for days in (7, 30):
+            expected_pnl, expected_trades, expected_rate = _naive(times, pnl, eval_time, days)
+            window = result['windows'][f'{days}d']
+            assert window['trades'][i] == expected_trades
+            assert abs(window['pnl'][i] - expected_pnl) < 1e-6
+            assert abs(window['win_rate'][i] - round(expected_rate, 2)) < 1e-6
+
+
+def test_point_budget_uses_regular_grid():
+    times, pnl = _random_trades(5000, seed=1)
+    result = rolling_analytics.compute_rolling_series(times, pnl, windows=(90,), max_points=120)
+
+    assert len(result['x']) == 120
+    assert result['windows']['90d']['trades'][-1] == _naive(times, pnl, pd.Timestamp(result['x'][-1]), 90)[1]
+
+
+def test_empty_windows_have_no_win_rate():
+    times = pd.Series(pd.to_datetime(['2024-01-01 00:00', '2024-01-02 00:00', '2024-03-01 00:00', '2024-03-01 12:00']))
+    result = rolling_analytics.compute_rolling_series(times, [5.0, 1.0, -3.0, -2.0], windows=(7,), max_points=3)
+
+    assert result['windows']['7d']['trades'] == [1, 0, 2]
+    assert result['windows']['7d']['win_rate'] == [100.0, None, 0.0]
+    assert rolling_analytics.compute_rolling_series([], [], windows=(7,)) == {'x': [], 'windows': {}}
@@ -0,0 +1,91 @@
+"""
+Pruebas del almacenamiento de archivos subidos direccionado por contenido
+"""
+import io
+import os
+
+import app as app_module
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+
+def _blobs(store):
+    return [os.path.join(root, name) for root, _, names in os.walk(store.blobs_dir) for name in names]
+
+
+def test_same_content_is_stored_once_and_compressed(tmp_path):
+    store = UploadStore(str(tmp_path), codec='gzip')
+    content = generate_csv_bytes('trading', 2000)
+
+    first = store.put(io.BytesIO(content), 'a.csv')
+    second = store.put(io.BytesIO(content), 'b.csv')
+
+    assert first['sha256'] == second['sha256']
+    assert len(_blobs(store)) == 1
+    assert first['size'] == len(content)
+    assert first['stored_size'] < len(content) / 2
+    assert b''.join(store.iter_content('b.csv')) == content
+    assert sorted(r['filename'] for r in store.list()) == ['a.csv', 'b.csv']
+
+
+def test_gc_removes_only_unreferenced_blobs(tmp_path):
+    store = UploadStore(str(tmp_path), codec='gzip')
+    shared = store.put(io.BytesIO(b'a,b\n1,2\n'), 'one.csv')
+    store.put(io.BytesIO(b'a,b\n1,2\n'), 'two.csv')
+    store.put(io.BytesIO(b'a,b\n3,4\n'), 'three.csv')
+    store.write_result(shared['sha256'], 'analysis', b'{}')
+
+    store.delete('one.csv')
+    assert store.gc(grace_seconds=0)['removed'] == []
+
+    store.delete('two.csv')
+    dry_run = store.gc(dry_run=True, grace_seconds=0)
+    assert len(dry_run['removed']) == 2
+    assert len(_blobs(store)) == 2
+
+    assert store.read_result(shared['sha256'], 'analysis') == b'{}'
+    # El blob y su análisis guardado se van juntos
+    assert len(store.gc(grace_seconds=0)['removed']) == 2
+    assert len(_blobs(store)) == 1
+    assert store.read_result(shared['sha256'], 'analysis') is None
+    assert store.path('three.csv') is not None
+
+    # Los blobs recientes se respetan durante el periodo de gracia
+    store.delete('three.csv')
+    assert store.gc()['removed'] == []
+
+
+def test_legacy_files_are_listed_and_migrated(tmp_path):
+    (tmp_path / 'old.csv').write_bytes(b'a,b\n1,2\n')
+    store = UploadStore(str(tmp_path), codec='gzip')
+    assert [r['filename'] for r in store.list()] == ['old.csv']
+    assert b''.join(store.iter_content('old.csv')) == b'a,b\n1,2\n'
+
+    assert store.migrate() == ['old.csv']
+    assert not (tmp_path / 'old.csv').exists()
+    assert store.get('old.csv')['size'] == 8
+    assert b''.join(store.iter_content('old.csv')) == b'a,b\n1,2\n'
+
+
+def test_upload_download_delete_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path), codec='gzip'))
+    client = app_module.app.test_client()
+    content = generate_csv_bytes('trading', 300, malformed_ratio=0.05)
+
+    for _ in range(3):
+        response = client.post('/upload', data={'file': (io.BytesIO(content), 'cuenta.csv')},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.get_json()['summary']['total_operations'] > 0
+
+    files = client.get('/files').get_json()['files']
+    assert files and all(f['size'] == len(content) for f in files)
+    assert len(_blobs(app_module.upload_store)) == 1
+
+    filename = files[0]['filename']
+    response = client.get(f'/download/{filename}')
+    assert response.status_code == 200
+    assert response.data == content
+
+    assert client.delete(f'/delete/{filename}').status_code == 200
+    assert client.get(f'/download/{filename}').status_code == 404
@@ -0,0 +1,184 @@
+"""
+Pruebas del barrido de retención de archivos subidos y temporales
+"""
+import importlib.util
+import io
+import os
+import sys
+import threading
+import time
+import types
+
+import app as app_module
+import sweeper
+from storage import UploadStore, TEMP_PREFIX
+
+DAY = 86400
+
+
+def _store_with_files(tmp_path, now):
+    store = UploadStore(str(tmp_path / 'uploads'), codec='gzip')
+    # Contenidos distintos de ~1000 bytes comprimidos cada uno
+    for i, age_days in enumerate([40, 10, 5, 1]):
+        content = os.urandom(1000)
+        name = f'file{i}.csv'
+        store.put(io.BytesIO(content), name)
+        accessed = now - age_days * DAY
+        os.utime(store._record_path(name), (accessed, accessed))
+        blob = store.find_blob(store.get(name)['sha256'])
+        os.utime(blob, (accessed, accessed))
+    return store
+
+
+def test_select_evictions_age_then_lru():
+    items = [{'id': i, 'size': 100, 'accessed': t} for i, t in enumerate([10, 50, 30, 90])]
+    evicted = sweeper.select_evictions(items, now=100, max_age_seconds=80, budget_bytes=150)
+    assert [(item['id'], item['reason']) for item in evicted] == [(0, 'age'), (2, 'size'), (1, 'size')]
+
+
+def test_sweep_enforces_age_and_size_budgets(tmp_path):
+    now = time.time()
+    store = _store_with_files(tmp_path, now)
+    stored = {r['filename']: r['stored_size'] for r in store.list()}
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+
+    # Presupuesto para los dos archivos más recientes
+    budget = stored['file2.csv'] + stored['file3.csv']
+    result = sweeper.sweep(store, temp_dir=str(temp_dir), now=now, upload_max_age=30 * DAY,
+                           upload_budget=budget, temp_max_age=0, temp_budget=0)
+
+    assert sorted(r['filename'] for r in store.list()) == ['file2.csv', 'file3.csv']
+    assert result['uploads']['removed_names'] == 2
+    assert result['uploads']['removed_blobs'] == 2
+    assert result['uploads']['reclaimed_bytes'] == stored['file0.csv'] + stored['file1.csv']
+
+
+def test_dry_run_keeps_everything(tmp_path):
+    now = time.time()
+    store = _store_with_files(tmp_path, now)
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    old_pdf = temp_dir / f'{TEMP_PREFIX}report.pdf'
+    old_pdf.write_bytes(b'x' * 500)
+    os.utime(old_pdf, (now - 2 * DAY, now - 2 * DAY))
+    (temp_dir / 'other.pdf').write_bytes(b'y' * 500)
+
+    result = sweeper.sweep(store, temp_dir=str(temp_dir), dry_run=True, now=now,
+                           upload_max_age=30 * DAY, upload_budget=0, temp_max_age=DAY, temp_budget=0)
+    assert result['uploads']['removed_names'] == 1
+    assert result['temp'] == {'removed_files': 1, 'reclaimed_bytes': 500}
+    assert len(store.list()) == 4
+    assert old_pdf.exists()
+
+    sweeper.sweep(store, temp_dir=str(temp_dir), now=now, upload_max_age=30 * DAY, upload_budget=0,
+                  temp_max_age=DAY, temp_budget=0)
+    assert not old_pdf.exists()
+    # Solo se tocan los artefactos propios de la aplicación
+    assert (temp_dir / 'other.pdf').exists()
+
+
+def test_default_budgets_never_delete_uploads(tmp_path):
+    now = time.time()
+    store = _store_with_files(tmp_path, now)
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    old_pdf = temp_dir / f'{TEMP_PREFIX}report.pdf'
+    old_pdf.write_bytes(b'x' * 500)
+    os.utime(old_pdf, (now - 2 * DAY, now - 2 * DAY))
+
+    result = sweeper.sweep(store, temp_dir=str(temp_dir), now=now)
+    assert result['uploads']['removed_names'] == 0 and len(store.list()) == 4
+    assert result['temp']['removed_files'] == 1 and not old_pdf.exists()
+
+
+def test_instance_without_lock_only_sweeps_local_temp(tmp_path):
+    now = time.time()
+    store = _store_with_files(tmp_path, now)
+    session = tmp_path / 'uploads' / '.partial' / 'abandonada'
+    session.mkdir(parents=True)
+    (session / 'meta.json').write_text('{}')
+    os.utime(session / 'meta.json', (now - 2 * DAY, now - 2 * DAY))
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    old_pdf = temp_dir / f'{TEMP_PREFIX}report.pdf'
+    old_pdf.write_bytes(b'x' * 500)
+    os.utime(old_pdf, (now - 2 * DAY, now - 2 * DAY))
+
+    # Otro contenedor tiene el lock del volumen: el almacén y .partial no se tocan
+    result = sweeper.sweep(store, temp_dir=str(temp_dir), now=now, upload_max_age=DAY, shared=False)
+    assert result['uploads'] == {'removed_names': 0, 'removed_blobs': 0, 'reclaimed_bytes': 0}
+    assert len(store.list()) == 4 and session.exists()
+    assert result['temp']['removed_files'] == 1 and not old_pdf.exists()
+
+
+def test_supervisor_restarts_a_dead_sweeper(monkeypatch, capsys):
+    stopping = threading.Event()
+    launched = []
+    popen = sweeper.subprocess.Popen
+
+    def counting_popen(command):
+        launched.append(command)
+        if len(launched) == 3:
+            stopping.set()
+        return popen(command)
+
+    monkeypatch.setattr(sweeper.subprocess, 'Popen', counting_popen)
+    sweeper.supervise([sys.executable, '-c', 'raise SystemExit(3)'], stopping, restart_delay=0.01)
+    errors = [line for line in capsys.readouterr().out.splitlines() if line.startswith('❌')]
+    assert len(launched) == 3
+    assert errors == ['❌ Sweeper terminó con código 3; se relanza en 0.01 s',
+                      '❌ Sweeper terminó con código 3; se relanza en 0.02 s']
+
+    # Detenido con SIGTERM: parada deliberada, no se relanza
+    launched.clear()
+    sweeper.supervise([sys.executable, '-c', 'import os, signal; os.kill(os.getpid(), signal.SIGTERM)'],
+                      threading.Event(), restart_delay=0.01)
+    assert len(launched) == 1
+    assert '❌' not in capsys.readouterr().out
+
+
+def test_gunicorn_kills_a_stuck_supervisor():
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', os.path.join(os.path.dirname(__file__),
+                                                                                  'gunicorn.conf.py'))
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+
+    class Process:
+        killed = False
+
+        def terminate(self):
+            pass
+
+        def wait(self, timeout=None):
+            raise conf.subprocess.TimeoutExpired('sweeper', timeout)
+
+        def kill(self):
+            self.killed = True
+
+    log = types.SimpleNamespace(warning=lambda message: None)
+    server = types.SimpleNamespace(log=log, sweeper_process=Process())
+    conf.on_exit(server)
+    assert server.sweeper_process.killed
+    conf.on_exit(types.SimpleNamespace(log=log))
+
+
+def test_single_leader_lock(tmp_path):
+    first = sweeper.acquire_leader_lock(str(tmp_path))
+    assert first is not None
+    assert sweeper.acquire_leader_lock(str(tmp_path)) is None
+    first.close()
+    assert sweeper.acquire_leader_lock(str(tmp_path)) is not None
+
+
+def test_metrics_endpoint_reports_reclaimed_bytes(tmp_path, monkeypatch):
+    result = {'dry_run': False, 'uploads': {'removed_names': 2, 'removed_blobs': 1, 'reclaimed_bytes': 1234},
+              'temp': {'removed_files': 3, 'reclaimed_bytes': 99}}
+    sweeper.record_stats(str(tmp_path), result, 0.5)
+    sweeper.record_stats(str(tmp_path), result, 0.5)
+    monkeypatch.setattr(app_module, 'UPLOAD_FOLDER', str(tmp_path))
+
+    body = app_module.app.test_client().get('/metrics').get_data(as_text=True)
+    assert 'ctd_sweeper_runs_total 2' in body
+    assert 'ctd_sweeper_reclaimed_bytes_total{area="uploads"} 2468' in body
+    assert 'ctd_sweeper_removed_files_total{area="temp"} 6' in body
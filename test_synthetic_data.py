@@ -0,0 +1,46 @@
+"""
+Pruebas del generador sintético y del parser de respaldo de CSV
+"""
+import pandas as pd
+
+import analysis
+import synthetic_data
+
+
+def test_generator_is_reproducible():
+    first = synthetic_data.generate_csv_bytes('trading', 500, seed=3)
+    second = synthetic_data.generate_csv_bytes('trading', 500, seed=3)
+    assert first == second
+    assert first != synthetic_data.generate_csv_bytes('trading', 500, seed=4)
+
+
+def test_chunked_writes_match_row_count(tmp_path):
+    path = str(tmp_path / 'trading.csv')
+    synthetic_data.write_csv('trading', path, 1234, chunk_size=100)
+    df = pd.read_csv(path)
+    assert list(df.columns) == synthetic_data.TRADING_COLUMNS
+    assert len(df) == 1234
+    assert df['Horario de apertura'].is_monotonic_increasing
+
+
+def test_malformed_trading_rows_keep_numeric_columns(tmp_path):
+    path = str(tmp_path / 'malformed.csv')
+    synthetic_data.write_csv('trading', path, 2000, malformed_ratio=0.05)
+
+    df = analysis.read_csv_file(path)
+    assert len(df) == 2000
+    assert pd.api.types.is_float_dtype(df['Utilidad'])
+    assert df['Razón'].str.contains(',').any()
+
+    result = analysis.process_trading_data(df)
+    assert result['summary']['total_operations'] == 2000
+
+
+def test_malformed_finance_rows_merge_into_details(tmp_path):
+    path = str(tmp_path / 'finance.csv')
+    synthetic_data.write_csv('finance', path, 1000, malformed_ratio=0.05)
+
+    df = analysis.read_csv_file(path)
+    assert list(df.columns) == synthetic_data.FINANCE_COLUMNS
+    assert (df['Pasarela de pago'] == 'Manual').any()
+    assert df['Detalles'].str.contains(',').any()
@@ -0,0 +1,89 @@
+"""
+Pruebas de la lista paginada de operaciones
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as app_module
+import trades
+from dataset_cache import DatasetCache
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    monkeypatch.setattr(app_module, 'dataset_cache', DatasetCache(str(tmp_path / 'cache'), budget_bytes=10 ** 8))
+    return app_module.app.test_client()
+
+
+def _upload(client, kind, rows):
+    response = client.post('/upload', data={'file': (io.BytesIO(generate_csv_bytes(kind, rows)), f'{kind}.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    return response.get_json()['analysis_id']
+
+
+def test_select_range_matches_full_sort_with_ties():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        keys = rng.integers(0, 5, rng.integers(1, 60)).astype(float)
+        expected = np.lexsort((np.arange(len(keys)), keys))
+        start = int(rng.integers(0, len(keys) + 3))
+        stop = start + int(rng.integers(1, 20))
+        assert trades.select_range(keys, start, stop).tolist() == expected[start:stop].tolist()
+
+
+def test_cursor_pages_cover_every_trade_once(client):
+    analysis_id = _upload(client, 'trading', 230)
+
+    seen = []
+    cursor = None
+    while True:
+        query = f'/trades/{analysis_id}?sort=swap&order=asc&limit=40' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(query).get_json()
+        assert page['offset'] == len(seen)
+        seen.extend(page['trades'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert page['total'] == 230 and len(seen) == 230
+    assert len({trade['row'] for trade in seen}) == 230
+    # Swap tiene muchos empates (0): el orden es el de una ordenación completa estable
+    assert sum(trade['Swap'] == 0 for trade in seen) > 40
+    assert seen == sorted(seen, key=lambda trade: (trade['Swap'], trade['row']))
+    rows = [trade['row'] for trade in seen]
+
+    # Un desplazamiento devuelve la misma página que el cursor
+    page = client.get(f'/trades/{analysis_id}?sort=swap&order=asc&limit=40&offset=80').get_json()
+    assert [trade['row'] for trade in page['trades']] == rows[80:120]
+
+
+def test_top_and_worst_trades(client):
+    analysis_id = _upload(client, 'trading', 300)
+    best = client.get(f'/trades/{analysis_id}?sort=profit&order=desc&limit=5').get_json()['trades']
+    worst = client.get(f'/trades/{analysis_id}?sort=profit&order=asc&limit=5').get_json()['trades']
+
+    df = trades.valid_trades(app_module.load_upload({'sha256': analysis_id}))
+    profits = df['Utilidad'].sort_values()
+    assert [trade['Utilidad'] for trade in best] == profits.iloc[::-1][:5].tolist()
+    assert [trade['Utilidad'] for trade in worst] == profits[:5].tolist()
+
+    latest = client.get(f'/trades/{analysis_id}?sort=time&order=desc&limit=1').get_json()['trades'][0]
+    assert pd.Timestamp(latest['Hora de cierre']) == df['Hora de cierre'].max().floor('s')
+
+
+def test_trades_errors(client):
+    analysis_id = _upload(client, 'trading', 50)
+    assert client.get(f'/trades/{analysis_id}?sort=Volumen').status_code == 400
+    assert client.get(f'/trades/{analysis_id}?limit=0').status_code == 400
+    assert client.get(f'/trades/{analysis_id}?cursor=abc').status_code == 400
+    cursor = client.get(f'/trades/{analysis_id}?limit=10').get_json()['next_cursor']
+    assert client.get(f'/trades/{analysis_id}?sort=profit&cursor={cursor}').status_code == 400
+    assert client.get(f'/trades/{"0" * 64}').status_code == 404
+    assert client.get(f'/trades/{_upload(client, "finance", 50)}').status_code == 400
@@ -0,0 +1,76 @@
+"""
+Pruebas de la ingesta automática desde la carpeta vigilada
+"""
+import io
+import os
+
+import pytest
+
+import app as app_module
+from dataset_cache import DatasetCache
+from storage import UploadStore
+from synthetic_data import generate_csv_bytes
+from watcher import Watcher
+
+
+def _write(path, data, mtime):
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+
+
+def test_waits_until_files_are_complete(tmp_path):
+    incoming = tmp_path / 'incoming'
+    incoming.mkdir()
+    ingested = []
+    watcher = Watcher(str(incoming), str(tmp_path), lambda path: ingested.append(path) or ({'filename': 'x'}, 200),
+                      stable_seconds=10)
+
+    _write(incoming / 'cuenta.csv', b'a,b\n1,', 1000)
+    _write(incoming / '.cuenta2.csv.tmp', b'a,b\n', 1000)
+    assert watcher.poll(now=1000) == []
+
+    # Sigue creciendo: todavía no
+    _write(incoming / 'cuenta.csv', b'a,b\n1,2\n', 1005)
+    assert watcher.poll(now=1006) == []
+    # Misma firma en dos sondeos pero modificado hace poco
+    assert watcher.poll(now=1008) == []
+    assert len(watcher.poll(now=1016)) == 1
+    assert [os.path.basename(p) for p in ingested] == ['cuenta.csv']
+
+    # Ya procesado (también tras reiniciar el watcher): no se repite hasta que cambie
+    watcher = Watcher(str(incoming), str(tmp_path), lambda path: ingested.append(path) or ({'filename': 'x'}, 200),
+                      stable_seconds=10)
+    assert watcher.poll(now=1100) == [] and watcher.poll(now=1200) == []
+    _write(incoming / 'cuenta.csv', b'a,b\n1,2\n3,4\n', 1300)
+    watcher.poll(now=1400)
+    assert len(watcher.poll(now=1405)) == 1
+    assert len(ingested) == 2
+
+
+def test_ingested_file_is_served_warm(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'upload_store', UploadStore(str(tmp_path / 'uploads'), codec='gzip'))
+    monkeypatch.setattr(app_module, 'dataset_cache', DatasetCache(str(tmp_path / 'cache'), budget_bytes=10 ** 8))
+    content = generate_csv_bytes('finance', 300)
+    export = tmp_path / 'cuenta_finanzas.csv'
+    export.write_bytes(content)
+
+    record, code = app_module.ingest_file(str(export))
+    assert code == 200
+    assert os.path.exists(app_module.upload_store.result_path(record['sha256'], 'pdf'))
+
+    # Subir el mismo archivo desde el dashboard no vuelve a leerlo ni a analizarlo
+    monkeypatch.setattr(app_module, 'load_upload', lambda record: pytest.fail('analysis should be warm'))
+    monkeypatch.setattr(app_module, 'create_analysis_pdf', lambda data, path: pytest.fail('PDF should be warm'))
+    client = app_module.app.test_client()
+    response = client.post('/upload', data={'file': (io.BytesIO(content), 'cuenta_finanzas.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['analysis_id'] == record['sha256']
+    assert data['file_type'] == 'finance'
+
+    response = client.post('/generate_pdf', json=data)
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+
+    assert client.post('/generate_pdf', json={'analysis_id': '../x'}).status_code == 400
@@ -0,0 +1,116 @@
+"""
+Lista paginada de las operaciones de un análisis de trading
+
+Las operaciones se ordenan por Utilidad, Swap u hora de cierre sin ordenar
+nunca la tabla completa: cada página elige sus filas con np.partition (O(n))
+y solo ordena las que devuelve. Así, la primera página ordenada por Utilidad
+descendente es el top-N y la ascendente el peor-N.
+
+Se pagina por cursor (la clave de la última fila devuelta, para recorrer la
+lista) o por desplazamiento (para saltar a cualquier punto, como hace el
+scroll virtual del dashboard); las dos cuestan lo mismo. Los empates se
+deshacen por la posición de la fila: el orden es total y estable entre páginas.
+"""
+import base64
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SORT_COLUMNS = {'profit': 'Utilidad', 'swap': 'Swap', 'time': 'Hora de cierre'}
+
+# Filas por página por defecto y máximo
+TRADES_PAGE_SIZE = int(os.environ.get('TRADES_PAGE_SIZE', 50))
+TRADES_MAX_PAGE_SIZE = int(os.environ.get('TRADES_MAX_PAGE_SIZE', 500))
+
+
+def valid_trades(df):
+    """Operaciones con fechas válidas (las mismas que entran en el análisis)"""
+    return df.dropna(subset=['Horario de apertura', 'Hora de cierre'])
+
+
+def sort_keys(df, sort, descending=False):
+    """Clave numérica por fila cuyo orden ascendente es el orden pedido (vacíos al final)"""
+    column = SORT_COLUMNS[sort]
+    if column not in df.columns:
+        raise ValueError(f'Column {column} not found in file')
+    if sort == 'time':
+        keys = df[column].to_numpy().astype('datetime64[ns]').view('int64')
+        return -keys if descending else keys
+    keys = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    if descending:
+        keys = -keys
+    return np.where(np.isnan(keys), np.inf, keys)
+
+
+def select_range(keys, start, stop):
+    """Índices de las filas en los puestos [start, stop) del orden (clave, índice), sin ordenar todo"""
+    stop = min(stop, len(keys))
+    if start >= stop:
+        return np.array([], dtype=np.intp)
+    bounds = np.partition(keys, [start, stop - 1])
+    low, high = bounds[start], bounds[stop - 1]
+    # Los empates en los extremos ya salen en orden de índice; solo se ordena el interior
+    ties_low = np.flatnonzero(keys == low)
+    if low == high:
+        ordered = ties_low
+    else:
+        inside = np.flatnonzero((keys > low) & (keys < high))
+        inside = inside[np.argsort(keys[inside], kind='stable')]
+        ordered = np.concatenate([ties_low, inside, np.flatnonzero(keys == high)])
+    below = np.count_nonzero(keys < low)
+    return ordered[start - below:stop - below]
+
+
+def encode_cursor(sort, descending, key, position):
+    payload = json.dumps([sort, descending, key.item(), int(position)])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, sort, descending):
+    """Clave y posición de la última fila de la página anterior"""
+    try:
+        cursor_sort, cursor_descending, key, position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if (cursor_sort, cursor_descending) != (sort, descending) or not isinstance(position, int) \
+            or not isinstance(key, (int, float)):
+        raise ValueError('Cursor does not match the requested order')
+    return key, position
+
+
+def trade_records(df, positions):
+    """Filas como diccionarios serializables (fechas ISO, vacíos como None)"""
+    page = df.take(positions).reset_index(drop=True)
+    for column in page.columns:
+        if pd.api.types.is_datetime64_any_dtype(page[column]):
+            page[column] = page[column].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    page = page.astype(object).where(page.notna(), None)
+    page.insert(0, 'row', positions.tolist())
+    return page.to_dict('records')
+
+
+def trades_page(df, sort='time', descending=False, limit=None, cursor=None, offset=0):
+    """Página de operaciones en el orden pedido, desde un cursor o un desplazamiento"""
+    limit = limit or TRADES_PAGE_SIZE
+    df = valid_trades(df)
+    keys = sort_keys(df, sort, descending)
+    if cursor:
+        key, position = decode_cursor(cursor, sort, descending)
+        # Solo las filas posteriores a la última devuelta
+        after = np.flatnonzero((keys > key) | ((keys == key) & (np.arange(len(keys)) > position)))
+        offset = len(keys) - len(after)
+        positions = after[select_range(keys[after], 0, limit)]
+    else:
+        positions = select_range(keys, offset, offset + limit)
+
+    more = offset + len(positions) < len(keys)
+    return {
+        'sort': sort,
+        'order': 'desc' if descending else 'asc',
+        'total': len(keys),
+        'offset': offset,
+        'trades': trade_records(df, positions),
+        'next_cursor': encode_cursor(sort, descending, keys[positions[-1]], positions[-1]) if more else None
+    }
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Ingesta automática de las exportaciones que los brokers dejan en una carpeta
+
+Vigila WATCH_DIR y, por cada CSV nuevo o modificado, hace lo mismo que una
+subida por /upload: lo guarda en el almacén, detecta si es de trading o de
+finanzas y deja calculados el análisis y el PDF (además del dataset en la
+caché compartida). Cuando alguien abre el dashboard y sube o analiza ese
+archivo, el resultado ya está listo.
+
+Un archivo solo se procesa cuando está completo: su tamaño y su fecha de
+modificación no cambian entre dos sondeos y lleva al menos
+WATCH_STABLE_SECONDS sin modificarse. Se ignoran los archivos ocultos (las
+copias a medio escribir de rsync y similares).
+
+Uso:
+    python watcher.py                 # vigilar cada WATCH_INTERVAL segundos
+    python watcher.py --once          # procesar los archivos presentes (cuando estén completos) y terminar
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from storage import write_json_atomic
+from sweeper import acquire_leader_lock
+
+# Carpeta donde los brokers dejan las exportaciones
+WATCH_DIR = os.environ.get('WATCH_DIR', 'incoming')
+
+# Segundos entre sondeos de la carpeta
+WATCH_INTERVAL = float(os.environ.get('WATCH_INTERVAL', 5))
+
+# Segundos sin modificaciones para dar un archivo por completo
+WATCH_STABLE_SECONDS = float(os.environ.get('WATCH_STABLE_SECONDS', 10))
+
+LOCK_NAME = '.watcher.lock'
+STATE_NAME = '.watcher.json'
+
+
+def scan(directory):
+    """CSV visibles de la carpeta con su firma (tamaño, fecha de modificación)"""
+    files = {}
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith('.') or not name.endswith('.csv') or not os.path.isfile(path):
+            continue
+        stats = os.stat(path)
+        files[name] = (stats.st_size, stats.st_mtime)
+    return files
+
+
+class Watcher:
+    """Detecta archivos completos en la carpeta y los ingiere una sola vez por versión"""
+
+    def __init__(self, directory, root, ingest, stable_seconds=None):
+        self.directory = directory
+        self.ingest = ingest
+        self.stable_seconds = WATCH_STABLE_SECONDS if stable_seconds is None else stable_seconds
+        self.state_path = os.path.join(root, STATE_NAME)
+        # Firma vista en el sondeo anterior de cada archivo aún no procesado
+        self.pending = {}
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                self.processed = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.processed = {}
+
+    def ready(self, now=None):
+        """Archivos completos y sin procesar (en esta versión)"""
+        now = time.time() if now is None else now
+        current = scan(self.directory)
+        ready = []
+        for name, signature in sorted(current.items()):
+            done = self.processed.get(name)
+            if done and (done['size'], done['mtime']) == tuple(signature):
+                continue
+            size, mtime = signature
+            if size and self.pending.get(name) == signature and now - mtime >= self.stable_seconds:
+                ready.append(name)
+            self.pending[name] = signature
+        # Olvidar los archivos que ya no están
+        for name in set(self.pending) - set(current):
+            del self.pending[name]
+        return ready
+
+    def process(self, name):
+        """Ingiere un archivo y recuerda su versión para no repetirlo"""
+        size, mtime = self.pending.pop(name)
+        entry = {'size': size, 'mtime': mtime, 'ingested': datetime.now().isoformat()}
+        started = time.perf_counter()
+        try:
+            record, code = self.ingest(os.path.join(self.directory, name))
+            entry.update(filename=record['filename'], sha256=record.get('sha256'), code=code)
+            print(f"📥 {name}: {record['filename']} ({code}, {time.perf_counter() - started:.1f}s)", flush=True)
+        except Exception as e:
+            # No reintentar hasta que el archivo cambie
+            entry['error'] = str(e)
+            print(f"❌ Error ingiriendo {name}: {str(e)}", flush=True)
+        self.processed[name] = entry
+        write_json_atomic(self.state_path, self.processed)
+        return entry
+
+    def poll(self, now=None):
+        return [self.process(name) for name in self.ready(now)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingesta automática de exportaciones del broker')
+    parser.add_argument('--dir', default=WATCH_DIR, help='Carpeta vigilada')
+    parser.add_argument('--root', default=os.environ.get('UPLOAD_FOLDER', 'uploads'), help='Carpeta del almacén')
+    parser.add_argument('--once', action='store_true', help='Procesar los archivos presentes y terminar')
+    args = parser.parse_args(argv)
+
+    # Importar la aplicación configura el almacén y las cachés con el mismo entorno que gunicorn
+    os.environ['UPLOAD_FOLDER'] = args.root
+    from app import ingest_file
+
+    os.makedirs(args.root, exist_ok=True)
+    lock = acquire_leader_lock(args.root, blocking=not args.once, name=LOCK_NAME)
+    if lock is None:
+        print('⏭️  Otro proceso está vigilando la carpeta; nada que hacer')
+        return 0
+
+    watcher = Watcher(args.dir, args.root, ingest_file)
+    print(f"👀 Vigilando {args.dir} cada {WATCH_INTERVAL:g}s", flush=True)
+    with lock:
+        while True:
+            watcher.poll()
+            if args.once and not watcher.pending:
+                return 0
+            time.sleep(WATCH_INTERVAL)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,16 +9,17 @@ import sys
 project_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_dir)
 
-# Importar la aplicación
-from app import app
-
-# Configurar variables de entorno si no están definidas
+# Configurar variables de entorno si no están definidas (antes de importar la
+# aplicación, que las lee una sola vez al cargarse)
 if not os.environ.get('SECRET_KEY'):
     os.environ['SECRET_KEY'] = 'production-secret-key-change-me'
 
 if not os.environ.get('UPLOAD_FOLDER'):
     os.environ['UPLOAD_FOLDER'] = os.path.join(project_dir, 'uploads')
 
+# Importar la aplicación
+from app import app
+
 # Aplicación WSGI
 application = app
 